@@ -1,53 +1,126 @@
 from fastapi import FastAPI, Request, Response
-from supabase import create_client, Client, ClientOptions
-import os
+import json
 import logging
-import re
+
+from app.services import provisioning
+from app.services.admission import AdmissionRejected, provisioning_admission
+from app.services.idempotency import (
+    MAX_KEY_LENGTH,
+    IdempotencyInProgress,
+    IdempotencyMismatch,
+    fingerprint,
+    idempotency,
+)
+from app.services.provisioning_jobs import provisioning_jobs
+from app.services.supabase_admin import supabase_admin
+from app.services.tenant_pool import tenant_pool
 
 api_app = FastAPI()
 
 
+def _json(payload: dict, status_code: int) -> Response:
+    return Response(content=json.dumps(payload), status_code=status_code, media_type="application/json")
+
+
+async def _provision(body: dict, prefer: str) -> dict:
+    """Run a provisioning request and describe the response to send."""
+
+    try:
+        if "respond-async" in prefer:
+            job = await provisioning_jobs.enqueue(body.get("boteco_username"))
+            return {
+                "status_code": 202,
+                "body": job,
+                "headers": {"Location": f"/api/provision_org/{job['id']}"},
+            }
+        provisioning.tenant_schema(body.get("boteco_username"))
+        async with provisioning_admission.slot():
+            schema_name = await provisioning.provision_org(body.get("boteco_username"))
+        return {"status_code": 200, "body": {"message": f"Schema {schema_name} provisioned successfully"}}
+    except AdmissionRejected as e:
+        return {
+            "status_code": 429,
+            "body": {"error": str(e)},
+            "headers": {"Retry-After": str(e.retry_after)},
+        }
+    except ValueError as e:
+        return {"status_code": 400, "body": {"error": str(e)}}
+    except ConnectionError as e:
+        logging.error(f"Provisioning backend not configured: {e}")
+        return {"status_code": 500, "body": {"error": "Server configuration error"}}
+    except Exception as e:
+        logging.exception(f"Error provisioning organization: {e}")
+        return {"status_code": 500, "body": {"error": f"Failed to provision schema: {str(e)}"}}
+
+
 @api_app.post("/api/provision_org")
 async def provision_org_route(request: Request) -> Response:
-    """API endpoint to provision a new organization schema in Supabase."""
+    """API endpoint for external callers to provision an organization schema.
+
+    Onboarding calls :func:`app.services.provisioning.provision_org` in
+    process; this route is a thin HTTP wrapper around the same function.
+    Send ``Prefer: respond-async`` to enqueue a job instead and get ``202``
+    with its id; poll it at ``GET /api/provision_org/{job_id}``.
+
+    With an ``Idempotency-Key`` header, repeats of the same request replay
+    the first response (marked ``Idempotent-Replayed: true``) and concurrent
+    duplicates wait for it. Server errors and ``429`` are not stored, so they
+    can be retried with the same key.
+
+    Synchronous provisioning goes through :mod:`app.services.admission`;
+    when it is saturated past the wait deadline the route answers ``429``
+    with ``Retry-After``.
+    """
     try:
         body = await request.json()
-        boteco_username = body.get("boteco_username")
-        if not boteco_username or not re.match("^[a-zA-Z0-9_]+$", boteco_username):
-            return Response(
-                content='{"error": "Invalid boteco_username format. Use only alphanumeric characters and underscores."}',
-                status_code=400,
-                media_type="application/json",
-            )
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_KEY"))
-        if not supabase_url or not supabase_key:
-            logging.error("Supabase URL or Key not configured for provisioning.")
-            return Response(
-                content='{"error": "Server configuration error"}',
-                status_code=500,
-                media_type="application/json",
+    except ValueError:
+        return _json({"error": "Invalid JSON body"}, 400)
+    prefer = request.headers.get("prefer", "")
+    key = request.headers.get("idempotency-key")
+    replayed = False
+    if key is None:
+        outcome = await _provision(body, prefer)
+    elif not key or len(key) > MAX_KEY_LENGTH:
+        return _json({"error": "Invalid Idempotency-Key"}, 400)
+    else:
+        try:
+            outcome, replayed = await idempotency.run(
+                f"provision_org:{key}",
+                fingerprint({"body": body, "async": "respond-async" in prefer}),
+                lambda: _provision(body, prefer),
+                cache_if=lambda outcome: outcome["status_code"] < 500 and outcome["status_code"] != 429,
             )
-        schema_name = f"org_{boteco_username}"
-        sql_command = f'CREATE SCHEMA IF NOT EXISTS "{schema_name}";'
-        supabase_admin: Client = create_client(
-            supabase_url, supabase_key, options=ClientOptions(schema="reflex")
-        )
-        response = await supabase_admin.rpc(
-            "execute_sql", {"sql_command": sql_command}
-        ).execute()
-        if response.error:
-            raise Exception(f"Supabase RPC error: {response.error.message}")
-        logging.info(f"Successfully provisioned schema: {schema_name}")
-        return Response(
-            content=f'{{"message": "Schema {schema_name} provisioned successfully"}}',
-            status_code=200,
-            media_type="application/json",
-        )
-    except Exception as e:
-        logging.exception(f"Error provisioning organization: {e}")
-        return Response(
-            content=f'{{"error": "Failed to provision schema: {str(e)}"}}',
-            status_code=500,
-            media_type="application/json",
-        )
\ No newline at end of file
+        except IdempotencyMismatch as e:
+            return _json({"error": str(e)}, 422)
+        except IdempotencyInProgress as e:
+            return _json({"error": str(e)}, 409)
+    response = _json(outcome["body"], outcome["status_code"])
+    response.headers.update(outcome.get("headers", {}))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+@api_app.get("/api/provision_org/{job_id}")
+async def provision_job_route(job_id: str) -> Response:
+    """Return the status of a provisioning job."""
+
+    job = await provisioning_jobs.get(job_id)
+    if job is None:
+        return _json({"error": "Job not found"}, 404)
+    return _json(job, 200)
+
+
+@api_app.get("/api/health")
+async def health_route() -> Response:
+    """Report admin pool reachability, tenant pool latency and admission load."""
+
+    status = await supabase_admin.health()
+    return _json(
+        {
+            "supabase_admin": status,
+            "tenant_pool": tenant_pool.stats(),
+            "admission": provisioning_admission.stats(),
+        },
+        200 if status["ok"] else 503,
+    )
@@ -17,6 +17,11 @@ from app.pages.dashboard import dashboard
 from app.api.provision import api_app
 from app.pages.auth.signup import signup_page
 from app.pages.auth.signin import signin_page
+from app.services.provisioning_jobs import provisioning_jobs
+from app.services.tenant_pool import tenant_pool
+from app.states.auth_state import AuthState
+from app.states.dashboard_state import DashboardState
+from app.states.onboarding_state import OnboardingState
 
 base_app = rx.App(
     theme=rx.theme(appearance="light"),
@@ -116,6 +121,8 @@ app = clerk.wrap_app(
     # add_clerk_pages=True,
 )
 app.api = api_app
+app.register_lifespan_task(provisioning_jobs.run)
+app.register_lifespan_task(tenant_pool.maintain)
 app.add_page(index, route="/")
 app.add_page(pricing, route="/pricing")
 app.add_page(about, route="/about")
@@ -129,8 +136,14 @@ app.add_page(plan_step, route="/onboarding/step-3-plan")
 # app.add_page(plan_step, route="/onboarding/step-3-plan", on_load=clerk.protect)
 app.add_page(payment_step, route="/onboarding/step-4-payment")
 # app.add_page(payment_step, route="/onboarding/step-4-payment", on_load=clerk.protect)
-app.add_page(success_page, route="/onboarding/success")
+app.add_page(
+    success_page, route="/onboarding/success", on_load=OnboardingState.poll_provisioning
+)
 # app.add_page(success_page, route="/onboarding/success", on_load=clerk.protect)
-app.add_page(dashboard, route="/app", on_load=clerk.protect)
+app.add_page(
+    dashboard,
+    route="/app",
+    on_load=[clerk.protect, AuthState.check_dashboard_access, DashboardState.load_kpis],
+)
 app.add_page(signup_page, route="/signup")
 app.add_page(signin_page, route="/signin")
@@ -1,6 +1,7 @@
 import reflex as rx
 from app.components.header import header
 from app.components.footer import footer
+from app.states.dashboard_state import DashboardState
 
 
 def dashboard() -> rx.Component:
@@ -13,7 +14,7 @@ def dashboard() -> rx.Component:
                     class_name="text-3xl font-bold text-[#4F3222] tracking-tight",
                 ),
                 rx.el.p(
-                    "Ainda estamos construindo esta área. Por enquanto, seu negócio está configurado!",
+                    "Os números de hoje do seu negócio.",
                     class_name="mt-2 text-lg text-[#4F3222] opacity-80",
                 ),
                 rx.el.div(
@@ -24,7 +25,7 @@ def dashboard() -> rx.Component:
                                 class_name="text-sm font-medium text-gray-500",
                             ),
                             rx.el.p(
-                                "R$ 0,00",
+                                DashboardState.sales_today,
                                 class_name="text-2xl font-semibold text-gray-900",
                             ),
                             class_name="p-6 bg-white rounded-lg shadow-sm",
@@ -35,7 +36,8 @@ def dashboard() -> rx.Component:
                                 class_name="text-sm font-medium text-gray-500",
                             ),
                             rx.el.p(
-                                "0", class_name="text-2xl font-semibold text-gray-900"
+                                DashboardState.active_tables,
+                                class_name="text-2xl font-semibold text-gray-900",
                             ),
                             class_name="p-6 bg-white rounded-lg shadow-sm",
                         ),
@@ -45,7 +47,7 @@ def dashboard() -> rx.Component:
                                 class_name="text-sm font-medium text-gray-500",
                             ),
                             rx.el.p(
-                                "0 itens",
+                                DashboardState.low_stock_label,
                                 class_name="text-2xl font-semibold text-gray-900",
                             ),
                             class_name="p-6 bg-white rounded-lg shadow-sm",
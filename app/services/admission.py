@@ -0,0 +1,271 @@
+"""Admission control for DDL-heavy tenant provisioning.
+
+Every schema build takes catalog locks that POS traffic of existing tenants
+also needs, so provisioning is admitted through two limits shared by all
+backend workers:
+
+* a concurrency cap (``PROVISIONING_MAX_CONCURRENCY``): admitted requests
+  hold a slot until they finish, or until ``PROVISIONING_SLOT_LEASE`` expires
+  if their worker dies;
+* a token bucket (``PROVISIONING_RATE`` tokens per second, up to
+  ``PROVISIONING_BURST``) that smooths signup bursts.
+
+With Redis both limits live in one Lua script, so a slot and a token are
+taken atomically across workers; without Redis they are kept in process.
+Callers wait in a FIFO queue (per worker) for at most
+``PROVISIONING_MAX_WAIT`` seconds and are then rejected with
+:class:`AdmissionRejected`, which carries a ``Retry-After`` hint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from app.services.redis_client import get_redis
+from app.utils.env import env_float, env_int
+
+_UNSET: Any = object()
+
+# KEYS: bucket hash, slots zset. ARGV: rate, burst, concurrency, lease_ms, slot id.
+# Returns {granted, wait_ms}; wait_ms is 0 when only a free slot is missing.
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local tokens = 1
+if rate > 0 then
+  local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+  tokens = tonumber(bucket[1]) or burst
+  local ts = tonumber(bucket[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+  redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+  redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+end
+if limit > 0 and redis.call('ZCARD', KEYS[2]) >= limit then
+  return {0, 0}
+end
+if tokens < 1 then
+  return {0, math.ceil((1 - tokens) * 1000 / rate)}
+end
+if rate > 0 then
+  redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1))
+end
+if limit > 0 then
+  redis.call('ZADD', KEYS[2], now + lease, ARGV[5])
+  redis.call('PEXPIRE', KEYS[2], lease)
+end
+return {1, 0}
+"""
+
+
+class AdmissionRejected(Exception):
+    """Provisioning was not admitted before the caller's deadline."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("Provisioning is busy; retry later.")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryAdmissionBackend:
+    """Token bucket and slot table for a single process."""
+
+    def __init__(self) -> None:
+        self.tokens: Optional[float] = None
+        self.updated = time.monotonic()
+        self.slots: dict[str, float] = {}
+
+    async def try_acquire(
+        self, slot_id: str, *, rate: float, burst: float, concurrency: int, lease: float
+    ) -> tuple[bool, float]:
+        now = time.monotonic()
+        self.slots = {slot: expires for slot, expires in self.slots.items() if expires > now}
+        tokens = 1.0
+        if rate > 0:
+            tokens = burst if self.tokens is None else self.tokens
+            tokens = min(burst, tokens + (now - self.updated) * rate)
+            self.tokens, self.updated = tokens, now
+        if concurrency > 0 and len(self.slots) >= concurrency:
+            return False, 0.0
+        if tokens < 1:
+            return False, (1 - tokens) / rate
+        if rate > 0:
+            self.tokens = tokens - 1
+        if concurrency > 0:
+            self.slots[slot_id] = now + lease
+        return True, 0.0
+
+    async def release(self, slot_id: str) -> None:
+        self.slots.pop(slot_id, None)
+
+
+class RedisAdmissionBackend:
+    """Limits shared by every worker through ``admission:provisioning:*`` keys."""
+
+    def __init__(self, redis: Any, namespace: str = "admission:provisioning") -> None:
+        self.redis = redis
+        self.bucket_key = f"{namespace}:bucket"
+        self.slots_key = f"{namespace}:slots"
+
+    async def try_acquire(
+        self, slot_id: str, *, rate: float, burst: float, concurrency: int, lease: float
+    ) -> tuple[bool, float]:
+        granted, wait_ms = await self.redis.eval(
+            _ACQUIRE_SCRIPT,
+            2,
+            self.bucket_key,
+            self.slots_key,
+            rate,
+            burst,
+            concurrency,
+            int(lease * 1000),
+            slot_id,
+        )
+        return bool(int(granted)), int(wait_ms) / 1000
+
+    async def release(self, slot_id: str) -> None:
+        await self.redis.zrem(self.slots_key, slot_id)
+
+
+def build_admission_backend() -> MemoryAdmissionBackend | RedisAdmissionBackend:
+    redis = get_redis()
+    return RedisAdmissionBackend(redis) if redis is not None else MemoryAdmissionBackend()
+
+
+class ProvisioningAdmission:
+    """Queue provisioning requests behind the shared concurrency and rate limits."""
+
+    def __init__(
+        self,
+        backend: Optional[MemoryAdmissionBackend | RedisAdmissionBackend] = None,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_wait: Optional[float] = None,
+        queue_limit: Optional[int] = None,
+        lease: Optional[float] = None,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self._backend = backend
+        self.concurrency = (
+            env_int("PROVISIONING_MAX_CONCURRENCY", 4) if concurrency is None else concurrency
+        )
+        self.rate = env_float("PROVISIONING_RATE", 2.0) if rate is None else rate
+        self.burst = max(1.0, env_float("PROVISIONING_BURST", 20.0) if burst is None else burst)
+        self.max_wait = env_float("PROVISIONING_MAX_WAIT", 10.0) if max_wait is None else max_wait
+        self.queue_limit = (
+            env_int("PROVISIONING_QUEUE_LIMIT", 100) if queue_limit is None else queue_limit
+        )
+        self.lease = lease or env_float("PROVISIONING_SLOT_LEASE", 120.0)
+        self.poll_interval = poll_interval
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._queue: Optional[asyncio.Lock] = None
+        self._queue_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0 or self.rate > 0
+
+    @property
+    def backend(self) -> MemoryAdmissionBackend | RedisAdmissionBackend:
+        if self._backend is None:
+            self._backend = build_admission_backend()
+        return self._backend
+
+    def _queue_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._queue_loop is not loop:
+            self._queue, self._queue_loop = asyncio.Lock(), loop
+        return self._queue
+
+    def _reject(self, retry_after: float) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(retry_after)
+
+    async def acquire(self, max_wait: Optional[float] = _UNSET) -> str:
+        """Wait for a slot and a token; return the slot id to release.
+
+        ``max_wait=None`` waits indefinitely (background jobs); the default is
+        ``PROVISIONING_MAX_WAIT``. Raises :class:`AdmissionRejected` when the
+        local queue is full or the deadline would pass before admission.
+        """
+
+        max_wait = self.max_wait if max_wait is _UNSET else max_wait
+        slot_id = uuid.uuid4().hex
+        if self.waiting >= self.queue_limit:
+            raise self._reject(self.poll_interval)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        self.waiting += 1
+        try:
+            queue = self._queue_lock()
+            try:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                await asyncio.wait_for(queue.acquire(), remaining)
+            except asyncio.TimeoutError:
+                raise self._reject(max_wait or self.poll_interval) from None
+            try:
+                delay = self.poll_interval
+                while True:
+                    granted, wait = await self.backend.try_acquire(
+                        slot_id,
+                        rate=self.rate,
+                        burst=self.burst,
+                        concurrency=self.concurrency,
+                        lease=self.lease,
+                    )
+                    if granted:
+                        break
+                    pause = max(wait, delay)
+                    if deadline is not None and time.monotonic() + pause > deadline:
+                        raise self._reject(pause)
+                    await asyncio.sleep(pause)
+                    delay = min(delay * 2, 0.5)
+            finally:
+                queue.release()
+        finally:
+            self.waiting -= 1
+        self.admitted += 1
+        self.in_flight += 1
+        return slot_id
+
+    async def release(self, slot_id: str) -> None:
+        self.in_flight -= 1
+        await self.backend.release(slot_id)
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = _UNSET) -> AsyncIterator[None]:
+        """Hold an admission slot for the duration of the block."""
+
+        if not self.enabled:
+            yield
+            return
+        slot_id = await self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            await self.release(slot_id)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_concurrency": self.concurrency,
+            "rate_per_s": self.rate,
+            "burst": self.burst,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+provisioning_admission = ProvisioningAdmission()
@@ -0,0 +1,278 @@
+"""Provision or repair many tenant schemas at once.
+
+For importing an existing chain of bars, or repairing tenants whose
+onboarding failed half-way::
+
+    python -m app.services.backfill_tenants --from-db
+    python -m app.services.backfill_tenants --file usernames.txt --concurrency 8
+
+Usernames come from ``reflex.boteco`` (``--from-db``) or a file with one
+username per line (``#`` starts a comment). Each tenant schema is classified
+before anything runs:
+
+* ``missing``: built with :func:`app.services.provisioning.provision_org`
+  (warm pool or template), reported as ``provisioned``;
+* ``empty``: a leftover schema with no objects (the old ``CREATE SCHEMA``
+  path), dropped and rebuilt, reported as ``repaired``;
+* ``current``: already at the template version, skipped;
+* ``outdated``: has a ``tenant_migrations`` ledger below the template
+  version; left for the tenant migration runner and reported;
+* ``unmanaged``: has objects but no ledger (it predates the template), so
+  the migration runner skips it too; listed separately in the report as
+  needing manual adoption.
+
+Builds respect the shared provisioning admission limits (see
+``app.services.admission``) unless ``--no-admission`` is given. Every
+finished tenant is appended to the checkpoint file (JSON lines).
+Running again with the same checkpoint skips tenants already done and
+retries the failed ones. Requires ``DATABASE_URL``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from psycopg import AsyncConnection, sql
+
+from app.services.admission import ProvisioningAdmission, provisioning_admission
+from app.services.postgres_backend import PostgresClient
+from app.services.provisioning import provision_org, tenant_schema
+from app.services.tenant_migrations import UNMANAGED
+from app.services.tenant_template import TEMPLATE_VERSION
+
+logger = logging.getLogger(__name__)
+
+MISSING = "missing"
+EMPTY = "empty"
+CURRENT = "current"
+OUTDATED = "outdated"
+PROVISIONED = "provisioned"
+REPAIRED = "repaired"
+FAILED = "failed"
+INVALID = "invalid"
+DONE = {PROVISIONED, REPAIRED, CURRENT}
+
+DEFAULT_CHECKPOINT = Path("tenant_backfill.checkpoint.jsonl")
+
+
+def read_usernames(lines: Iterable[str]) -> list[str]:
+    """Return unique usernames in file order, ignoring blanks and comments."""
+
+    usernames: dict[str, None] = {}
+    for line in lines:
+        username = line.split("#", 1)[0].strip()
+        if username:
+            usernames.setdefault(username)
+    return list(usernames)
+
+
+def load_checkpoint(path: Path) -> dict[str, dict[str, Any]]:
+    """Return the last recorded result per username."""
+
+    if not path.exists():
+        return {}
+    results: dict[str, dict[str, Any]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            record = json.loads(line)
+            results[record["username"]] = record
+    return results
+
+
+async def usernames_from_db(client: PostgresClient) -> list[str]:
+    async def work(conn: AsyncConnection) -> list[str]:
+        cursor = await conn.execute("SELECT username FROM boteco ORDER BY created_at, username")
+        return [row["username"] for row in await cursor.fetchall()]
+
+    return await client._run(work)
+
+
+async def inspect_schema(client: PostgresClient, schema: str) -> str:
+    """Classify ``schema`` as missing, empty, unmanaged, current or outdated."""
+
+    async def work(conn: AsyncConnection) -> str:
+        cursor = await conn.execute(
+            """
+            SELECT (SELECT count(*) FROM pg_class WHERE relnamespace = n.oid)
+                 + (SELECT count(*) FROM pg_type WHERE typnamespace = n.oid AND typrelid = 0
+                      AND typelem = 0)
+                 + (SELECT count(*) FROM pg_proc WHERE pronamespace = n.oid) AS objects,
+                   to_regclass(format('%%I.tenant_migrations', n.nspname)) IS NOT NULL AS has_ledger
+            FROM pg_namespace n
+            WHERE n.nspname = %s
+            """,
+            [schema],
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            return MISSING
+        if row["objects"] == 0:
+            return EMPTY
+        if not row["has_ledger"]:
+            return UNMANAGED
+        cursor = await conn.execute(
+            sql.SQL("SELECT max(version) AS version FROM {}.tenant_migrations").format(
+                sql.Identifier(schema)
+            )
+        )
+        version = (await cursor.fetchone())["version"]
+        return CURRENT if version is not None and version >= TEMPLATE_VERSION else OUTDATED
+
+    return await client._run(work)
+
+
+async def drop_empty_schema(client: PostgresClient, schema: str) -> None:
+    # RESTRICT: if anything appeared in the schema since inspection, fail
+    # instead of dropping it.
+    async def work(conn: AsyncConnection) -> None:
+        await conn.execute(sql.SQL("DROP SCHEMA {} RESTRICT").format(sql.Identifier(schema)))
+
+    await client._run(work)
+
+
+async def backfill_one(
+    client: PostgresClient, username: str, admission: Optional[ProvisioningAdmission] = None
+) -> dict[str, Any]:
+    """Provision or repair one tenant and describe the outcome."""
+
+    started = time.perf_counter()
+    record: dict[str, Any] = {"username": username}
+    try:
+        schema = tenant_schema(username)
+        state = await inspect_schema(client, schema)
+        if state in (MISSING, EMPTY):
+            async with admission.slot(max_wait=None) if admission else nullcontext():
+                if state == EMPTY:
+                    await drop_empty_schema(client, schema)
+                await provision_org(username, storage=client)
+            record["status"] = PROVISIONED if state == MISSING else REPAIRED
+        else:
+            record["status"] = state
+    except ValueError as exc:
+        record.update(status=INVALID, error=str(exc))
+    except Exception as exc:
+        logger.warning("Backfill of %s failed: %s", username, exc)
+        record.update(status=FAILED, error=str(exc))
+    record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+async def backfill(
+    client: PostgresClient,
+    usernames: list[str],
+    *,
+    concurrency: int = 4,
+    checkpoint: Optional[Path] = DEFAULT_CHECKPOINT,
+    admission: Optional[ProvisioningAdmission] = provisioning_admission,
+) -> dict[str, Any]:
+    """Backfill ``usernames`` with bounded concurrency; return the report.
+
+    Builds go through the shared provisioning admission limits so a backfill
+    does not starve live signups; pass ``admission=None`` to skip them.
+    """
+
+    finished = load_checkpoint(checkpoint) if checkpoint else {}
+    pending = [
+        username
+        for username in usernames
+        if finished.get(username, {}).get("status") not in DONE
+    ]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    records: list[dict[str, Any]] = []
+    started = time.perf_counter()
+    log = checkpoint.open("a", encoding="utf-8") if checkpoint else None
+    try:
+
+        async def run(username: str) -> None:
+            async with semaphore:
+                record = await backfill_one(client, username, admission)
+            records.append(record)
+            if log is not None:
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+
+        await asyncio.gather(*(run(username) for username in pending))
+    finally:
+        if log is not None:
+            log.close()
+    return build_report(records, skipped=len(usernames) - len(pending), elapsed=time.perf_counter() - started)
+
+
+def build_report(records: list[dict[str, Any]], *, skipped: int, elapsed: float) -> dict[str, Any]:
+    counts: dict[str, int] = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    built = sorted(record["ms"] for record in records if record["status"] in (PROVISIONED, REPAIRED))
+    return {
+        "processed": len(records),
+        "skipped_from_checkpoint": skipped,
+        "counts": counts,
+        "elapsed_s": round(elapsed, 3),
+        "tenants_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else None,
+        "build_p50_ms": round(statistics.median(built), 2) if built else None,
+        "build_p99_ms": (
+            round(statistics.quantiles(built, n=100, method="inclusive")[98], 2)
+            if len(built) > 1
+            else (built[0] if built else None)
+        ),
+        "failed": [
+            {"username": record["username"], "error": record.get("error")}
+            for record in records
+            if record["status"] in (FAILED, INVALID)
+        ],
+        "outdated": [record["username"] for record in records if record["status"] == OUTDATED],
+        "unmanaged": [record["username"] for record in records if record["status"] == UNMANAGED],
+    }
+
+
+async def _main(args: argparse.Namespace) -> int:
+    client = PostgresClient(args.dsn, schema="reflex", cache=False)
+    try:
+        if args.file:
+            usernames = read_usernames(Path(args.file).read_text(encoding="utf-8").splitlines())
+        else:
+            usernames = await usernames_from_db(client)
+        logger.info("Backfilling %s tenants with concurrency %s", len(usernames), args.concurrency)
+        report = await backfill(
+            client,
+            usernames,
+            concurrency=args.concurrency,
+            checkpoint=None if args.no_checkpoint else Path(args.checkpoint),
+            admission=None if args.no_admission else provisioning_admission,
+        )
+    finally:
+        await client.aclose()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if report["counts"].get(FAILED) else 0
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-db", action="store_true", help="read usernames from reflex.boteco")
+    source.add_argument("--file", help="file with one username per line")
+    parser.add_argument("--dsn", help="Postgres DSN (default: DATABASE_URL)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint", default=str(DEFAULT_CHECKPOINT))
+    parser.add_argument("--no-checkpoint", action="store_true")
+    parser.add_argument(
+        "--no-admission",
+        action="store_true",
+        help="ignore the shared provisioning rate limits (maintenance windows)",
+    )
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
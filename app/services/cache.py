@@ -0,0 +1,220 @@
+"""Read-through caching and request coalescing for Supabase lookups.
+
+A bounded in-process LRU with per-entry TTL sits in front of an optional
+shared Redis tier, so every backend worker benefits from a lookup made by
+another. Writes invalidate keys in both tiers. Misses that happen at the same
+moment are collapsed into a single request by :class:`SingleFlight`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """Return the cached value, or ``default`` on a miss or expired entry."""
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._entries if str(key).startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ReadThroughCache:
+    """Two-tier read-through cache: local :class:`TTLCache` plus optional Redis.
+
+    Values must be JSON-serializable when the Redis tier is enabled. Redis
+    failures are logged and treated as misses so the cache never turns a
+    Redis outage into a request failure.
+
+    Keys being loaded carry a generation that invalidation bumps; a load that
+    started before an invalidation returns its value but does not store it,
+    so a slow read cannot put back what a write just invalidated.
+    """
+
+    def __init__(
+        self,
+        local: Optional[TTLCache] = None,
+        redis: Any = None,
+        namespace: str = "supabase",
+    ) -> None:
+        self.local = local or TTLCache()
+        self.redis = redis
+        self.namespace = namespace
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.stale_loads = 0
+        # key -> [generation, loads in flight]; only keys being loaded are tracked.
+        self._loading: dict[str, list[int]] = {}
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return ``key`` from the nearest tier, calling ``loader`` on a full miss."""
+
+        value = self.local.get(key)
+        if value is not _MISSING:
+            return value
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._redis_key(key))
+            except Exception as exc:
+                self.redis_errors += 1
+                logging.warning("Redis cache read failed for %s: %s", key, exc)
+                raw = None
+            if raw is not None:
+                self.redis_hits += 1
+                value = json.loads(raw)
+                self.local.set(key, value)
+                return value
+
+        loading = self._loading.setdefault(key, [0, 0])
+        generation = loading[0]
+        loading[1] += 1
+        try:
+            value = await loader()
+        finally:
+            loading[1] -= 1
+            if not loading[1] and self._loading.get(key) is loading:
+                del self._loading[key]
+        if loading[0] != generation:
+            self.stale_loads += 1
+            return value
+        self.local.set(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._redis_key(key), json.dumps(value, default=str), ex=max(1, int(self.local.ttl))
+                )
+            except Exception as exc:
+                self.redis_errors += 1
+                logging.warning("Redis cache write failed for %s: %s", key, exc)
+        return value
+
+    def _bump(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            if key in self._loading:
+                self._loading[key][0] += 1
+
+    async def invalidate(self, *keys: str) -> None:
+        self._bump(keys)
+        self.local.invalidate(*keys)
+        if self.redis is not None and keys:
+            try:
+                await self.redis.delete(*(self._redis_key(key) for key in keys))
+            except Exception as exc:
+                self.redis_errors += 1
+                logging.warning("Redis cache invalidation failed for %s: %s", keys, exc)
+
+    async def invalidate_prefix(self, prefix: str) -> None:
+        """Drop every key in a namespace; meant for rare writes such as rollbacks."""
+
+        self._bump([key for key in self._loading if key.startswith(prefix)])
+        self.local.invalidate_prefix(prefix)
+        if self.redis is not None:
+            try:
+                keys = [key async for key in self.redis.scan_iter(match=f"{self._redis_key(prefix)}*")]
+                if keys:
+                    await self.redis.delete(*keys)
+            except Exception as exc:
+                self.redis_errors += 1
+                logging.warning("Redis cache invalidation failed for %s*: %s", prefix, exc)
+
+    def stats(self) -> dict[str, int]:
+        """Return hit, miss and eviction counters for both tiers."""
+
+        return {
+            "hits": self.local.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.local.misses - self.redis_hits,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "redis_errors": self.redis_errors,
+            "stale_loads": self.stale_loads,
+            "size": len(self.local),
+        }
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key.
+
+    The call runs as its own task, so a caller being cancelled does not
+    cancel the request for the others still waiting on it.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every waiter was cancelled
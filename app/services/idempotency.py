@@ -0,0 +1,238 @@
+"""Idempotency keys for provisioning and onboarding completion.
+
+A request carrying an ``Idempotency-Key`` first claims the key with a
+short-lived ``pending`` entry (``SET NX`` in Redis). The claimant runs the
+work, renewing the claim every third of ``IDEMPOTENCY_LOCK_TTL`` so long
+work (provisioning) keeps the key, and replaces the entry with its result for ``IDEMPOTENCY_TTL`` seconds;
+repeats of the same request get that result back without touching the
+database, and concurrent duplicates poll the entry until the first request
+finishes. Failures release the key so the caller can retry.
+
+Entries also store a fingerprint of the request: reusing a key for a
+different request raises :class:`IdempotencyMismatch`. Without Redis an
+in-process store is used, which only deduplicates within one worker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from app.services.redis_client import get_redis
+from app.utils.env import env_float, env_int
+
+PENDING = "pending"
+DONE = "done"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used for a request with a different payload."""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with this key did not finish within the wait timeout."""
+
+
+def fingerprint(payload: Any) -> str:
+    """Return a stable digest of a JSON-serialisable request payload."""
+
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryIdempotencyStore:
+    """In-process store used when Redis is not configured."""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[float, dict[str, Any]]] = {}
+
+    async def claim(self, key: str, entry: dict[str, Any], ttl: float) -> Optional[dict[str, Any]]:
+        """Store ``entry`` if ``key`` is free, else return the entry holding it."""
+
+        existing = await self.load(key)
+        if existing is not None:
+            return existing
+        await self.save(key, entry, ttl)
+        return None
+
+    async def load(self, key: str) -> Optional[dict[str, Any]]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return dict(entry)
+
+    async def save(self, key: str, entry: dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, dict(entry))
+
+    async def renew(self, key: str, owner: str, ttl: float) -> bool:
+        entry = await self.load(key)
+        if entry is None or entry["state"] != PENDING or entry.get("owner") != owner:
+            return False
+        await self.save(key, entry, ttl)
+        return True
+
+    async def release(self, key: str, owner: str) -> None:
+        entry = await self.load(key)
+        if entry is not None and entry.get("owner") == owner:
+            self._entries.pop(key, None)
+
+    async def discard(self, key: str, result: Any) -> None:
+        entry = await self.load(key)
+        if entry is not None and entry["state"] == DONE and entry.get("result") == result:
+            self._entries.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    """Entries as JSON strings under ``idempotency:<key>``, shared by all workers."""
+
+    def __init__(self, redis: Any, namespace: str = "idempotency") -> None:
+        self.redis = redis
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def claim(self, key: str, entry: dict[str, Any], ttl: float) -> Optional[dict[str, Any]]:
+        if await self.redis.set(self._key(key), json.dumps(entry), ex=int(ttl), nx=True):
+            return None
+        return await self.load(key)
+
+    async def load(self, key: str) -> Optional[dict[str, Any]]:
+        raw = await self.redis.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def save(self, key: str, entry: dict[str, Any], ttl: float) -> None:
+        await self.redis.set(self._key(key), json.dumps(entry), ex=int(ttl))
+
+    async def renew(self, key: str, owner: str, ttl: float) -> bool:
+        entry = await self.load(key)
+        if entry is None or entry["state"] != PENDING or entry.get("owner") != owner:
+            return False
+        return bool(await self.redis.expire(self._key(key), max(1, int(ttl))))
+
+    async def release(self, key: str, owner: str) -> None:
+        # Only drop our own pending entry; after a lock expiry another
+        # request may hold the key by now.
+        entry = await self.load(key)
+        if entry is not None and entry.get("owner") == owner:
+            await self.redis.delete(self._key(key))
+
+    async def discard(self, key: str, result: Any) -> None:
+        entry = await self.load(key)
+        if entry is not None and entry["state"] == DONE and entry.get("result") == result:
+            await self.redis.delete(self._key(key))
+
+
+def build_idempotency_store() -> MemoryIdempotencyStore | RedisIdempotencyStore:
+    redis = get_redis()
+    return RedisIdempotencyStore(redis) if redis is not None else MemoryIdempotencyStore()
+
+
+class Idempotency:
+    """Run work at most once per key and replay its stored result."""
+
+    def __init__(
+        self,
+        store: Optional[MemoryIdempotencyStore | RedisIdempotencyStore] = None,
+        ttl: Optional[float] = None,
+        lock_ttl: Optional[float] = None,
+        wait_timeout: Optional[float] = None,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self._store = store
+        self.ttl = ttl or env_int("IDEMPOTENCY_TTL", 86400)
+        self.lock_ttl = lock_ttl or env_int("IDEMPOTENCY_LOCK_TTL", 60)
+        self.wait_timeout = (
+            env_float("IDEMPOTENCY_WAIT_TIMEOUT", 30.0) if wait_timeout is None else wait_timeout
+        )
+        self.poll_interval = poll_interval
+
+    @property
+    def store(self) -> MemoryIdempotencyStore | RedisIdempotencyStore:
+        if self._store is None:
+            self._store = build_idempotency_store()
+        return self._store
+
+    async def run(
+        self,
+        key: str,
+        request_fingerprint: str,
+        work: Callable[[], Awaitable[Any]],
+        *,
+        cache_if: Callable[[Any], bool] = lambda result: True,
+    ) -> tuple[Any, bool]:
+        """Return ``(result, replayed)`` for ``key``, running ``work`` only once.
+
+        ``result`` must be JSON-serialisable. Results rejected by
+        ``cache_if``, and exceptions raised by ``work``, release the key
+        instead of being stored.
+        """
+
+        owner = uuid.uuid4().hex
+        pending = {"state": PENDING, "fingerprint": request_fingerprint, "owner": owner}
+        deadline = time.monotonic() + self.wait_timeout
+        delay = self.poll_interval
+        while True:
+            existing = await self.store.claim(key, pending, self.lock_ttl)
+            if existing is None:
+                break
+            if existing["fingerprint"] != request_fingerprint:
+                raise IdempotencyMismatch("Idempotency-Key was already used with a different request.")
+            if existing["state"] == DONE:
+                return existing["result"], True
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress("A request with this Idempotency-Key is still in progress.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        heartbeat = asyncio.create_task(self._keep_claim(key, owner))
+        try:
+            result = await work()
+        except BaseException:
+            await self.store.release(key, owner)
+            raise
+        finally:
+            heartbeat.cancel()
+        if cache_if(result):
+            await self.store.save(
+                key,
+                {"state": DONE, "fingerprint": request_fingerprint, "owner": owner, "result": result},
+                self.ttl,
+            )
+        else:
+            await self.store.release(key, owner)
+        return result, False
+
+    async def _keep_claim(self, key: str, owner: str) -> None:
+        """Renew the pending claim until cancelled, so duplicates keep waiting."""
+
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                if not await self.store.renew(key, owner, self.lock_ttl):
+                    logging.warning("Lost the idempotency claim on %s while its work was running.", key)
+                    return
+            except Exception as exc:
+                logging.warning("Could not renew the idempotency claim on %s: %s", key, exc)
+
+    async def invalidate(self, key: str, result: Any) -> None:
+        """Forget the stored ``result`` of ``key`` so the next request runs again.
+
+        Only drops the entry while it still holds ``result``: a retry that
+        already claimed the key again is left alone.
+        """
+
+        await self.store.discard(key, result)
+
+
+idempotency = Idempotency()
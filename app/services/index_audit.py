@@ -0,0 +1,418 @@
+"""Find duplicate, prefix-redundant and constraint-shadowed indexes.
+
+Reads index definitions from SQL (``schema.sql``, a directory of numbered
+files such as the tenant template) or from a live database's catalog, and
+reports every index another index on the same table already covers::
+
+    python -m app.services.index_audit                                    # schema.sql
+    python -m app.services.index_audit app/services/sql/tenant
+    python -m app.services.index_audit --dsn "$DATABASE_URL" --schema reflex --schema 'org_%'
+    python -m app.services.index_audit schema.sql --emit-migration drop_redundant.sql
+
+An index is redundant when another index on the same table uses the same
+method and predicate and
+
+* has the same key columns (``duplicate``, or ``shadowed`` when the other one
+  backs a PRIMARY KEY / UNIQUE constraint), or
+* is a btree whose key columns start with all of its key columns (``prefix``).
+
+Unique and constraint indexes are never reported as droppable unless an
+equivalent unique index remains. Every insert and non-HOT update writes one
+entry per index, so each finding carries the share of per-row write work the
+index costs; catalog reads add its size, scans and the index entries written
+since the statistics were reset. The run exits 1 when anything is redundant.
+
+Indexes on Supabase-managed schemas (``auth``, ``storage``, ``extensions``...)
+belong to the platform, which recreates them on upgrade; they are left out of
+findings and emitted drops unless ``--include-managed`` is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from app.utils.env import database_url
+from app.utils.sql import load_sql_files, split_script, split_top_level, strip_comments
+
+SCHEMA_FILE = Path(__file__).resolve().parents[2] / "schema.sql"
+
+DUPLICATE = "duplicate"
+SHADOWED = "shadowed"
+PREFIX = "prefix"
+
+MANAGED_SCHEMAS = frozenset(
+    {
+        "auth",
+        "storage",
+        "extensions",
+        "realtime",
+        "graphql",
+        "graphql_public",
+        "net",
+        "pgsodium",
+        "pgsodium_masks",
+        "vault",
+        "supabase_functions",
+        "supabase_migrations",
+        "cron",
+        "pgbouncer",
+        "pg_catalog",
+        "information_schema",
+    }
+)
+
+_NAME = r'((?:"[^"]+"|[\w$]+)(?:\.(?:"[^"]+"|[\w$]+))?)'
+_CREATE_INDEX = re.compile(
+    r"CREATE (UNIQUE )?INDEX (?:CONCURRENTLY )?(?:IF NOT EXISTS )?" + _NAME
+    + r" ON (?:ONLY )?" + _NAME + r"(?: USING (\w+))? ?\(",
+    re.I,
+)
+_CREATE_TABLE = re.compile(r"CREATE (?:UNLOGGED )?TABLE (?:IF NOT EXISTS )?" + _NAME + r" ?\(", re.I)
+_KEY_CONSTRAINT = re.compile(
+    r"CONSTRAINT " + _NAME + r" (PRIMARY KEY|UNIQUE)(?: NULLS (?:NOT )?DISTINCT)? ?\((.*?)\)"
+    r"( USING INDEX (\S+))?$",
+    re.I,
+)
+
+
+@dataclass(frozen=True)
+class Index:
+    table: str
+    name: str
+    columns: tuple[str, ...]
+    unique: bool = False
+    method: str = "btree"
+    predicate: str = ""
+    include: tuple[str, ...] = ()
+    constraint: Optional[str] = None
+    size_bytes: Optional[int] = None
+    scans: Optional[int] = None
+
+    @property
+    def qualified_name(self) -> str:
+        schema = self.table.rpartition(".")[0]
+        return f"{schema}.{self.name}" if schema else self.name
+
+
+@dataclass(frozen=True)
+class Finding:
+    kind: str
+    index: Index
+    covered_by: Index
+    table_indexes: int
+    write_share: float
+    table_writes: Optional[int] = None
+
+
+def _identifier(name: str) -> str:
+    return ".".join(part.strip('"') if part.startswith('"') else part.lower() for part in name.split("."))
+
+
+def _normalize(expression: str) -> str:
+    text = " ".join(expression.split()).lower()
+    text = re.sub(r"\s*([(),])\s*", r"\1", text)
+    while text.startswith("(") and text.endswith(")") and _balanced(text[1:-1]):
+        text = text[1:-1]
+    return text
+
+
+def _balanced(text: str) -> bool:
+    depth = 0
+    for char in text:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def _key(column: str) -> str:
+    text = _normalize(column).replace('"', "")
+    return re.sub(r" asc( nulls last)?$", "", text)
+
+
+def _closing_paren(text: str, start: int) -> int:
+    depth = 0
+    for position in range(start, len(text)):
+        depth += {"(": 1, ")": -1}.get(text[position], 0)
+        if depth == 0:
+            return position
+    return len(text)
+
+
+def _qualify(name: str, schema: Optional[str]) -> str:
+    name = _identifier(name)
+    return f"{schema}.{name}" if schema and "." not in name else name
+
+
+def parse_index(definition: str, *, schema: Optional[str] = None, constraint: Optional[str] = None) -> Optional[Index]:
+    """Parse a ``CREATE INDEX`` statement (as written, or from ``pg_get_indexdef``)."""
+
+    text = " ".join(strip_comments(definition).split())
+    match = _CREATE_INDEX.match(text)
+    if not match:
+        return None
+    close = _closing_paren(text, match.end() - 1)
+    rest = text[close + 1 :]
+    include = re.search(r"INCLUDE ?\((.*?)\)", rest, re.I)
+    predicate = re.search(r" WHERE (.*)$", rest, re.I)
+    return Index(
+        table=_qualify(match.group(3), schema),
+        name=_identifier(match.group(2)).split(".")[-1],
+        columns=tuple(_key(column) for column in split_top_level(text[match.end() : close])),
+        unique=bool(match.group(1)),
+        method=(match.group(4) or "btree").lower(),
+        predicate=_normalize(predicate.group(1)) if predicate else "",
+        include=tuple(_key(column) for column in split_top_level(include.group(1))) if include else (),
+        constraint=constraint,
+    )
+
+
+def _constraint_index(table: str, clause: str, indexes: dict[tuple[str, str], Index]) -> Optional[Index]:
+    match = _KEY_CONSTRAINT.match(clause)
+    if not match:
+        return None
+    name = _identifier(match.group(1))
+    if match.group(4):
+        existing = indexes.pop((table, _identifier(match.group(5))), None)
+        if existing is None:
+            return None
+        return Index(**{**asdict(existing), "name": name, "unique": True, "constraint": name})
+    return Index(
+        table=table,
+        name=name,
+        columns=tuple(_key(column) for column in split_top_level(match.group(3))),
+        unique=True,
+        constraint=name,
+    )
+
+
+def _column_constraints(table: str, clause: str) -> Optional[Index]:
+    match = re.match(r'("[^"]+"|[\w$]+) .*?\b(PRIMARY KEY|UNIQUE)\b', clause, re.I)
+    if not match or clause.upper().startswith(("CONSTRAINT ", "CHECK", "FOREIGN KEY", "EXCLUDE")):
+        return None
+    column = _key(match.group(1))
+    bare = table.split(".")[-1]
+    name = f"{bare}_pkey" if match.group(2).upper() == "PRIMARY KEY" else f"{bare}_{column}_key"
+    return Index(table=table, name=name, columns=(column,), unique=True, constraint=name)
+
+
+def indexes_from_sql(script: str, *, schema: Optional[str] = None) -> list[Index]:
+    """Replay the index DDL in ``script`` and return the indexes left at the end."""
+
+    indexes: dict[tuple[str, str], Index] = {}
+
+    def add(index: Optional[Index]) -> None:
+        if index is not None:
+            indexes[(index.table, index.name)] = index
+
+    for statement in split_script(script):
+        text = " ".join(strip_comments(statement).split())
+        upper = text.upper()
+        if upper.startswith("CREATE") and (index := parse_index(text, schema=schema)):
+            add(index)
+        elif match := _CREATE_TABLE.match(text):
+            table = _qualify(match.group(1), schema)
+            body = text[match.end() : _closing_paren(text, match.end() - 1)]
+            for clause in split_top_level(body):
+                add(_constraint_index(table, clause, indexes) or _column_constraints(table, clause))
+        elif match := re.match(r"ALTER TABLE (?:IF EXISTS )?(?:ONLY )?" + _NAME + r" (.*)$", text, re.I):
+            table = _qualify(match.group(1), schema)
+            for action in split_top_level(match.group(2)):
+                if action.upper().startswith("ADD CONSTRAINT"):
+                    add(_constraint_index(table, action[4:], indexes))
+                elif dropped := re.match(r"DROP CONSTRAINT (?:IF EXISTS )?(\S+)", action, re.I):
+                    indexes.pop((table, _identifier(dropped.group(1))), None)
+        elif match := re.match(r"DROP INDEX (?:CONCURRENTLY )?(?:IF EXISTS )?(.+?)(?: CASCADE| RESTRICT)?$", text, re.I):
+            for name in split_top_level(match.group(1)):
+                bare = _identifier(name).split(".")[-1]
+                for key in [key for key in indexes if key[1] == bare and not indexes[key].constraint]:
+                    del indexes[key]
+    return list(indexes.values())
+
+
+def covers(index: Index, other: Index) -> bool:
+    """Whether ``other`` makes ``index`` unnecessary."""
+
+    if (index.table, index.method, index.predicate) != (other.table, other.method, other.predicate):
+        return False
+    if index.unique and not (other.unique and other.columns == index.columns):
+        return False
+    same_keys = other.columns == index.columns
+    if not same_keys and not (
+        index.method == "btree" and other.columns[: len(index.columns)] == index.columns
+    ):
+        return False
+    return set(index.include) <= set(other.columns) | set(other.include)
+
+
+def _strength(index: Index, order: int) -> tuple:
+    return (index.constraint is None, not index.unique, -len(index.columns) - len(index.include), order)
+
+
+def managed(index: Index) -> bool:
+    """Whether ``index`` lives in a platform-managed schema."""
+
+    return index.table.rpartition(".")[0] in MANAGED_SCHEMAS
+
+
+def find_redundant(
+    indexes: Sequence[Index],
+    table_writes: Optional[dict[str, int]] = None,
+    *,
+    include_managed: bool = False,
+) -> list[Finding]:
+    """Return one finding per redundant index, pointing at an index that stays.
+
+    Indexes in :data:`MANAGED_SCHEMAS` are skipped unless ``include_managed``.
+    """
+
+    if not include_managed:
+        indexes = [index for index in indexes if not managed(index)]
+    per_table: dict[str, int] = {}
+    for index in indexes:
+        per_table[index.table] = per_table.get(index.table, 0) + 1
+    kept: list[Index] = []
+    findings = []
+    ranked = sorted(enumerate(indexes), key=lambda item: _strength(item[1], item[0]))
+    for _, index in ranked:
+        keeper = None if index.constraint else next((other for other in kept if covers(index, other)), None)
+        if keeper is None:
+            kept.append(index)
+            continue
+        if keeper.columns != index.columns:
+            kind = PREFIX
+        else:
+            kind = SHADOWED if keeper.constraint else DUPLICATE
+        findings.append(
+            Finding(
+                kind=kind,
+                index=index,
+                covered_by=keeper,
+                table_indexes=per_table[index.table],
+                # One heap tuple plus one entry per index for every insert / non-HOT update.
+                write_share=round(1 / (1 + per_table[index.table]), 3),
+                table_writes=(table_writes or {}).get(index.table),
+            )
+        )
+    return sorted(findings, key=lambda finding: (finding.index.table, finding.index.name))
+
+
+def indexes_from_paths(paths: Iterable[Path]) -> list[Index]:
+    scripts = []
+    for path in paths:
+        if path.is_dir():
+            scripts.extend(file.text for file in load_sql_files(path))
+        else:
+            scripts.append(path.read_text(encoding="utf-8"))
+    return indexes_from_sql(";\n".join(scripts))
+
+
+_CATALOG_QUERY = """
+SELECT n.nspname AS schema_name, pg_get_indexdef(i.oid) AS definition, c.conname,
+       pg_relation_size(i.oid) AS size_bytes, s.idx_scan,
+       t.n_tup_ins + t.n_tup_upd - t.n_tup_hot_upd AS table_writes
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_namespace n ON n.oid = i.relnamespace
+LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.contype IN ('p', 'u', 'x')
+LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = x.indexrelid
+LEFT JOIN pg_stat_user_tables t ON t.relid = x.indrelid
+WHERE n.nspname LIKE ANY (%s)
+ORDER BY n.nspname, i.relname
+"""
+
+
+def indexes_from_catalog(dsn: str, schemas: Sequence[str]) -> tuple[list[Index], dict[str, int]]:
+    """Read indexes (with size, scans and table write counts) from a live database."""
+
+    import psycopg
+
+    indexes, writes = [], {}
+    with psycopg.connect(dsn) as conn:
+        for schema, definition, constraint, size_bytes, scans, table_writes in conn.execute(
+            _CATALOG_QUERY, [list(schemas)]
+        ):
+            index = parse_index(definition, schema=schema, constraint=constraint)
+            if index is None:
+                continue
+            indexes.append(Index(**{**asdict(index), "size_bytes": size_bytes, "scans": scans}))
+            if table_writes is not None:
+                writes[index.table] = table_writes
+    return indexes, writes
+
+
+def drop_migration(findings: Sequence[Finding], *, concurrently: bool = True) -> str:
+    """Render a migration dropping every redundant index.
+
+    By default this is a ``-- migrate: no-transaction`` file of ``DROP INDEX
+    CONCURRENTLY`` statements, which both the migration runner and the tenant
+    runner apply without blocking writes. ``concurrently=False`` renders
+    plain drops for scripts that must run inside a transaction.
+    """
+
+    lines = ["-- migrate: no-transaction"] if concurrently else []
+    lines.append("-- Drop indexes that other indexes on the same table already cover.")
+    for finding in findings:
+        lines.append("")
+        lines.append(f"-- {finding.kind}: covered by {finding.covered_by.name}")
+        keyword = "DROP INDEX CONCURRENTLY IF EXISTS" if concurrently else "DROP INDEX IF EXISTS"
+        name = finding.index.qualified_name if concurrently else finding.index.name
+        lines.append(f"{keyword} {name};")
+    return "\n".join(lines) + "\n"
+
+
+def describe(finding: Finding) -> str:
+    index, keeper = finding.index, finding.covered_by
+    relation = {DUPLICATE: "duplicates", SHADOWED: "is shadowed by constraint", PREFIX: "is a prefix of"}
+    text = (
+        f"{index.table}: {index.name} ({', '.join(index.columns)}) {relation[finding.kind]} "
+        f"{keeper.name} ({', '.join(keeper.columns)}); "
+        f"{finding.write_share:.0%} of per-row write work on a table with {finding.table_indexes} indexes"
+    )
+    if index.size_bytes is not None:
+        text += f"; {index.size_bytes} bytes, {index.scans or 0} scans"
+    if finding.table_writes is not None:
+        text += f", ~{finding.table_writes} index entries written since stats reset"
+    return text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, default=[SCHEMA_FILE])
+    parser.add_argument("--dsn", help="read the catalog of this database instead of SQL files")
+    parser.add_argument(
+        "--schema", action="append", help="schema name or LIKE pattern for --dsn (default: reflex)"
+    )
+    parser.add_argument("--emit-migration", type=Path, help="write a migration dropping the redundant indexes")
+    parser.add_argument(
+        "--include-managed",
+        action="store_true",
+        help="also audit Supabase-managed schemas (auth, storage, extensions, ...)",
+    )
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    writes: dict[str, int] = {}
+    if args.dsn:
+        indexes, writes = indexes_from_catalog(args.dsn or database_url(), args.schema or ["reflex"])
+    else:
+        indexes = indexes_from_paths(args.paths)
+    findings = find_redundant(indexes, writes, include_managed=args.include_managed)
+    if args.json:
+        print(json.dumps([asdict(finding) for finding in findings], indent=2))
+    else:
+        for finding in findings:
+            print(describe(finding))
+        print(f"{len(findings)} redundant index(es) out of {len(indexes)}")
+    if args.emit_migration and findings:
+        args.emit_migration.write_text(drop_migration(findings), encoding="utf-8")
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == "__main__":
+    main()
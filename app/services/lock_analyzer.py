@@ -0,0 +1,469 @@
+"""Offline lock-impact analysis for migration SQL.
+
+Flags statements that would block POS traffic on hot tables when run
+against a live database, and suggests the non-blocking form::
+
+    python -m app.services.lock_analyzer                         # sql/migrations
+    python -m app.services.lock_analyzer schema.sql --assume-existing
+    python -m app.services.lock_analyzer path/to/file.sql --hot-table invoices --strict
+
+Findings are ``error`` when the statement holds a write-blocking lock for
+as long as it scans, rewrites or indexes the table (plain ``CREATE INDEX``,
+constraints added without ``NOT VALID``, type changes, ...), and ``warning``
+when it only takes ``ACCESS EXCLUSIVE`` briefly (metadata changes, which
+still queue behind long transactions). The run exits non-zero on errors, or
+on any finding with ``--strict``; the migration runner refuses pending files
+with errors.
+
+Tables created earlier in the same file are empty and exempt, and so is a
+foreign key added to one of them (there are no rows to validate, so the
+lock on the referenced table is brief), unless
+``--assume-existing`` is given (e.g. to audit ``schema.sql``). A statement
+carrying the comment ``-- lock-check: allow`` is skipped.
+
+``CREATE TRIGGER`` on an existing table keeps writes to it blocked until the
+transaction commits, so in a transactional file any scan or DML after it
+(a backfill, typically) is an error: attach the trigger in a file of its own
+and backfill from a ``-- migrate: no-transaction`` file, in batches.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from app.utils.sql import NO_TRANSACTION, split_script, split_top_level, strip_comments
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "sql" / "migrations"
+HOT_TABLES = frozenset(
+    {
+        "orders",
+        "order_items",
+        "sales",
+        "products",
+        "stock_movements",
+        "tables",
+        "reservations",
+        "recipes",
+        "recipe_ingredients",
+        "users",
+        "boteco",
+        "user_boteco",
+    }
+)
+ALLOW_MARKER = "-- lock-check: allow"
+
+ERROR = "error"
+WARNING = "warning"
+
+_VOLATILE_DEFAULT = re.compile(
+    r"DEFAULT\s+\(?\s*(RANDOM|GEN_RANDOM_UUID|UUID_GENERATE_V\d|CLOCK_TIMESTAMP|TIMEOFDAY|NEXTVAL)\s*\("
+)
+_NAME = r'((?:"[^"]+"|[\w$]+)(?:\.(?:"[^"]+"|[\w$]+))?)'
+_TRIGGER = re.compile(r"CREATE (?:OR REPLACE )?(?:CONSTRAINT )?TRIGGER .*? ON (?:ONLY )?" + _NAME)
+_SCAN_OR_DML = re.compile(r"(INSERT|UPDATE|DELETE|MERGE|COPY)\b|(SELECT|WITH)\b.*\bFROM\b")
+
+
+@dataclass(frozen=True)
+class Finding:
+    path: str
+    line: int
+    table: str
+    lock: str
+    severity: str
+    statement: str
+    problem: str
+    suggestion: str
+
+
+@dataclass(frozen=True)
+class _Issue:
+    tables: tuple[str, ...]
+    lock: str
+    severity: str
+    problem: str
+    suggestion: str
+    # Table whose rows make the lock long; when it is new the statement is cheap.
+    scanned: Optional[str] = None
+
+
+def table_name(identifier: str) -> str:
+    """Return the bare, lower-cased table name of a possibly qualified identifier."""
+
+    return identifier.split(".")[-1].strip('"').lower()
+
+
+def _summary(text: str) -> str:
+    return text if len(text) <= 120 else text[:117] + "..."
+
+
+_NOT_VALID_HINT = (
+    "ADD CONSTRAINT ... NOT VALID, then ALTER TABLE ... VALIDATE CONSTRAINT ... "
+    "in a separate statement (validation only takes SHARE UPDATE EXCLUSIVE)"
+)
+_BRIEF = (
+    "takes ACCESS EXCLUSIVE briefly (metadata only), but queues behind long "
+    "transactions and blocks every query queued after it"
+)
+_BRIEF_HINT = "run it under a short lock_timeout and retry (the migration runner does)"
+
+
+def _alter_table_issues(table: str, actions: str) -> list[_Issue]:
+    issues = []
+    for action in split_top_level(actions):
+        if re.match(r"(RENAME|OWNER TO|VALIDATE CONSTRAINT|SET \(|RESET \()", action):
+            if action.startswith("RENAME"):
+                issues.append(_Issue((table,), "ACCESS EXCLUSIVE", WARNING, _BRIEF, _BRIEF_HINT))
+            continue
+        adds_constraint = re.match(r"ADD (CONSTRAINT \S+ )?(FOREIGN KEY|CHECK|UNIQUE|PRIMARY KEY|EXCLUDE)\b", action)
+        if adds_constraint:
+            kind = adds_constraint.group(2)
+            if kind == "FOREIGN KEY":
+                if "NOT VALID" in action:
+                    continue
+                referenced = re.search(r"REFERENCES " + _NAME, action)
+                tables = (table,) + ((table_name(referenced.group(1)),) if referenced else ())
+                issues.append(
+                    _Issue(
+                        tables,
+                        "SHARE ROW EXCLUSIVE",
+                        ERROR,
+                        "validates every existing row while blocking writes on both tables",
+                        _NOT_VALID_HINT,
+                        scanned=table,
+                    )
+                )
+            elif kind == "CHECK":
+                if "NOT VALID" not in action:
+                    issues.append(
+                        _Issue(
+                            (table,),
+                            "ACCESS EXCLUSIVE",
+                            ERROR,
+                            "scans the whole table while blocking reads and writes",
+                            _NOT_VALID_HINT,
+                        )
+                    )
+            elif "USING INDEX" not in action:
+                issues.append(
+                    _Issue(
+                        (table,),
+                        "ACCESS EXCLUSIVE",
+                        ERROR,
+                        "builds a unique index while blocking reads and writes",
+                        "CREATE UNIQUE INDEX CONCURRENTLY first, then ADD CONSTRAINT ... "
+                        f"{kind} USING INDEX <index>",
+                    )
+                )
+            continue
+        if re.match(r"ALTER (COLUMN )?\S+ (SET DATA )?TYPE\b", action):
+            issues.append(
+                _Issue(
+                    (table,),
+                    "ACCESS EXCLUSIVE",
+                    ERROR,
+                    "rewrites the table (and its indexes) while blocking reads and writes",
+                    "add a new column, backfill it in batches, then switch readers and drop the old one",
+                )
+            )
+        elif re.match(r"ALTER (COLUMN )?\S+ SET NOT NULL", action):
+            issues.append(
+                _Issue(
+                    (table,),
+                    "ACCESS EXCLUSIVE",
+                    ERROR,
+                    "scans the whole table while blocking reads and writes",
+                    "ADD CONSTRAINT ... CHECK (column IS NOT NULL) NOT VALID, VALIDATE CONSTRAINT, "
+                    "then SET NOT NULL (the validated check lets Postgres skip the scan)",
+                )
+            )
+        elif action.startswith("ADD") and (
+            _VOLATILE_DEFAULT.search(action) or re.search(r"GENERATED ALWAYS AS .* STORED", action)
+        ):
+            issues.append(
+                _Issue(
+                    (table,),
+                    "ACCESS EXCLUSIVE",
+                    ERROR,
+                    "a volatile or stored generated default rewrites the whole table",
+                    "add the column without a default, SET DEFAULT for new rows, backfill in batches",
+                )
+            )
+        elif re.match(r"SET (LOGGED|UNLOGGED|TABLESPACE|WITHOUT OIDS|ACCESS METHOD)\b", action):
+            issues.append(
+                _Issue(
+                    (table,),
+                    "ACCESS EXCLUSIVE",
+                    ERROR,
+                    "rewrites the table while blocking reads and writes",
+                    "avoid on live tables, or do it during a maintenance window",
+                )
+            )
+        else:
+            issues.append(_Issue((table,), "ACCESS EXCLUSIVE", WARNING, _BRIEF, _BRIEF_HINT))
+    return issues
+
+
+def statement_issues(text: str, index_tables: dict[str, str]) -> list[_Issue]:
+    """Classify one statement (comments stripped, whitespace collapsed, upper-cased)."""
+
+    match = re.match(
+        r"CREATE (UNIQUE )?INDEX (CONCURRENTLY )?(?:IF NOT EXISTS )?(?:\S+ )?ON (?:ONLY )?" + _NAME,
+        text,
+    )
+    if match:
+        if match.group(2):
+            return []
+        return [
+            _Issue(
+                (table_name(match.group(3)),),
+                "SHARE",
+                ERROR,
+                "blocks INSERT/UPDATE/DELETE for the whole index build",
+                f"CREATE {match.group(1) or ''}INDEX CONCURRENTLY, in a file starting with "
+                "'-- migrate: no-transaction'",
+            )
+        ]
+    match = re.match(r"DROP INDEX (CONCURRENTLY )?(?:IF EXISTS )?(.+?)( CASCADE| RESTRICT)?$", text)
+    if match:
+        if match.group(1):
+            return []
+        issues = []
+        for name in split_top_level(match.group(2)):
+            table = index_tables.get(table_name(name), "?")
+            issues.append(
+                _Issue(
+                    (table,),
+                    "ACCESS EXCLUSIVE",
+                    ERROR,
+                    "blocks reads and writes on the table until every running query on it finishes",
+                    "DROP INDEX CONCURRENTLY, in a file starting with '-- migrate: no-transaction'",
+                )
+            )
+        return issues
+    match = re.match(r"REINDEX (?:\(.*?\) )?(INDEX|TABLE) (CONCURRENTLY )?" + _NAME, text)
+    if match:
+        if match.group(2):
+            return []
+        name = table_name(match.group(3))
+        table = index_tables.get(name, "?") if match.group(1) == "INDEX" else name
+        return [
+            _Issue(
+                (table,),
+                "SHARE",
+                ERROR,
+                "blocks writes for the whole rebuild",
+                "REINDEX ... CONCURRENTLY",
+            )
+        ]
+    match = re.match(r"ALTER TABLE (?:IF EXISTS )?(?:ONLY )?" + _NAME + r" (.*)$", text)
+    if match:
+        return _alter_table_issues(table_name(match.group(1)), match.group(2))
+    match = re.match(r"(DROP TABLE|TRUNCATE)(?: TABLE)? (?:IF EXISTS )?(?:ONLY )?(.+?)( CASCADE| RESTRICT)?$", text)
+    if match:
+        return [
+            _Issue(
+                tuple(table_name(name) for name in split_top_level(match.group(2))),
+                "ACCESS EXCLUSIVE",
+                ERROR,
+                f"{match.group(1)} removes data and blocks all access to the table",
+                "never on a hot table in a migration; archive or rename first",
+            )
+        ]
+    match = re.match(r"(VACUUM \(?FULL|CLUSTER)\b.*?" + _NAME + r"\s*(?:USING \S+)?$", text)
+    if match:
+        return [
+            _Issue(
+                (table_name(match.group(2)),),
+                "ACCESS EXCLUSIVE",
+                ERROR,
+                "rewrites the table while blocking reads and writes",
+                "use pg_repack or a maintenance window",
+            )
+        ]
+    match = re.match(r"LOCK (?:TABLE )?(?:ONLY )?(.+?)(?: IN (.+) MODE)?( NOWAIT)?$", text)
+    if match:
+        mode = match.group(2) or "ACCESS EXCLUSIVE"
+        if mode in ("ACCESS SHARE", "ROW SHARE", "ROW EXCLUSIVE", "SHARE UPDATE EXCLUSIVE"):
+            return []
+        return [
+            _Issue(
+                tuple(table_name(name) for name in split_top_level(match.group(1))),
+                mode,
+                ERROR,
+                "an explicit lock that blocks writes until the transaction ends",
+                "remove it, or keep the transaction tiny and under lock_timeout",
+            )
+        ]
+    match = _TRIGGER.match(text)
+    if match:
+        return [
+            _Issue(
+                (table_name(match.group(1)),),
+                "SHARE ROW EXCLUSIVE",
+                WARNING,
+                "briefly blocks writes while the trigger is attached",
+                _BRIEF_HINT,
+            )
+        ]
+    return []
+
+
+def _created_table(text: str) -> Optional[str]:
+    match = re.match(r"CREATE (?:UNLOGGED |TEMP |TEMPORARY )?TABLE (?:IF NOT EXISTS )?" + _NAME, text)
+    return table_name(match.group(1)) if match else None
+
+
+def _created_index(text: str) -> Optional[tuple[str, str]]:
+    match = re.match(
+        r"CREATE (?:UNIQUE )?INDEX (?:CONCURRENTLY )?(?:IF NOT EXISTS )?(\S+) ON (?:ONLY )?" + _NAME,
+        text,
+    )
+    if not match or match.group(1) == "ON":
+        return None
+    return table_name(match.group(1)), table_name(match.group(2))
+
+
+def analyze_sql(
+    script: str,
+    *,
+    path: str = "<sql>",
+    hot_tables: Iterable[str] = HOT_TABLES,
+    all_tables: bool = False,
+    assume_existing: bool = False,
+    index_tables: Optional[dict[str, str]] = None,
+) -> list[Finding]:
+    """Return the lock findings for one SQL file."""
+
+    hot = {table.lower() for table in hot_tables}
+    index_tables = dict(index_tables or {})
+    transactional = not script.lstrip().startswith(NO_TRANSACTION)
+    created: set[str] = set()
+    # Existing tables a CREATE TRIGGER in this transaction keeps write-locked.
+    triggered: list[str] = []
+    findings = []
+    offset = 0
+    for statement in split_script(script):
+        position = script.find(statement, offset)
+        # Comments are stripped by the splitter; the marker sits between statements.
+        preamble = script[offset:position] if position >= 0 else ""
+        offset = position + len(statement) if position >= 0 else offset
+        line = script.count("\n", 0, max(position, 0)) + 1
+        text = " ".join(strip_comments(statement).split())
+        upper = text.upper()
+        if (table := _created_table(upper)) and not assume_existing:
+            created.add(table)
+        if index := _created_index(upper):
+            index_tables[index[0]] = index[1]
+        issues = statement_issues(upper, index_tables)
+        if triggered and _SCAN_OR_DML.match(upper):
+            issues.append(
+                _Issue(
+                    tuple(triggered),
+                    "SHARE ROW EXCLUSIVE",
+                    ERROR,
+                    "runs while a CREATE TRIGGER earlier in this transaction still blocks writes",
+                    "attach the trigger in a short transaction of its own, then backfill in batches "
+                    "from a file starting with '-- migrate: no-transaction'",
+                )
+            )
+        if transactional and (trigger := _TRIGGER.match(upper)):
+            table = table_name(trigger.group(1))
+            if table not in created and table not in triggered:
+                triggered.append(table)
+        if ALLOW_MARKER in preamble.lower() or ALLOW_MARKER in statement.lower():
+            continue
+        for issue in issues:
+            if issue.scanned in created:
+                continue
+            affected = [
+                table
+                for table in issue.tables
+                if table not in created and (all_tables or table in hot or table == "?")
+            ]
+            if affected:
+                findings.append(
+                    Finding(
+                        path=path,
+                        line=line,
+                        table=", ".join(affected),
+                        lock=issue.lock,
+                        severity=issue.severity,
+                        statement=_summary(text),
+                        problem=issue.problem,
+                        suggestion=issue.suggestion,
+                    )
+                )
+    return findings
+
+
+def index_tables_from(script: str) -> dict[str, str]:
+    """Map index names to their tables (e.g. from ``schema.sql``) for DROP INDEX checks."""
+
+    mapping = {}
+    for statement in split_script(script):
+        if index := _created_index(" ".join(strip_comments(statement).split()).upper()):
+            mapping[index[0]] = index[1]
+    return mapping
+
+
+def analyze_paths(
+    paths: Sequence[Path], *, index_tables: Optional[dict[str, str]] = None, **options: object
+) -> list[Finding]:
+    """Analyze files in order; indexes created by earlier files resolve later ``DROP INDEX``."""
+
+    findings = []
+    index_tables = dict(index_tables or {})
+    for path in paths:
+        files = sorted(path.glob("*.sql")) if path.is_dir() else [path]
+        for file in files:
+            script = file.read_text(encoding="utf-8")
+            findings.extend(analyze_sql(script, path=str(file), index_tables=index_tables, **options))
+            index_tables.update(index_tables_from(script))
+    return findings
+
+
+def format_findings(findings: Sequence[Finding]) -> str:
+    lines = []
+    for finding in findings:
+        lines.append(
+            f"{finding.path}:{finding.line}: {finding.severity}: {finding.lock} on {finding.table}: "
+            f"{finding.problem}\n    {finding.statement}\n    suggestion: {finding.suggestion}"
+        )
+    errors = sum(finding.severity == ERROR for finding in findings)
+    lines.append(f"{errors} error(s), {len(findings) - errors} warning(s)")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, default=[MIGRATIONS_DIR])
+    parser.add_argument("--hot-table", action="append", default=[], help="treat this table as hot too")
+    parser.add_argument("--all-tables", action="store_true", help="report on every table, not only hot ones")
+    parser.add_argument("--assume-existing", action="store_true", help="do not exempt tables created in the file")
+    parser.add_argument("--schema", type=Path, help="schema dump used to resolve DROP INDEX tables")
+    parser.add_argument("--strict", action="store_true", help="fail on warnings too")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    findings = analyze_paths(
+        args.paths,
+        hot_tables=HOT_TABLES | {table.lower() for table in args.hot_table},
+        all_tables=args.all_tables,
+        assume_existing=args.assume_existing,
+        index_tables=index_tables_from(args.schema.read_text(encoding="utf-8")) if args.schema else None,
+    )
+    if args.json:
+        print(json.dumps([asdict(finding) for finding in findings], indent=2))
+    else:
+        print(format_findings(findings))
+    failing = [finding for finding in findings if args.strict or finding.severity == ERROR]
+    sys.exit(1 if failing else 0)
+
+
+if __name__ == "__main__":
+    main()
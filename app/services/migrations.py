@@ -0,0 +1,338 @@
+"""Versioned, checksummed migrations for the ``reflex`` schema.
+
+Migrations are the numbered files in ``app/services/sql/migrations``
+(``NNNN_name.sql``). Applied files are recorded with their checksum in
+``reflex.schema_migrations``. The Docker image runs
+``python -m app.services.migrations`` before starting the backend:
+
+* when every file is recorded with an unchanged checksum, the run is one read
+  of the ledger and issues no DDL;
+* otherwise it takes an advisory lock, so containers starting together apply
+  each migration once, and runs every pending file in its own transaction;
+* each statement runs under ``MIGRATION_LOCK_TIMEOUT`` and
+  ``MIGRATION_STATEMENT_TIMEOUT`` (milliseconds) and its duration is stored in
+  the ledger. A migration that gives up waiting for a lock is retried
+  (``MIGRATION_LOCK_RETRIES``) rather than queueing in front of live traffic.
+
+A file whose checksum changed after it was applied stops the run; add a new
+file instead. Files whose first line is ``-- migrate: no-transaction`` run
+statement by statement outside a transaction (for ``CREATE INDEX
+CONCURRENTLY``) and must be safe to re-run. An interrupted concurrent build
+leaves an invalid index that ``IF NOT EXISTS`` would skip, so the indexes such
+a file builds are checked in ``pg_index``: invalid ones are dropped
+(``DROP INDEX CONCURRENTLY``) before the file runs, and one still invalid
+afterwards fails the run instead of being recorded.
+
+Before applying anything, pending files go through the lock-impact analyzer
+(``app.services.lock_analyzer``); a file that would hold a write-blocking lock
+on a hot table for the length of a scan or rewrite stops the run
+(``--skip-lock-check`` to override).
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+from app.services.lock_analyzer import ERROR, analyze_sql
+from app.utils.env import database_url, env_int
+from app.utils.sql import NO_TRANSACTION, SqlFile, load_sql_files, strip_comments
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "sql" / "migrations"
+
+_NAME = r'((?:"[^"]+"|[\w$]+)(?:\.(?:"[^"]+"|[\w$]+))?)'
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY (?:IF NOT EXISTS )?" + _NAME + r" ON (?:ONLY )?" + _NAME,
+    re.I,
+)
+
+# Of the given index names, those whose build did not finish.
+INVALID_INDEXES = """
+SELECT x.indexrelid::regclass::text AS name
+FROM unnest(%s::text[]) AS built(name)
+JOIN pg_index x ON x.indexrelid = to_regclass(built.name)
+WHERE NOT x.indisvalid
+"""
+
+
+class MigrationError(Exception):
+    """The migrations on disk do not match what the database has applied."""
+
+
+def uses_transaction(file: SqlFile) -> bool:
+    return not file.text.lstrip().startswith(NO_TRANSACTION)
+
+
+def concurrent_indexes(file: SqlFile) -> list[str]:
+    """Names of the indexes ``file`` builds with ``CREATE INDEX CONCURRENTLY``.
+
+    An unqualified name gets the schema of its table, where Postgres puts it.
+    """
+
+    names = []
+    for statement in file.statements:
+        if match := _CONCURRENT_INDEX.match(" ".join(strip_comments(statement).split())):
+            index, table = match.groups()
+            schema = table.rpartition(".")[0]
+            names.append(f"{schema}.{index}" if schema and "." not in index else index)
+    return names
+
+
+def check_locks(files: Sequence[SqlFile], index_tables: Optional[dict[str, str]] = None) -> None:
+    """Refuse files the lock analyzer reports errors for."""
+
+    errors = [
+        finding
+        for file in files
+        for finding in analyze_sql(
+            file.text, path=f"{file.version:04d}_{file.name}", index_tables=index_tables
+        )
+        if finding.severity == ERROR
+    ]
+    if errors:
+        details = "; ".join(
+            f"{finding.path}:{finding.line} {finding.lock} on {finding.table} ({finding.suggestion})"
+            for finding in errors
+        )
+        raise MigrationError(f"Unsafe locks in pending migrations: {details}")
+
+
+def _summary(statement: str) -> str:
+    text = " ".join(strip_comments(statement).split())
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+class MigrationRunner:
+    """Apply pending migration files and record them in the ledger."""
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        directory: Path = MIGRATIONS_DIR,
+        schema: str = "reflex",
+        lock_timeout_ms: Optional[int] = None,
+        statement_timeout_ms: Optional[int] = None,
+        lock_retries: Optional[int] = None,
+        retry_delay: float = 1.0,
+        lock_check: bool = True,
+    ) -> None:
+        self.dsn = dsn or database_url()
+        self.files = load_sql_files(directory)
+        self.schema = schema
+        self.ledger = sql.SQL("{}.schema_migrations").format(sql.Identifier(schema))
+        self.lock_timeout_ms = lock_timeout_ms or env_int("MIGRATION_LOCK_TIMEOUT", 3000)
+        self.statement_timeout_ms = statement_timeout_ms or env_int(
+            "MIGRATION_STATEMENT_TIMEOUT", 300000
+        )
+        self.lock_retries = env_int("MIGRATION_LOCK_RETRIES", 5) if lock_retries is None else lock_retries
+        self.retry_delay = retry_delay
+        self.lock_check = lock_check
+
+    def applied(self, conn: psycopg.Connection) -> Optional[dict[int, str]]:
+        """Return ``{version: checksum}`` from the ledger, or ``None`` if it is missing."""
+
+        exists = conn.execute(
+            "SELECT to_regclass(format('%%I.schema_migrations', %s::text)) IS NOT NULL",
+            [self.schema],
+        ).fetchone()[0]
+        if not exists:
+            return None
+        rows = conn.execute(sql.SQL("SELECT version, checksum FROM {}").format(self.ledger))
+        return {version: checksum for version, checksum in rows}
+
+    def pending(self, applied: dict[int, str]) -> list[SqlFile]:
+        changed = [
+            f"{file.version:04d}_{file.name}"
+            for file in self.files
+            if file.version in applied and applied[file.version] != file.checksum
+        ]
+        if changed:
+            raise MigrationError(
+                f"Applied migrations were edited: {', '.join(changed)}. Add a new migration instead."
+            )
+        return [file for file in self.files if file.version not in applied]
+
+    def check_locks(self, files: list[SqlFile]) -> None:
+        check_locks(files)
+
+    def run(self, *, dry_run: bool = False) -> list[dict[str, Any]]:
+        """Apply every pending migration; return one result per file."""
+
+        if not self.dsn:
+            raise ConnectionError("DATABASE_URL or REFLEX_DB_URL is not set.")
+        with psycopg.connect(self.dsn, autocommit=True) as conn:
+            applied = self.applied(conn)
+            pending = self.pending(applied or {})
+            if pending and self.lock_check:
+                self.check_locks(pending)
+            if not pending or dry_run:
+                return [
+                    {"version": file.version, "name": file.name, "status": "pending"}
+                    for file in pending
+                ]
+            lock_key = f"{self.schema}.schema_migrations"
+            conn.execute("SELECT pg_advisory_lock(hashtext(%s))", [lock_key])
+            try:
+                self._create_ledger(conn)
+                # Another container may have applied them while we waited.
+                return [self._apply(conn, file) for file in self.pending(self.applied(conn) or {})]
+            finally:
+                conn.execute("SELECT pg_advisory_unlock(hashtext(%s))", [lock_key])
+
+    def _create_ledger(self, conn: psycopg.Connection) -> None:
+        conn.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(self.schema)))
+        conn.execute(
+            sql.SQL(
+                """
+                CREATE TABLE IF NOT EXISTS {} (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    duration_ms NUMERIC NOT NULL,
+                    statement_timings JSONB NOT NULL DEFAULT '[]'
+                )
+                """
+            ).format(self.ledger)
+        )
+
+    def _apply(self, conn: psycopg.Connection, file: SqlFile) -> dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                return self._apply_once(conn, file)
+            except psycopg.errors.LockNotAvailable:
+                if attempt >= self.lock_retries:
+                    raise
+                delay = self.retry_delay * 2**attempt
+                attempt += 1
+                logger.warning(
+                    "Migration %04d_%s hit lock_timeout; retry %s/%s in %.1fs",
+                    file.version,
+                    file.name,
+                    attempt,
+                    self.lock_retries,
+                    delay,
+                )
+                time.sleep(delay)
+
+    def _set_timeouts(self, conn: psycopg.Connection, *, local: bool) -> None:
+        conn.execute(
+            "SELECT set_config('lock_timeout', %s, %s), set_config('statement_timeout', %s, %s)",
+            [f"{self.lock_timeout_ms}ms", local, f"{self.statement_timeout_ms}ms", local],
+        )
+
+    def _apply_once(self, conn: psycopg.Connection, file: SqlFile) -> dict[str, Any]:
+        timings: list[dict[str, Any]] = []
+        started = time.perf_counter()
+
+        def execute_all() -> None:
+            for statement in file.statements:
+                statement_started = time.perf_counter()
+                conn.execute(statement, prepare=False)
+                timings.append(
+                    {
+                        "statement": _summary(statement),
+                        "ms": round((time.perf_counter() - statement_started) * 1000, 3),
+                    }
+                )
+
+        if uses_transaction(file):
+            with conn.transaction():
+                self._set_timeouts(conn, local=True)
+                execute_all()
+                duration_ms = round((time.perf_counter() - started) * 1000, 3)
+                self._record(conn, file, duration_ms, timings)
+        else:
+            indexes = concurrent_indexes(file)
+            self._set_timeouts(conn, local=False)
+            try:
+                for name in self._invalid_indexes(conn, indexes):
+                    logger.warning("Dropping invalid index %s left by an interrupted build", name)
+                    conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.SQL(name)))
+                execute_all()
+                if invalid := self._invalid_indexes(conn, indexes):
+                    raise MigrationError(
+                        f"{file.version:04d}_{file.name} left invalid indexes: {', '.join(invalid)}"
+                    )
+            finally:
+                conn.execute("RESET lock_timeout")
+                conn.execute("RESET statement_timeout")
+            duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            self._record(conn, file, duration_ms, timings)
+        logger.info("Applied migration %04d_%s in %.1fms", file.version, file.name, duration_ms)
+        return {
+            "version": file.version,
+            "name": file.name,
+            "status": "applied",
+            "ms": duration_ms,
+            "statements": timings,
+        }
+
+    def _invalid_indexes(self, conn: psycopg.Connection, names: list[str]) -> list[str]:
+        if not names:
+            return []
+        return [name for (name,) in conn.execute(INVALID_INDEXES, [names])]
+
+    def _record(
+        self, conn: psycopg.Connection, file: SqlFile, duration_ms: float, timings: list[dict[str, Any]]
+    ) -> None:
+        conn.execute(
+            sql.SQL(
+                "INSERT INTO {} (version, name, checksum, duration_ms, statement_timings) "
+                "VALUES (%s, %s, %s, %s, %s)"
+            ).format(self.ledger),
+            [file.version, file.name, file.checksum, duration_ms, Jsonb(timings)],
+        )
+
+
+def run_migrations(
+    dry_run: bool = False, dsn: Optional[str] = None, lock_check: bool = True
+) -> list[dict[str, Any]]:
+    return MigrationRunner(dsn, lock_check=lock_check).run(dry_run=dry_run)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", help="Postgres DSN (default: DATABASE_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations only")
+    parser.add_argument(
+        "--skip-lock-check", action="store_true", help="apply files the lock analyzer rejects"
+    )
+    args = parser.parse_args()
+    if not (args.dsn or database_url()):
+        logger.warning("DATABASE_URL not set; skipping migrations.")
+        return
+    try:
+        results = run_migrations(
+            dry_run=args.dry_run, dsn=args.dsn, lock_check=not args.skip_lock_check
+        )
+    except Exception as exc:
+        logger.error("Migrations failed: %s", exc)
+        sys.exit(1)
+    if not results:
+        logger.info("Schema is up to date.")
+    for result in results:
+        logger.info(
+            "%04d_%s: %s%s",
+            result["version"],
+            result["name"],
+            result["status"],
+            f" ({result['ms']:.1f}ms)" if "ms" in result else "",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Direct Postgres storage backend built on an async psycopg connection pool.
+
+Selected with ``STORAGE_BACKEND=postgres``. It exposes the same coroutine API
+as :class:`app.services.supabase_client.SupabaseClient` but talks to Postgres
+over ``DATABASE_URL`` instead of PostgREST: statements are prepared on the
+server and multi-row writes run inside real transactions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import decimal
+import json
+import logging
+import os
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, List, Optional
+
+from postgrest import APIResponse
+from psycopg import AsyncConnection, sql
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+
+from app.services.resilience import call_with_resilience
+from app.services.storage import StorageClient
+from app.utils.env import database_url, env_int
+
+USER_COLUMNS = (
+    "id",
+    "email",
+    "username",
+    "tax_number",
+    "first_name",
+    "last_name",
+    "birth_date",
+    "country",
+    "postal_code",
+    "house_number",
+    "is_owner",
+)
+
+SESSION_QUERY = sql.SQL(
+    """
+    SELECT {user_columns},
+           m.plan, m.boteco_id, m.assigned_role,
+           b.username AS boteco_username, b.public_name AS boteco_public_name
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT ub.plan, ub.boteco_id, ub.assigned_role
+        FROM user_boteco ub
+        WHERE ub.user_id = u.id
+        ORDER BY ub.created_at DESC
+        LIMIT 1
+    ) m ON true
+    LEFT JOIN boteco b ON b.id = m.boteco_id
+    WHERE u.email = %s
+    LIMIT 1
+    """
+).format(user_columns=sql.SQL(", ").join(sql.Identifier("u", column) for column in USER_COLUMNS))
+
+
+def _prepare_threshold() -> Optional[int]:
+    """Server-side prepare threshold; ``none`` disables it (pgbouncer transaction mode)."""
+
+    raw = os.getenv("POSTGRES_PREPARE_THRESHOLD", "0").strip().lower()
+    if raw in {"", "none", "off"}:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        logging.warning("Invalid POSTGRES_PREPARE_THRESHOLD %r; preparing on first use.", raw)
+        return 0
+
+
+def _jsonable(value: Any) -> Any:
+    """Convert driver types to the JSON shapes PostgREST would have returned."""
+
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _adapt(value: Any) -> Any:
+    return Jsonb(value) if isinstance(value, dict) else value
+
+
+def _insert_query(
+    table: str, columns: list[str], conflict: Optional[str] = None
+) -> sql.Composed:
+    query = sql.SQL("INSERT INTO {table} ({columns}) VALUES ({values})").format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+        values=sql.SQL(", ").join(sql.Placeholder() * len(columns)),
+    )
+    if conflict:
+        updates = [column for column in columns if column != conflict]
+        action = (
+            sql.SQL("DO UPDATE SET {}").format(
+                sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                    for column in updates
+                )
+            )
+            if updates
+            else sql.SQL("DO NOTHING")
+        )
+        query = sql.SQL("{} ON CONFLICT ({}) {}").format(query, sql.Identifier(conflict), action)
+    return sql.SQL("{} RETURNING *").format(query)
+
+
+class PostgresClient(StorageClient):
+    """Storage backend that talks to Postgres through an async connection pool."""
+
+    breaker_name = "postgres"
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        schema: str = "reflex",
+        pool: Optional[AsyncConnectionPool] = None,
+        **policies: Any,
+    ) -> None:
+        super().__init__(**policies)
+        self.dsn = dsn or database_url()
+        self.schema = schema
+        self._pool = pool
+        self._pool_lock = asyncio.Lock()
+
+    async def _configure(self, conn: AsyncConnection) -> None:
+        conn.prepare_threshold = _prepare_threshold()
+        await conn.execute(
+            sql.SQL("SET search_path TO {}, public").format(sql.Identifier(self.schema))
+        )
+        await conn.commit()
+
+    async def pool(self) -> AsyncConnectionPool:
+        """Return the connection pool, opening it on first use."""
+
+        if self._pool is not None and not self._pool.closed:
+            return self._pool
+        if not self.dsn:
+            raise ConnectionError("Postgres backend not configured. Check DATABASE_URL.")
+        async with self._pool_lock:
+            if self._pool is None or self._pool.closed:
+                pool = AsyncConnectionPool(
+                    self.dsn,
+                    min_size=env_int("POSTGRES_POOL_MIN_SIZE", 1),
+                    max_size=env_int("POSTGRES_POOL_MAX_SIZE", 10),
+                    kwargs={"row_factory": dict_row},
+                    configure=self._configure,
+                    open=False,
+                    name="boteco-storage",
+                )
+                await pool.open()
+                self._pool = pool
+        return self._pool
+
+    async def aclose(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+
+    async def _run(
+        self,
+        work: Callable[[AsyncConnection], Awaitable[Any]],
+        *,
+        key: Optional[Hashable] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Any:
+        """Run ``work`` on a pooled connection inside one transaction.
+
+        Mirrors ``SupabaseClient._execute``: keyed reads are coalesced and
+        retried, everything goes through the circuit breaker.
+        """
+
+        retry = self.retry if (key is not None if idempotent is None else idempotent) else None
+
+        async def attempt() -> Any:
+            pool = await self.pool()
+            async with pool.connection() as conn:
+                async with conn.transaction():
+                    return await work(conn)
+
+        async def call() -> Any:
+            try:
+                return await call_with_resilience(attempt, retry=retry, breaker=self.breaker)
+            except Exception as exc:
+                logging.exception("Postgres request failed: %s", exc)
+                raise
+
+        if key is not None:
+            return await self.inflight.do(key, call)
+        return await call()
+
+    async def _insert(
+        self, table: str, row: dict[str, Any], conflict: Optional[str] = None, **options: Any
+    ) -> List[dict[str, Any]]:
+        columns = list(row)
+        query = _insert_query(table, columns, conflict)
+
+        async def work(conn: AsyncConnection) -> List[dict[str, Any]]:
+            cursor = await conn.execute(query, [_adapt(row[column]) for column in columns])
+            return [_jsonable(record) for record in await cursor.fetchall()]
+
+        return await self._run(work, **options)
+
+    async def create_user(self, user_data: dict[str, Any]) -> List[dict[str, Any]]:
+        """Insert a new user profile into the `users` table."""
+
+        rows = await self._insert("users", user_data)
+        await self._invalidate_user(user_data.get("email"))
+        return rows
+
+    async def upsert_user(self, user_data: dict[str, Any]) -> List[dict[str, Any]]:
+        """Insert or update a user record based on email uniqueness."""
+
+        rows = await self._insert("users", user_data, conflict="email", idempotent=True)
+        await self._invalidate_user(user_data.get("email"))
+        return rows
+
+    async def _upsert_user_rows(self, rows: List[dict[str, Any]]) -> List[dict[str, Any]]:
+        """Upsert a chunk of users with one multi-row ``INSERT ... ON CONFLICT``."""
+
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        updates = [column for column in columns if column != "email"]
+        query = sql.SQL(
+            "INSERT INTO users ({columns}) VALUES {values} ON CONFLICT (email) {action} RETURNING id, email"
+        ).format(
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+            values=sql.SQL(", ").join(
+                sql.SQL("({})").format(
+                    sql.SQL(", ").join(
+                        sql.Placeholder() if column in row else sql.DEFAULT for column in columns
+                    )
+                )
+                for row in rows
+            ),
+            action=(
+                sql.SQL("DO UPDATE SET {}").format(
+                    sql.SQL(", ").join(
+                        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                        for column in updates
+                    )
+                )
+                if updates
+                else sql.SQL("DO NOTHING")
+            ),
+        )
+        params = [_adapt(row[column]) for row in rows for column in columns if column in row]
+
+        async def work(conn: AsyncConnection) -> List[dict[str, Any]]:
+            cursor = await conn.execute(query, params, prepare=False)
+            return [_jsonable(record) for record in await cursor.fetchall()]
+
+        return await self._run(work, idempotent=True)
+
+    async def delete_boteco(self, boteco_id: str) -> APIResponse:
+        """Delete a boteco record (used for rollbacks)."""
+
+        async def work(conn: AsyncConnection) -> List[dict[str, Any]]:
+            cursor = await conn.execute("DELETE FROM boteco WHERE id = %s RETURNING *", [boteco_id])
+            return [_jsonable(record) for record in await cursor.fetchall()]
+
+        rows = await self._run(work, idempotent=True)
+        await self._invalidate_memberships()
+        return APIResponse(data=rows)
+
+    async def create_boteco_and_associate_user(
+        self, boteco_data: dict[str, Any], user_boteco_data: dict[str, Any]
+    ) -> tuple[APIResponse, APIResponse]:
+        """Create a boteco and its owner association in one database transaction."""
+
+        boteco_columns = list(boteco_data)
+
+        async def work(conn: AsyncConnection) -> tuple[dict[str, Any], dict[str, Any]]:
+            cursor = await conn.execute(
+                _insert_query("boteco", boteco_columns),
+                [_adapt(boteco_data[column]) for column in boteco_columns],
+            )
+            boteco = await cursor.fetchone()
+            if not boteco:
+                raise ValueError("Failed to create boteco. Nenhum dado retornado.")
+            link = {**user_boteco_data, "boteco_id": boteco["id"]}
+            cursor = await conn.execute(
+                _insert_query("user_boteco", list(link)), [_adapt(value) for value in link.values()]
+            )
+            user_boteco = await cursor.fetchone()
+            if not user_boteco:
+                raise ValueError("Falha ao associar o usuário ao boteco recém-criado.")
+            return _jsonable(boteco), _jsonable(user_boteco)
+
+        boteco, user_boteco = await self._run(work)
+        user_boteco_data["boteco_id"] = boteco["id"]
+        await self._invalidate(f"user_boteco:user:{user_boteco.get('user_id')}")
+        await self._invalidate_user(boteco.get("created_by_email"))
+        return APIResponse(data=[boteco]), APIResponse(data=[user_boteco])
+
+    async def check_user_has_boteco(self, user_id: str) -> bool:
+        """Check if a user is associated with any boteco."""
+
+        async def work(conn: AsyncConnection) -> bool:
+            cursor = await conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM user_boteco WHERE user_id = %s) AS found", [user_id]
+            )
+            row = await cursor.fetchone()
+            return bool(row and row["found"])
+
+        return await self._cached(
+            f"user_boteco:user:{user_id}",
+            lambda: self._run(work, key=("user_boteco", "user_id", user_id, "exists")),
+        )
+
+    async def get_user_by_email(self, email: str) -> List[dict[str, Any]]:
+        """Return user records that match the given email (list)."""
+
+        query = sql.SQL("SELECT {} FROM users WHERE email = %s LIMIT 1").format(
+            sql.SQL(", ").join(map(sql.Identifier, USER_COLUMNS))
+        )
+
+        async def work(conn: AsyncConnection) -> List[dict[str, Any]]:
+            cursor = await conn.execute(query, [email])
+            return [_jsonable(record) for record in await cursor.fetchall()]
+
+        return await self._cached(
+            f"user:email:{email}",
+            lambda: self._run(work, key=("users", "email", email, USER_COLUMNS)),
+        )
+
+    async def bootstrap_session(self, email: str) -> Optional[dict[str, Any]]:
+        """Load the user, boteco membership and plan for a sign-in in one query."""
+
+        async def work(conn: AsyncConnection) -> Optional[dict[str, Any]]:
+            cursor = await conn.execute(SESSION_QUERY, [email])
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            row = _jsonable(row)
+            has_boteco = row["boteco_id"] is not None
+            return {
+                "user": {column: row[column] for column in USER_COLUMNS},
+                "has_boteco": has_boteco,
+                "plan": row["plan"],
+                "boteco": (
+                    {
+                        "id": row["boteco_id"],
+                        "username": row["boteco_username"],
+                        "public_name": row["boteco_public_name"],
+                    }
+                    if has_boteco
+                    else None
+                ),
+            }
+
+        return await self._cached(
+            f"session:email:{email}",
+            lambda: self._run(work, key=("users", "email", email, "session")),
+        )
+
+    async def get_dashboard_kpis(self, tenant_schema: str) -> Optional[dict[str, Any]]:
+        """Read today's KPIs of a tenant from its rollups (``reflex.dashboard_kpis``)."""
+
+        async def work(conn: AsyncConnection) -> Optional[dict[str, Any]]:
+            cursor = await conn.execute("SELECT reflex.dashboard_kpis(%s) AS kpis", [tenant_schema])
+            row = await cursor.fetchone()
+            return row["kpis"] if row else None
+
+        return await self._run(work, key=("dashboard_kpis", tenant_schema))
+
+    async def get_low_stock_items(
+        self, tenant_schema: str, company_id: Optional[str] = None
+    ) -> Optional[List[dict[str, Any]]]:
+        """List the active products at or below their ``min_stock`` (``reflex.low_stock_items``)."""
+
+        async def work(conn: AsyncConnection) -> Optional[List[dict[str, Any]]]:
+            cursor = await conn.execute(
+                "SELECT reflex.low_stock_items(%s, %s) AS items", [tenant_schema, company_id]
+            )
+            row = await cursor.fetchone()
+            return row["items"] if row else None
+
+        return await self._run(work, key=("low_stock_items", tenant_schema, company_id))
+
+    async def get_stock_alerts(
+        self, tenant_schema: str, after_id: int = 0, limit: int = 100
+    ) -> Optional[List[dict[str, Any]]]:
+        """Return up to ``limit`` threshold-crossing events with an id above ``after_id``."""
+
+        async def work(conn: AsyncConnection) -> Optional[List[dict[str, Any]]]:
+            cursor = await conn.execute(
+                "SELECT reflex.stock_alerts(%s, %s, %s) AS alerts", [tenant_schema, after_id, limit]
+            )
+            row = await cursor.fetchone()
+            return row["alerts"] if row else None
+
+        return await self._run(work, key=("stock_alerts", tenant_schema, after_id, limit))
+
+    async def close_order(
+        self,
+        tenant_schema: str,
+        order_id: str,
+        payment_method: str,
+        cashier_id: Optional[str] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Close an order, record its sale and deduct stock (``reflex.close_order``)."""
+
+        async def work(conn: AsyncConnection) -> Optional[dict[str, Any]]:
+            cursor = await conn.execute(
+                "SELECT reflex.close_order(%s, %s, %s, %s) AS closed",
+                [tenant_schema, order_id, payment_method, cashier_id],
+            )
+            row = await cursor.fetchone()
+            return row["closed"] if row else None
+
+        return await self._run(work)
+
+    async def listen_stock_alerts(self) -> AsyncIterator[dict[str, Any]]:
+        """Yield ``{"schema", "last_id"}`` each time a transaction records stock alerts.
+
+        Holds a dedicated connection, since ``LISTEN`` does not survive pooling;
+        fetch the alerts themselves with :meth:`get_stock_alerts`.
+        """
+
+        if not self.dsn:
+            raise ConnectionError("Postgres backend not configured. Check DATABASE_URL.")
+        async with await AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+            await conn.execute("LISTEN stock_alerts")
+            async for notify in conn.notifies():
+                yield json.loads(notify.payload)
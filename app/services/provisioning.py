@@ -0,0 +1,74 @@
+"""Tenant provisioning, run by the provisioning job workers and by the HTTP API.
+
+``OnboardingState.handle_payment_submit`` enqueues a job that the workers in
+:mod:`app.services.provisioning_jobs` run through :func:`provision_org`;
+``POST /api/provision_org`` calls it directly (or enqueues a job when asked
+to respond asynchronously), so onboarding never loops back through localhost.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from typing import Optional
+
+from app.services.sql_executor import sql_executor
+from app.services.storage import StorageClient
+from app.services.supabase_admin import SupabaseAdmin
+from app.services.tenant_pool import TenantSchemaPool, tenant_pool
+from app.services.tenant_template import tenant_script
+
+_USERNAME_RE = re.compile(r"^[a-zA-Z0-9_]+$")
+DUPLICATE_SCHEMA = "42P06"
+
+
+def tenant_schema(boteco_username: str) -> str:
+    """Return the tenant schema name for a boteco, validating the username."""
+
+    if not boteco_username or not _USERNAME_RE.match(boteco_username):
+        raise ValueError(
+            "Invalid boteco_username format. Use only alphanumeric characters and underscores."
+        )
+    return f"org_{boteco_username}"
+
+
+def _is_duplicate_schema(exc: BaseException) -> bool:
+    return DUPLICATE_SCHEMA in (getattr(exc, "sqlstate", None), getattr(exc, "code", None))
+
+
+async def provision_org(
+    boteco_username: str,
+    *,
+    storage: Optional[StorageClient] = None,
+    admin: Optional[SupabaseAdmin] = None,
+    pool: Optional[TenantSchemaPool] = None,
+) -> str:
+    """Create the tenant schema for ``boteco_username`` and return its name.
+
+    A schema is claimed from the warm pool when one is available, otherwise
+    it is built from the tenant template in one transaction; a schema that
+    already exists is treated as provisioned, so retries are safe. With the
+    ``postgres`` storage backend the SQL runs over its connection pool;
+    otherwise it goes through the shared service-role admin client.
+    """
+
+    schema = tenant_schema(boteco_username)
+    executor = sql_executor(storage, admin)
+    pool = pool or tenant_pool
+    started = time.perf_counter()
+    source = "pool" if await pool.claim(schema, executor) else "create"
+    if source == "create":
+        try:
+            await executor.execute(tenant_script(schema))
+        except Exception as exc:
+            if not _is_duplicate_schema(exc):
+                raise
+            # The build is transactional, so an existing schema is a complete
+            # one from an earlier attempt whose reply was lost.
+            source = "existing"
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if source != "existing":
+        pool.record(source, elapsed_ms)
+    logging.info("Provisioned schema %s (%s) in %.1fms", schema, source, elapsed_ms)
+    return schema
@@ -0,0 +1,324 @@
+"""Durable tenant provisioning jobs.
+
+Onboarding enqueues a job and returns immediately; a pool of asyncio workers
+running inside the backend process (registered as a Reflex lifespan task)
+pulls jobs and calls :func:`app.services.provisioning.provision_org`.
+
+With Redis configured, jobs are JSON documents under ``provisioning:job:<id>``
+and the queue is a Redis list. Workers move an id to
+``provisioning:processing`` while running it (``BLMOVE``), so a job claimed
+by a worker that dies is put back on the queue once its lease expires; a
+live worker refreshes the job every third of the lease while it waits for
+admission and provisions, so a slow job is never run twice.
+A failed attempt is retried after a backoff: the job is handed to the
+``provisioning:scheduled`` sorted set (scored by the time it may run again)
+before the worker lets go of it, and a mover task puts due jobs back on the
+queue, so a retry neither holds a worker nor gets lost if the worker stops.
+Without Redis an in-process queue is used, which is enough for development
+and tests but does not survive restarts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from app.services.admission import ProvisioningAdmission, provisioning_admission
+from app.services.provisioning import provision_org, tenant_schema
+from app.services.redis_client import get_redis
+from app.services.storage import StorageClient
+from app.services.supabase_client import supabase_client
+from app.utils.env import env_float, env_int
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class MemoryJobStore:
+    """In-process job store used when Redis is not configured."""
+
+    def __init__(self) -> None:
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._scheduled: dict[str, float] = {}
+
+    async def save(self, job: dict[str, Any]) -> None:
+        self._jobs[job["id"]] = dict(job)
+
+    async def load(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def push(self, job_id: str) -> None:
+        self._queue.put_nowait(job_id)
+
+    async def schedule(self, job_id: str, not_before: float) -> None:
+        self._scheduled[job_id] = not_before
+
+    async def promote_due(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        due = [job_id for job_id, not_before in self._scheduled.items() if not_before <= now]
+        for job_id in due:
+            del self._scheduled[job_id]
+            self._queue.put_nowait(job_id)
+        return len(due)
+
+    async def claim(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, job_id: str) -> None:
+        return None
+
+    async def requeue_stale(self, lease: float) -> int:
+        return 0
+
+
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job_id in ipairs(due) do
+  redis.call('ZREM', KEYS[1], job_id)
+  redis.call('LPUSH', KEYS[2], job_id)
+end
+return #due
+"""
+
+
+class RedisJobStore:
+    """Job documents and a reliable queue (``BLMOVE`` + processing list) in Redis."""
+
+    def __init__(self, redis: Any, namespace: str = "provisioning", ttl: Optional[int] = None) -> None:
+        self.redis = redis
+        self.namespace = namespace
+        self.ttl = ttl or env_int("PROVISIONING_JOB_TTL", 86400)
+        self.queue_key = f"{namespace}:queue"
+        self.processing_key = f"{namespace}:processing"
+        self.scheduled_key = f"{namespace}:scheduled"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.namespace}:job:{job_id}"
+
+    async def save(self, job: dict[str, Any]) -> None:
+        await self.redis.set(self._job_key(job["id"]), json.dumps(job), ex=self.ttl)
+
+    async def load(self, job_id: str) -> Optional[dict[str, Any]]:
+        raw = await self.redis.get(self._job_key(job_id))
+        return json.loads(raw) if raw is not None else None
+
+    async def push(self, job_id: str) -> None:
+        await self.redis.lpush(self.queue_key, job_id)
+
+    async def schedule(self, job_id: str, not_before: float) -> None:
+        await self.redis.zadd(self.scheduled_key, {job_id: not_before})
+
+    async def promote_due(self, now: Optional[float] = None, limit: int = 100) -> int:
+        """Move scheduled jobs whose time has come onto the queue (atomically)."""
+
+        now = time.time() if now is None else now
+        return int(await self.redis.eval(_PROMOTE_SCRIPT, 2, self.scheduled_key, self.queue_key, now, limit))
+
+    async def claim(self, timeout: float) -> Optional[str]:
+        return await self.redis.blmove(
+            self.queue_key, self.processing_key, timeout, src="RIGHT", dest="LEFT"
+        )
+
+    async def ack(self, job_id: str) -> None:
+        await self.redis.lrem(self.processing_key, 0, job_id)
+
+    async def requeue_stale(self, lease: float) -> int:
+        """Put back jobs whose worker stopped updating them for ``lease`` seconds."""
+
+        requeued = 0
+        cutoff = time.time() - lease
+        for job_id in await self.redis.lrange(self.processing_key, 0, -1):
+            job = await self.load(job_id)
+            if job is not None and job["status"] in (SUCCEEDED, FAILED):
+                await self.ack(job_id)
+                continue
+            if await self.redis.zscore(self.scheduled_key, job_id) is not None:
+                # Its worker scheduled the retry but stopped before acking it.
+                await self.ack(job_id)
+                continue
+            if job is not None and job["updated_at"] > cutoff:
+                continue
+            if await self.redis.lrem(self.processing_key, 1, job_id):
+                if job is not None:
+                    await self.push(job_id)
+                    requeued += 1
+        return requeued
+
+
+def build_job_store() -> MemoryJobStore | RedisJobStore:
+    redis = get_redis()
+    return RedisJobStore(redis) if redis is not None else MemoryJobStore()
+
+
+class ProvisioningJobs:
+    """Enqueue provisioning jobs and run them on a bounded pool of workers."""
+
+    def __init__(
+        self,
+        store: Optional[MemoryJobStore | RedisJobStore] = None,
+        provision: Callable[[str], Awaitable[Any]] = provision_org,
+        storage: Optional[StorageClient] = None,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff: Optional[float] = None,
+        lease: Optional[float] = None,
+        schedule_interval: Optional[float] = None,
+        admission: Optional[ProvisioningAdmission] = None,
+    ) -> None:
+        self._store = store
+        self.admission = admission or provisioning_admission
+        self.provision = provision
+        self.storage = storage
+        self.concurrency = max(1, concurrency or env_int("PROVISIONING_WORKERS", 4))
+        self.max_attempts = max(1, max_attempts or env_int("PROVISIONING_JOB_ATTEMPTS", 3))
+        self.backoff = env_float("PROVISIONING_JOB_BACKOFF", 1.0) if backoff is None else backoff
+        self.lease = lease or env_float("PROVISIONING_JOB_LEASE", 300.0)
+        self.schedule_interval = schedule_interval or env_float("PROVISIONING_SCHEDULE_INTERVAL", 1.0)
+        self.running = 0
+
+    @property
+    def store(self) -> MemoryJobStore | RedisJobStore:
+        if self._store is None:
+            self._store = build_job_store()
+        return self._store
+
+    async def enqueue(self, boteco_username: str, boteco_id: Optional[str] = None) -> dict[str, Any]:
+        """Record a queued job for ``boteco_username`` and return it."""
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "boteco_username": boteco_username,
+            "boteco_id": boteco_id,
+            "schema": tenant_schema(boteco_username),
+            "status": QUEUED,
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.store.save(job)
+        await self.store.push(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        return await self.store.load(job_id)
+
+    async def _update(self, job: dict[str, Any], **changes: Any) -> None:
+        job.update(changes, updated_at=time.time())
+        await self.store.save(job)
+
+    async def _provision_held(self, job: dict[str, Any]) -> None:
+        """Provision ``job``, touching ``updated_at`` meanwhile so the reaper leaves it alone."""
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            # Jobs are already queued, so they wait for admission without a deadline.
+            async with self.admission.slot(max_wait=None):
+                await self.provision(job["boteco_username"])
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job: dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self._update(job)
+            except Exception as exc:
+                logging.warning("Provisioning job %s heartbeat failed: %s", job["id"], exc)
+
+    async def process(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Run one claimed job to completion, a retry, or failure."""
+
+        job = await self.store.load(job_id)
+        if job is None or job["status"] in (SUCCEEDED, FAILED):
+            await self.store.ack(job_id)
+            return job
+        await self._update(job, status=RUNNING, attempts=job["attempts"] + 1)
+        self.running += 1
+        try:
+            await self._provision_held(job)
+        except Exception as exc:
+            logging.exception("Provisioning job %s failed: %s", job_id, exc)
+            if job["attempts"] < self.max_attempts:
+                not_before = time.time() + self.backoff * 2 ** (job["attempts"] - 1)
+                await self._update(job, status=QUEUED, error=str(exc), not_before=not_before)
+                # Hand the job back before letting go of it: a crash in
+                # between can run it twice but never drop it.
+                await self.store.schedule(job_id, not_before)
+                await self.store.ack(job_id)
+                return job
+            rollback_error = None
+            if job.get("boteco_id"):
+                # Same compensation the inline flow had: no tenant, no boteco.
+                try:
+                    await (self.storage or supabase_client).delete_boteco(job["boteco_id"])
+                except Exception as cleanup:
+                    # The job still ends FAILED and acked; the boteco needs manual cleanup.
+                    logging.exception("Could not roll back boteco %s: %s", job["boteco_id"], cleanup)
+                    rollback_error = str(cleanup)
+            await self._update(job, status=FAILED, error=str(exc), rollback_error=rollback_error)
+        else:
+            await self._update(job, status=SUCCEEDED, error=None)
+        finally:
+            self.running -= 1
+        await self.store.ack(job_id)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job_id = await self.store.claim(timeout=5)
+                if job_id is not None:
+                    await self.process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # keep the worker alive on store hiccups
+                logging.exception("Provisioning worker error: %s", exc)
+                await asyncio.sleep(1)
+
+    async def _reaper(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 2)
+            try:
+                requeued = await self.store.requeue_stale(self.lease)
+                if requeued:
+                    logging.warning("Requeued %s stale provisioning jobs.", requeued)
+            except Exception as exc:
+                logging.warning("Provisioning reaper failed: %s", exc)
+
+    async def _scheduler(self) -> None:
+        while True:
+            try:
+                await self.store.promote_due()
+            except Exception as exc:
+                logging.warning("Provisioning scheduler failed: %s", exc)
+            await asyncio.sleep(self.schedule_interval)
+
+    async def run(self) -> None:
+        """Run the worker pool until cancelled (registered as a lifespan task)."""
+
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._reaper()))
+        tasks.append(asyncio.create_task(self._scheduler()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+provisioning_jobs = ProvisioningJobs()
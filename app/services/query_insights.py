@@ -0,0 +1,459 @@
+"""Workload report over ``pg_stat_statements``.
+
+Take snapshots of the statement statistics, diff two of them and rank what
+ran in between::
+
+    python -m app.services.query_insights snapshot -o before.json     # requires DATABASE_URL
+    python -m app.services.query_insights snapshot -o after.json
+    python -m app.services.query_insights report before.json after.json --by total
+    python -m app.services.query_insights report after.json --by reads --json
+
+``report`` with one snapshot ranks everything since the statistics were last
+reset. Statements are ranked by total or mean execution time, calls, rows or
+shared blocks read, and attributed to the :class:`StorageClient` method that
+issues them (PostgREST requests from ``SupabaseClient`` and the SQL of
+``PostgresClient`` share method names). Filtered reads that touch many
+blocks per returned row get a composite index suggestion (equality columns,
+tenant key first, then the range or sort column) unless an index in
+``schema.sql`` (``--schema-file``) already starts with those columns.
+
+A statistics reset between snapshots, or an entry evicted and re-added, is
+detected and the later counters are used as they are.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import re
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+from app.services.index_audit import SCHEMA_FILE, Index, indexes_from_paths
+from app.utils.env import database_url
+
+TENANT_KEY = "company_id"
+MIN_BLOCKS_PER_ROW = 8.0
+COUNTERS = ("calls", "total_ms", "rows", "shared_blks_hit", "shared_blks_read")
+
+
+@dataclass(frozen=True)
+class StatementStats:
+    queryid: int
+    query: str
+    calls: int
+    total_ms: float
+    rows: int
+    shared_blks_hit: int
+    shared_blks_read: int
+    userid: int = 0
+    dbid: int = 0
+
+    @property
+    def key(self) -> tuple[int, int, int]:
+        return (self.userid, self.dbid, self.queryid)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    @property
+    def blocks_per_row(self) -> float:
+        return (self.shared_blks_hit + self.shared_blks_read) / max(self.rows, self.calls, 1)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    taken_at: str
+    stats_reset: Optional[str]
+    statements: tuple[StatementStats, ...]
+    dealloc: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Snapshot":
+        return cls(
+            taken_at=data["taken_at"],
+            stats_reset=data.get("stats_reset"),
+            dealloc=data.get("dealloc"),
+            statements=tuple(StatementStats(**entry) for entry in data["statements"]),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """What a statement does: verb, main table, filters and joins."""
+
+    verb: str
+    table: Optional[str]
+    equality: tuple[str, ...] = ()
+    ranges: tuple[str, ...] = ()
+    order_by: tuple[str, ...] = ()
+    joins: frozenset[str] = frozenset()
+    on_conflict: bool = False
+
+
+@dataclass(frozen=True)
+class ClientQuery:
+    """A storage client method and the statement shape it issues."""
+
+    method: str
+    verb: str
+    table: str
+    equality: frozenset[str] = frozenset()
+    joins: frozenset[str] = frozenset()
+    on_conflict: Optional[bool] = None
+
+    def matches(self, shape: QueryShape) -> bool:
+        return (
+            shape.verb == self.verb
+            and shape.table == self.table
+            and self.equality <= set(shape.equality)
+            and self.joins <= shape.joins
+            and (self.on_conflict is None or self.on_conflict == shape.on_conflict)
+        )
+
+
+# Most specific first: the first match wins.
+CLIENT_QUERIES: tuple[ClientQuery, ...] = (
+    ClientQuery("bootstrap_session", "select", "users", frozenset({"email"}), frozenset({"user_boteco"})),
+    ClientQuery("get_user_by_email", "select", "users", frozenset({"email"})),
+    ClientQuery("upsert_user", "insert", "users", on_conflict=True),
+    ClientQuery("create_user", "insert", "users", on_conflict=False),
+    ClientQuery("delete_boteco", "delete", "boteco", frozenset({"id"})),
+    ClientQuery("check_user_has_boteco", "select", "user_boteco", frozenset({"user_id"})),
+    ClientQuery("create_boteco_and_associate_user", "call", "create_boteco_with_owner"),
+    ClientQuery("get_dashboard_kpis", "call", "dashboard_kpis"),
+    ClientQuery("get_low_stock_items", "call", "low_stock_items"),
+    ClientQuery("get_stock_alerts", "call", "stock_alerts"),
+    ClientQuery("close_order", "call", "close_order"),
+)
+
+_IDENT = r"(?:\w+\.)*(\w+)"
+_COLUMN = r"((?:\w+\.)*)(\w+)"
+_PARAM = r"(?:\$\d+|any\s*\(\s*\$\d+\s*\))"
+_KEYWORDS = {"where", "set", "order", "limit", "group", "join", "left", "inner", "on", "using", "returning"}
+
+
+def _normalize(query: str) -> str:
+    text = re.sub(r"--[^\n]*|/\*.*?\*/", " ", query, flags=re.S)
+    return " ".join(text.replace('"', "").split()).lower()
+
+
+def parse_query(query: str) -> QueryShape:
+    """Describe a normalized (``$n`` placeholder) statement."""
+
+    text = _normalize(query)
+    on_conflict = bool(re.search(r"\bon conflict\b", text))
+    if match := re.search(r"\binsert into " + _IDENT, text):
+        return QueryShape("insert", match.group(1), on_conflict=on_conflict)
+    if match := re.search(r"\bupdate (?:only )?" + _IDENT + r"(?: (?:as )?(\w+))? set\b", text):
+        verb, table, alias = "update", match.group(1), match.group(2)
+    elif match := re.search(r"\bdelete from (?:only )?" + _IDENT + r"(?: (?:as )?(\w+))?", text):
+        verb, table, alias = "delete", match.group(1), match.group(2)
+    elif match := re.search(r"\bfrom " + _IDENT + r"(\s*\()?(?: (?:as )?(\w+))?", text):
+        if match.group(2):
+            return QueryShape("call", match.group(1))
+        verb, table, alias = "select", match.group(1), match.group(3)
+    elif match := re.match(r"select " + _IDENT + r"\s*\(", text):
+        return QueryShape("call", match.group(1))
+    else:
+        return QueryShape(text.split(" ", 1)[0] if text else "", None)
+    names = {table} | ({alias} if alias and alias not in _KEYWORDS else set())
+    joins = frozenset(re.findall(r"\b(?:from|join) " + _IDENT, text)) - {table}
+
+    def own(pattern: str) -> list[str]:
+        columns = []
+        for qualifier, column in re.findall(pattern, text):
+            owner = qualifier.rstrip(".").rsplit(".", 1)[-1]
+            if (not owner or owner in names) and column not in columns:
+                columns.append(column)
+        return columns
+
+    equality = own(_COLUMN + r"\s*=\s*" + _PARAM)
+    ranges = [
+        column
+        for column in own(_COLUMN + r"\s*(?:>=|<=|>|<|between)\s*\$\d+")
+        if column not in equality
+    ]
+    order_by = [column for column in own(r"\border by " + _COLUMN) if column not in equality]
+    return QueryShape(
+        verb,
+        table,
+        equality=tuple(equality),
+        ranges=tuple(ranges),
+        order_by=tuple(order_by[:1]),
+        joins=joins,
+    )
+
+
+def client_method(shape: QueryShape) -> Optional[str]:
+    return next((query.method for query in CLIENT_QUERIES if query.matches(shape)), None)
+
+
+def diff(before: Snapshot, after: Snapshot) -> list[StatementStats]:
+    """Return what ran between two snapshots (``after`` counters minus ``before``)."""
+
+    if before.stats_reset != after.stats_reset:
+        return [entry for entry in after.statements if entry.calls]
+    previous = {entry.key: entry for entry in before.statements}
+    changed = []
+    for entry in after.statements:
+        old = previous.get(entry.key)
+        if old is not None and entry.calls >= old.calls:
+            entry = replace(entry, **{name: getattr(entry, name) - getattr(old, name) for name in COUNTERS})
+        if entry.calls:
+            changed.append(entry)
+    return changed
+
+
+RANKINGS: dict[str, Callable[[StatementStats], float]] = {
+    "total": lambda entry: entry.total_ms,
+    "mean": lambda entry: entry.mean_ms,
+    "calls": lambda entry: entry.calls,
+    "rows": lambda entry: entry.rows,
+    "reads": lambda entry: entry.shared_blks_read,
+}
+
+
+def rank(statements: Sequence[StatementStats], by: str = "total", limit: Optional[int] = None) -> list[StatementStats]:
+    ranked = sorted(statements, key=lambda entry: (-RANKINGS[by](entry), entry.queryid))
+    return ranked[:limit] if limit else ranked
+
+
+def index_columns(shape: QueryShape) -> tuple[str, ...]:
+    """The composite index that serves ``shape``: equality columns, then one range/sort column."""
+
+    equality = sorted(shape.equality, key=lambda column: column != TENANT_KEY)
+    tail = (shape.ranges or shape.order_by)[:1]
+    return tuple(equality) + tuple(tail)
+
+
+def _covered(columns: tuple[str, ...], equality_count: int, indexes: Sequence[Index], table: str) -> bool:
+    for index in indexes:
+        if index.table.rsplit(".", 1)[-1] != table or index.predicate:
+            continue
+        leading = index.columns[: len(columns)]
+        if set(leading[:equality_count]) == set(columns[:equality_count]) and leading[equality_count:] == columns[equality_count:]:
+            return True
+    return False
+
+
+@dataclass
+class IndexSuggestion:
+    table: str
+    columns: tuple[str, ...]
+    total_ms: float = 0.0
+    calls: int = 0
+    queryids: list[int] = field(default_factory=list)
+    methods: list[str] = field(default_factory=list)
+
+    @property
+    def statement(self) -> str:
+        name = f"{self.table}_{'_'.join(self.columns)}_idx"
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {self.table} ({', '.join(self.columns)});"
+
+
+def suggest_indexes(
+    statements: Sequence[StatementStats],
+    indexes: Sequence[Index],
+    *,
+    min_blocks_per_row: float = MIN_BLOCKS_PER_ROW,
+) -> list[IndexSuggestion]:
+    """Suggest composite indexes for filtered reads that scan far more than they return."""
+
+    suggestions: dict[tuple[str, tuple[str, ...]], IndexSuggestion] = {}
+    for entry in statements:
+        shape = parse_query(entry.query)
+        if shape.verb not in ("select", "update", "delete") or not shape.equality or not shape.table:
+            continue
+        if entry.blocks_per_row < min_blocks_per_row:
+            continue
+        columns = index_columns(shape)
+        if len(columns) < 2 or _covered(columns, len(shape.equality), indexes, shape.table):
+            continue
+        suggestion = suggestions.setdefault((shape.table, columns), IndexSuggestion(shape.table, columns))
+        suggestion.total_ms += entry.total_ms
+        suggestion.calls += entry.calls
+        suggestion.queryids.append(entry.queryid)
+        if (method := client_method(shape)) and method not in suggestion.methods:
+            suggestion.methods.append(method)
+    # An index on (a, b, c) also serves (a, b).
+    kept = [
+        suggestion
+        for suggestion in suggestions.values()
+        if not any(
+            other is not suggestion
+            and other.table == suggestion.table
+            and len(other.columns) > len(suggestion.columns)
+            and other.columns[: len(suggestion.columns)] == suggestion.columns
+            for other in suggestions.values()
+        )
+    ]
+    return sorted(kept, key=lambda suggestion: -suggestion.total_ms)
+
+
+def build_report(
+    statements: Sequence[StatementStats],
+    *,
+    by: str = "total",
+    limit: int = 20,
+    indexes: Sequence[Index] = (),
+    min_blocks_per_row: float = MIN_BLOCKS_PER_ROW,
+) -> dict[str, Any]:
+    total_ms = sum(entry.total_ms for entry in statements)
+    by_method: dict[str, dict[str, float]] = {}
+    top = []
+    for entry in statements:
+        method = client_method(parse_query(entry.query)) or "unattributed"
+        totals = by_method.setdefault(method, {"calls": 0, "total_ms": 0.0})
+        totals["calls"] += entry.calls
+        totals["total_ms"] = round(totals["total_ms"] + entry.total_ms, 3)
+    for entry in rank(statements, by, limit):
+        shape = parse_query(entry.query)
+        top.append(
+            {
+                "queryid": entry.queryid,
+                "method": client_method(shape),
+                "table": shape.table,
+                "calls": entry.calls,
+                "total_ms": round(entry.total_ms, 3),
+                "mean_ms": round(entry.mean_ms, 3),
+                "share": round(entry.total_ms / total_ms, 4) if total_ms else 0.0,
+                "rows": entry.rows,
+                "shared_blks_read": entry.shared_blks_read,
+                "blocks_per_row": round(entry.blocks_per_row, 1),
+                "query": " ".join(entry.query.split())[:200],
+            }
+        )
+    return {
+        "statements": len(statements),
+        "calls": sum(entry.calls for entry in statements),
+        "total_ms": round(total_ms, 3),
+        "ranked_by": by,
+        "top": top,
+        "by_method": dict(sorted(by_method.items(), key=lambda item: -item[1]["total_ms"])),
+        "suggested_indexes": [
+            {
+                "table": suggestion.table,
+                "columns": list(suggestion.columns),
+                "statement": suggestion.statement,
+                "total_ms": round(suggestion.total_ms, 3),
+                "calls": suggestion.calls,
+                "queryids": suggestion.queryids,
+                "methods": suggestion.methods,
+            }
+            for suggestion in suggest_indexes(statements, indexes, min_blocks_per_row=min_blocks_per_row)
+        ],
+    }
+
+
+def take_snapshot(dsn: str) -> Snapshot:
+    """Read the current database's ``pg_stat_statements`` entries."""
+
+    import psycopg
+    from psycopg import sql
+
+    with psycopg.connect(dsn) as conn:
+        row = conn.execute(
+            "SELECT n.nspname FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+            "WHERE e.extname = 'pg_stat_statements'"
+        ).fetchone()
+        if row is None:
+            raise RuntimeError("pg_stat_statements is not installed in this database.")
+        schema = sql.Identifier(row[0])
+        dealloc, stats_reset = conn.execute(
+            sql.SQL("SELECT dealloc, stats_reset FROM {}.pg_stat_statements_info").format(schema)
+        ).fetchone()
+        rows = conn.execute(
+            sql.SQL(
+                "SELECT queryid, query, calls, total_exec_time, rows, shared_blks_hit, shared_blks_read,"
+                " userid::bigint, dbid::bigint FROM {}.pg_stat_statements"
+                " WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())"
+                " AND queryid IS NOT NULL"
+            ).format(schema)
+        ).fetchall()
+    return Snapshot(
+        taken_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        stats_reset=stats_reset.isoformat() if stats_reset else None,
+        dealloc=dealloc,
+        statements=tuple(StatementStats(*row) for row in rows),
+    )
+
+
+def load_snapshot(path: Path) -> Snapshot:
+    return Snapshot.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+
+def format_report(report: dict[str, Any]) -> str:
+    lines = [
+        f"{report['statements']} statements, {report['calls']} calls, {report['total_ms']:.1f} ms "
+        f"(ranked by {report['ranked_by']})",
+        "",
+    ]
+    for position, entry in enumerate(report["top"], start=1):
+        lines.append(
+            f"{position:>2}. {entry['total_ms']:>10.1f} ms {entry['share']:>6.1%}  {entry['calls']:>8} calls "
+            f"{entry['mean_ms']:>8.2f} ms/call  {entry['rows']:>8} rows  {entry['shared_blks_read']:>7} reads  "
+            f"[{entry['method'] or '-'}] {entry['query'][:100]}"
+        )
+    lines.append("")
+    lines.append("By client method:")
+    for method, totals in report["by_method"].items():
+        lines.append(f"  {method}: {totals['calls']} calls, {totals['total_ms']:.1f} ms")
+    if report["suggested_indexes"]:
+        lines.append("")
+        lines.append("Suggested indexes:")
+        for suggestion in report["suggested_indexes"]:
+            lines.append(
+                f"  {suggestion['statement']}  -- {suggestion['total_ms']:.1f} ms over {suggestion['calls']} calls"
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="save the current pg_stat_statements counters")
+    snapshot.add_argument("--dsn", help="Postgres DSN (default: DATABASE_URL)")
+    snapshot.add_argument("-o", "--output", type=Path, help="write to this file instead of stdout")
+    report = commands.add_parser("report", help="rank statements in a snapshot or between two")
+    report.add_argument("snapshots", nargs="+", type=Path, metavar="SNAPSHOT")
+    report.add_argument("--by", choices=sorted(RANKINGS), default="total")
+    report.add_argument("--limit", type=int, default=20)
+    report.add_argument("--schema-file", type=Path, default=SCHEMA_FILE)
+    report.add_argument("--min-blocks-per-row", type=float, default=MIN_BLOCKS_PER_ROW)
+    report.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        dsn = args.dsn or database_url()
+        if not dsn:
+            parser.error("DATABASE_URL is not set; pass --dsn")
+        payload = json.dumps(take_snapshot(dsn).to_dict(), indent=2)
+        if args.output:
+            args.output.write_text(payload, encoding="utf-8")
+        else:
+            print(payload)
+        return
+
+    if len(args.snapshots) > 2:
+        parser.error("report takes one or two snapshots")
+    snapshots = [load_snapshot(path) for path in args.snapshots]
+    statements = diff(*snapshots) if len(snapshots) == 2 else list(snapshots[0].statements)
+    result = build_report(
+        statements,
+        by=args.by,
+        limit=args.limit,
+        indexes=indexes_from_paths([args.schema_file]) if args.schema_file.exists() else (),
+        min_blocks_per_row=args.min_blocks_per_row,
+    )
+    print(json.dumps(result, indent=2) if args.json else format_report(result))
+
+
+if __name__ == "__main__":
+    main()
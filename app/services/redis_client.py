@@ -0,0 +1,37 @@
+"""Shared access to the Redis instance started alongside the app."""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Optional
+
+try:
+    from redis.asyncio import Redis
+except ImportError:  # pragma: no cover - redis ships with reflex, guard anyway
+    Redis = None  # type: ignore[assignment,misc]
+
+_redis: Optional["Redis"] = None
+
+
+def redis_url() -> Optional[str]:
+    """Return the configured Redis URL (`REDIS_URL`, falling back to Reflex's)."""
+
+    return os.getenv("REDIS_URL") or os.getenv("REFLEX_REDIS_URL")
+
+
+def get_redis() -> Optional["Redis"]:
+    """Return a process-wide Redis client, or ``None`` when Redis is not configured."""
+
+    global _redis
+    if _redis is not None:
+        return _redis
+    url = redis_url()
+    if not url or Redis is None:
+        return None
+    try:
+        _redis = Redis.from_url(url, decode_responses=True)
+    except Exception as exc:  # pragma: no cover - defensive guard
+        logging.exception("Error initializing Redis client: %s", exc)
+        return None
+    return _redis
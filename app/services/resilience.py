@@ -0,0 +1,207 @@
+"""Retry and circuit-breaker policies for calls to the storage backends."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+import psycopg
+from postgrest import APIError
+
+# PostgreSQL / PostgREST error codes that describe a transient backend
+# condition rather than a problem with the request itself.
+TRANSIENT_ERROR_CODES = {
+    "40001",  # serialization_failure
+    "40P01",  # deadlock_detected
+    "53300",  # too_many_connections
+    "57P01",  # admin_shutdown
+    "57P03",  # cannot_connect_now
+    "PGRST000",  # could not connect to the database
+    "PGRST001",  # internal database connection error
+    "PGRST002",  # schema cache not ready
+    "PGRST003",  # timed out acquiring a pool connection
+}
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without contacting the backend while the breaker is open."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Return whether ``exc`` signals a backend hiccup worth retrying."""
+
+    if isinstance(exc, (httpx.TransportError, psycopg.OperationalError)):
+        return True
+    if isinstance(exc, psycopg.Error):
+        return exc.sqlstate in TRANSIENT_ERROR_CODES or (exc.sqlstate or "").startswith("08")
+    if isinstance(exc, APIError):
+        code = exc.code
+        if isinstance(code, int):
+            return code == 429 or code >= 500
+        if code is None:
+            return False
+        return code in TRANSIENT_ERROR_CODES or code.startswith("08")
+    return False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for idempotent operations."""
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def delays(self) -> Iterator[float]:
+        """Yield the wait before each retry (``attempts - 1`` values)."""
+
+        for attempt in range(self.attempts - 1):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """Fail fast while the backend is unhealthy.
+
+    ``closed``: calls flow and transient failures are counted.
+    ``open``: calls are rejected until ``reset_timeout`` elapses.
+    ``half_open``: a limited number of probe calls decide whether to close
+    again or re-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "supabase",
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.name = name
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probes = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - (self._opened_at or 0) >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logging.warning("Circuit breaker %s: %s -> %s", self.name, self._state, state)
+        self._state = state
+        self._probes = 0
+        if state == self.OPEN:
+            self._opened_at = self._clock()
+        elif state == self.CLOSED:
+            self._failures = 0
+            self._opened_at = None
+
+    def before_call(self) -> None:
+        """Reserve a call slot or raise :class:`CircuitOpenError`."""
+
+        state = self.state
+        if state == self.OPEN or (
+            state == self.HALF_OPEN and self._probes >= self.half_open_max_calls
+        ):
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open; backend unavailable.")
+        if state == self.HALF_OPEN:
+            self._probes += 1
+
+    def record_success(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._transition(self.CLOSED)
+        self._failures = 0
+
+    def release(self) -> None:
+        """Give back a half-open probe slot for a call that ended without a verdict."""
+
+        if self._state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_failure(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the breaker state for health checks and logs."""
+
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self._failures,
+            "rejected": self.rejected,
+            "open_for": (
+                round(self._clock() - self._opened_at, 3) if self._opened_at is not None else None
+            ),
+        }
+
+
+async def call_with_resilience(
+    fn: Callable[[], Awaitable[Any]],
+    *,
+    retry: Optional[RetryPolicy],
+    breaker: Optional[CircuitBreaker],
+) -> Any:
+    """Run ``fn`` guarded by ``breaker``, retrying transient errors per ``retry``.
+
+    Pass ``retry=None`` for non-idempotent operations: they still go through
+    the breaker but are attempted exactly once.
+    """
+
+    delays = iter(retry.delays()) if retry is not None else iter(())
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await fn()
+        except Exception as exc:
+            if not is_transient(exc):
+                if breaker is not None:
+                    breaker.record_success()  # the backend answered; the request was bad
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            delay = next(delays, None)
+            if delay is None:
+                raise
+            logging.warning("Transient Supabase error, retrying in %.2fs: %s", delay, exc)
+            await retry.sleep(delay)  # type: ignore[union-attr]
+            continue
+        except BaseException:
+            # Cancelled (client gone, timeout): the backend gave no answer, so
+            # free the probe slot instead of leaving the breaker half-open forever.
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -1,7 +1,7 @@
-import os
 import logging
-import psycopg
-from pathlib import Path
+
+from app.services.migrations import run_migrations
+from app.utils.env import database_url
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -9,32 +9,21 @@ logger = logging.getLogger(__name__)
 
 def setup_schema():
     """
-    Sets up the reflex schema using a direct database connection.
+    Sets up the reflex schema by applying the versioned migrations in
+    app/services/sql/migrations over a direct database connection.
     Requires DATABASE_URL environment variable.
     """
-    db_url = os.getenv("DATABASE_URL") or os.getenv("REFLEX_DB_URL")
-    if not db_url:
+    if not database_url():
         logger.error("DATABASE_URL or REFLEX_DB_URL environment variable is not set.")
         logger.error(
             "Please set it to your Supabase connection string (Transaction Pooler or Session Pooler)."
         )
         return
-    if "+psycopg" in db_url:
-        db_url = db_url.replace("postgresql+psycopg://", "postgresql://")
-        logger.info("Adjusted connection string for psycopg3 compatibility.")
-    current_dir = Path(__file__).resolve().parent
-    sql_path = current_dir / "schema_setup.sql"
-    if not sql_path.exists():
-        logger.error(f"SQL file not found at {sql_path}")
-        return
     try:
-        sql_command = sql_path.read_text(encoding="utf-8")
-        logger.info("Connecting to database")
-        with psycopg.connect(db_url) as conn:
-            with conn.cursor() as cur:
-                logger.info("Executing schema setup SQL")
-                cur.execute(sql_command)
-            conn.commit()
+        logger.info("Applying pending migrations")
+        results = run_migrations()
+        for result in results:
+            logger.info(f"Applied {result['version']:04d}_{result['name']} in {result['ms']:.1f}ms")
         logger.info("✅ Schema setup completed successfully!")
         logger.info("=" * 60)
         logger.info("CRITICAL NEXT STEP:")
@@ -47,4 +36,4 @@ def setup_schema():
 
 
 if __name__ == "__main__":
-    setup_schema()
\ No newline at end of file
+    setup_schema()
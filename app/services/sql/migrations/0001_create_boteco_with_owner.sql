@@ -0,0 +1,39 @@
+-- Create a boteco and its owner association atomically in a single RPC call.
+--
+-- Called by SupabaseClient.create_boteco_and_associate_user. PostgREST runs
+-- each RPC inside one transaction, so a failure on either insert leaves no
+-- orphan boteco behind and no compensating delete is needed.
+
+CREATE OR REPLACE FUNCTION reflex.create_boteco_with_owner(
+    boteco_data jsonb,
+    user_boteco_data jsonb
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    new_boteco boteco;
+    new_user_boteco user_boteco;
+BEGIN
+    new_boteco := jsonb_populate_record(NULL::boteco, boteco_data);
+    new_boteco.id := coalesce(new_boteco.id, gen_random_uuid());
+    new_boteco.created_at := coalesce(new_boteco.created_at, now());
+    new_boteco.has_own_digital_infra := coalesce(new_boteco.has_own_digital_infra, false);
+    INSERT INTO boteco SELECT (new_boteco).* RETURNING * INTO new_boteco;
+
+    new_user_boteco := jsonb_populate_record(NULL::user_boteco, user_boteco_data);
+    new_user_boteco.id := coalesce(new_user_boteco.id, gen_random_uuid());
+    new_user_boteco.boteco_id := new_boteco.id;
+    new_user_boteco.assigned_role := coalesce(new_user_boteco.assigned_role, 'owner');
+    new_user_boteco.assigned_at := coalesce(new_user_boteco.assigned_at, now());
+    new_user_boteco.created_at := coalesce(new_user_boteco.created_at, now());
+    INSERT INTO user_boteco SELECT (new_user_boteco).* RETURNING * INTO new_user_boteco;
+
+    RETURN jsonb_build_object(
+        'boteco', to_jsonb(new_boteco),
+        'user_boteco', to_jsonb(new_user_boteco)
+    );
+END;
+$$;
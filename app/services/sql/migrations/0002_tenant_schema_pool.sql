@@ -0,0 +1,65 @@
+-- Warm pool of pre-built tenant schemas.
+--
+-- Background refills create unassigned schemas named tenant_pool_<hex> and
+-- register them here. Onboarding claims one with claim_tenant_schema(), which
+-- renames it to org_<username> inside the RPC's single short transaction.
+
+CREATE TABLE IF NOT EXISTS reflex.tenant_schema_pool (
+    schema_name TEXT PRIMARY KEY,
+    template_version INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS tenant_schema_pool_version_created_idx
+    ON reflex.tenant_schema_pool (template_version, created_at);
+
+-- Returns target_schema when a pooled schema was renamed to it (or it already
+-- exists, so retries are idempotent) and NULL when the pool has no schema
+-- built from template_version.
+CREATE OR REPLACE FUNCTION reflex.claim_tenant_schema(
+    target_schema text,
+    template_version integer
+)
+RETURNS text
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    pooled text;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = target_schema) THEN
+        RETURN target_schema;
+    END IF;
+
+    DELETE FROM reflex.tenant_schema_pool
+    WHERE schema_name = (
+        SELECT p.schema_name
+        FROM reflex.tenant_schema_pool p
+        WHERE p.template_version = claim_tenant_schema.template_version
+        ORDER BY p.created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING schema_name INTO pooled;
+
+    IF pooled IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('ALTER SCHEMA %I RENAME TO %I', pooled, target_schema);
+    RETURN target_schema;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION reflex.tenant_pool_available(template_version integer)
+RETURNS integer
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+    SELECT count(*)::integer
+    FROM reflex.tenant_schema_pool p
+    WHERE p.template_version = tenant_pool_available.template_version;
+$$;
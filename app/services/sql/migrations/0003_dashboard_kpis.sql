@@ -0,0 +1,41 @@
+-- Dashboard KPIs of one tenant, read from its rollups.
+--
+-- Called by StorageClient.get_dashboard_kpis (PostgREST RPC or direct SQL).
+-- Reads one company_kpis row and one sales_daily row per company, so the
+-- cost does not grow with sales history. "Today" is each company's local day
+-- (company_settings.timezone). Returns NULL when the schema has no rollups
+-- yet (tenant template older than 0003).
+
+CREATE OR REPLACE FUNCTION reflex.dashboard_kpis(tenant_schema text)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    result jsonb;
+BEGIN
+    IF to_regclass(format('%I.company_kpis', tenant_schema)) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        $sql$
+        SELECT jsonb_build_object(
+            'sales_today', coalesce(sum(d.total), 0),
+            'sales_count_today', coalesce(sum(d.sales_count), 0)::integer,
+            'active_tables', coalesce(sum(k.active_tables), 0)::integer,
+            'low_stock_items', coalesce(sum(k.low_stock_items), 0)::integer
+        )
+        FROM %1$I.companies c
+        LEFT JOIN %1$I.company_settings s ON s.company_id = c.id
+        LEFT JOIN %1$I.company_kpis k ON k.company_id = c.id
+        LEFT JOIN %1$I.sales_daily d
+            ON d.company_id = c.id
+           AND d.day = (now() AT TIME ZONE coalesce(s.timezone, 'America/Sao_Paulo'))::date
+        $sql$,
+        tenant_schema
+    ) INTO result;
+    RETURN result;
+END;
+$$;
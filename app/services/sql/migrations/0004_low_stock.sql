@@ -0,0 +1,75 @@
+-- Low-stock items and stock alerts of one tenant.
+--
+-- Called by StorageClient.get_low_stock_items / get_stock_alerts (PostgREST
+-- RPC or direct SQL). low_stock_items repeats the predicate of the partial
+-- index idx_products_low_stock (tenant template 0004), so it only reads the
+-- products that are low. stock_alerts pages through the threshold-crossing
+-- events after a cursor (the last alert id seen). Both return NULL when the
+-- tenant schema predates template 0004.
+
+CREATE OR REPLACE FUNCTION reflex.low_stock_items(tenant_schema text, company uuid DEFAULT NULL)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    result jsonb;
+BEGIN
+    IF to_regclass(format('%I.stock_alerts', tenant_schema)) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        $sql$
+        SELECT coalesce(jsonb_agg(jsonb_build_object(
+                   'product_id', id,
+                   'company_id', company_id,
+                   'name', name,
+                   'stock', stock,
+                   'min_stock', min_stock,
+                   'unit', unit
+               ) ORDER BY company_id, name), '[]'::jsonb)
+        FROM %I.products
+        WHERE is_active AND min_stock > 0 AND stock <= min_stock
+          AND ($1 IS NULL OR company_id = $1)
+        $sql$,
+        tenant_schema
+    ) INTO result USING company;
+    RETURN result;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION reflex.stock_alerts(
+    tenant_schema text,
+    after_id bigint DEFAULT 0,
+    max_rows integer DEFAULT 100
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    result jsonb;
+BEGIN
+    IF to_regclass(format('%I.stock_alerts', tenant_schema)) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        $sql$
+        SELECT coalesce(jsonb_agg(to_jsonb(a) ORDER BY a.id), '[]'::jsonb)
+        FROM (
+            SELECT id, company_id, product_id, kind, stock, min_stock, created_at
+            FROM %I.stock_alerts
+            WHERE id > $1
+            ORDER BY id
+            LIMIT $2
+        ) a
+        $sql$,
+        tenant_schema
+    ) INTO result USING after_id, max_rows;
+    RETURN result;
+END;
+$$;
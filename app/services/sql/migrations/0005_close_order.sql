@@ -0,0 +1,127 @@
+-- Close an order of one tenant in a single set-based statement.
+--
+-- Called by StorageClient.close_order (PostgREST RPC or direct SQL). One
+-- statement, whatever the number of items:
+--
+-- * marks the order closed and paid, with subtotal/total recomputed from its
+--   non-cancelled items, and frees the table that held it;
+-- * records the sale (sales_daily picks it up, see tenant template 0003);
+-- * deducts from products.stock and logs one 'sale' stock movement per
+--   product to deduct: the sold product itself or, when it has an active
+--   recipe, the recipe ingredients scaled by sold quantity / yield_quantity
+--   (g <-> kg and ml <-> l are converted to the ingredient's unit). The
+--   products are locked in id order before the update, so concurrent closes
+--   on the same products queue instead of deadlocking.
+--
+-- Returns NULL when the order does not exist or is already closed or
+-- cancelled; a concurrent second close of the same order waits for the first
+-- and then finds it closed.
+
+CREATE OR REPLACE FUNCTION reflex.close_order(
+    tenant_schema text,
+    order_id uuid,
+    payment_method text,
+    cashier_id uuid DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+VOLATILE
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    result jsonb;
+BEGIN
+    EXECUTE format(
+        $sql$
+        WITH lines AS (
+            SELECT product_id, quantity, subtotal
+            FROM %1$I.order_items
+            WHERE order_id = $1 AND status IS DISTINCT FROM 'cancelled'
+        ), closed AS (
+            UPDATE %1$I.orders o
+            SET status = 'closed',
+                closed_at = now(),
+                updated_at = now(),
+                payment_method = $2,
+                payment_status = 'paid',
+                subtotal = t.subtotal,
+                total = t.subtotal - coalesce(o.discount, 0) + coalesce(o.tax, 0)
+            FROM (SELECT coalesce(sum(subtotal), 0) AS subtotal FROM lines) t
+            WHERE o.id = $1 AND o.status NOT IN ('closed', 'cancelled')
+            RETURNING o.id, o.company_id, o.total, o.subtotal, o.discount, o.tax, o.closed_at
+        ), sale AS (
+            INSERT INTO %1$I.sales
+                (company_id, order_id, total, subtotal, discount, tax, payment_method, sale_date, cashier_id)
+            SELECT company_id, id, total, subtotal, coalesce(discount, 0), coalesce(tax, 0), $2, closed_at, $3
+            FROM closed
+            RETURNING id
+        ), freed AS (
+            UPDATE %1$I.tables t
+            SET status = 'available', current_order_id = NULL, updated_at = now()
+            FROM closed c
+            WHERE t.current_order_id = c.id
+            RETURNING t.id
+        ), sold AS (
+            SELECT product_id, sum(quantity) AS quantity FROM lines GROUP BY product_id
+        ), recipe AS (
+            SELECT DISTINCT ON (r.product_id) r.id, r.product_id, r.yield_quantity
+            FROM %1$I.recipes r
+            JOIN sold s ON s.product_id = r.product_id
+            WHERE r.is_active
+            ORDER BY r.product_id, r.created_at DESC
+        ), deductions AS (
+            SELECT ri.product_id,
+                   s.quantity * ri.quantity / coalesce(nullif(r.yield_quantity, 0), 1)
+                   * CASE
+                         WHEN ri.unit = 'g' AND p.unit = 'kg' THEN 0.001
+                         WHEN ri.unit = 'kg' AND p.unit = 'g' THEN 1000
+                         WHEN ri.unit = 'ml' AND p.unit = 'l' THEN 0.001
+                         WHEN ri.unit = 'l' AND p.unit = 'ml' THEN 1000
+                         ELSE 1
+                     END AS quantity
+            FROM sold s
+            JOIN recipe r ON r.product_id = s.product_id
+            JOIN %1$I.recipe_ingredients ri ON ri.recipe_id = r.id
+            JOIN %1$I.products p ON p.id = ri.product_id
+            UNION ALL
+            SELECT s.product_id, s.quantity
+            FROM sold s
+            WHERE NOT EXISTS (SELECT 1 FROM recipe r WHERE r.product_id = s.product_id)
+        ), locked AS (
+            SELECT p.id
+            FROM %1$I.products p
+            WHERE p.id IN (SELECT product_id FROM deductions) AND EXISTS (SELECT 1 FROM closed)
+            ORDER BY p.id
+            FOR NO KEY UPDATE
+        ), deducted AS (
+            UPDATE %1$I.products p
+            SET stock = p.stock - d.quantity, updated_at = now()
+            FROM (SELECT product_id, sum(quantity) AS quantity FROM deductions GROUP BY product_id) d
+            JOIN locked l ON l.id = d.product_id
+            WHERE p.id = d.product_id AND d.quantity <> 0
+            RETURNING p.id
+        ), moved AS (
+            INSERT INTO %1$I.stock_movements
+                (company_id, product_id, movement_type, quantity, related_order_id, reason, created_at)
+            SELECT c.company_id, d.product_id, 'sale', -sum(d.quantity), c.id, 'order_close', c.closed_at
+            FROM deductions d
+            CROSS JOIN closed c
+            GROUP BY c.company_id, c.id, c.closed_at, d.product_id
+            RETURNING product_id
+        )
+        SELECT jsonb_build_object(
+            'order_id', c.id,
+            'sale_id', (SELECT id FROM sale),
+            'total', c.total,
+            'stock_movements', (SELECT count(*) FROM moved),
+            'products_deducted', (SELECT count(*) FROM deducted),
+            'tables_freed', (SELECT count(*) FROM freed)
+        )
+        FROM closed c
+        $sql$,
+        tenant_schema
+    ) INTO result USING order_id, payment_method, cashier_id;
+    RETURN result;
+END;
+$$;
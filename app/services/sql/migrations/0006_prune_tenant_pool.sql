@@ -0,0 +1,41 @@
+-- Drop warm-pool schemas built from an older tenant template.
+--
+-- claim_tenant_schema() only hands out schemas of the caller's
+-- template_version, so after a template bump the old ones would sit in the
+-- pool forever. The refill task calls this before topping the pool up. Only
+-- versions below the caller's are dropped, so an instance still running the
+-- previous release during a rolling deploy cannot drop the new pool. At most
+-- max_schemas are dropped per call to keep the lock count of one transaction
+-- bounded; the next refill picks up the rest. Returns how many were dropped.
+
+CREATE OR REPLACE FUNCTION reflex.prune_tenant_pool(
+    template_version integer,
+    max_schemas integer DEFAULT 5
+)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = reflex, public
+AS $$
+DECLARE
+    outdated text;
+    dropped integer := 0;
+BEGIN
+    FOR outdated IN
+        DELETE FROM reflex.tenant_schema_pool
+        WHERE schema_name IN (
+            SELECT p.schema_name
+            FROM reflex.tenant_schema_pool p
+            WHERE p.template_version < prune_tenant_pool.template_version
+            ORDER BY p.created_at
+            LIMIT max_schemas
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING schema_name
+    LOOP
+        EXECUTE format('DROP SCHEMA IF EXISTS %I CASCADE', outdated);
+        dropped := dropped + 1;
+    END LOOP;
+    RETURN dropped;
+END;
+$$;
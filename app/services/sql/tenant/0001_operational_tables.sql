@@ -0,0 +1,370 @@
+-- Operational tables of a tenant schema (org_<username>), taken from schema.sql.
+--
+-- Names are unqualified: the provisioning engine runs this with search_path
+-- set to the tenant schema. Foreign keys are added after every table exists
+-- and indexes are created last (see app/services/tenant_template.py).
+
+CREATE TYPE stock_movement_type AS ENUM ('sale', 'production_in', 'manual_adjustment');
+
+CREATE TABLE orders (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    table_id UUID,
+    customer_name TEXT,
+    status TEXT DEFAULT 'open'::text NOT NULL,
+    total NUMERIC(10, 2) DEFAULT 0 NOT NULL,
+    subtotal NUMERIC(10, 2) DEFAULT 0 NOT NULL,
+    discount NUMERIC(10, 2) DEFAULT 0,
+    tax NUMERIC(10, 2) DEFAULT 0,
+    payment_method TEXT,
+    payment_status TEXT DEFAULT 'pending'::text,
+    notes TEXT,
+    opened_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    closed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT orders_pkey1 PRIMARY KEY (id),
+    CONSTRAINT orders_payment_method_check CHECK (payment_method = ANY (ARRAY['cash'::text, 'credit'::text, 'debit'::text, 'pix'::text, 'other'::text])),
+    CONSTRAINT orders_payment_status_check CHECK (payment_status = ANY (ARRAY['pending'::text, 'paid'::text, 'cancelled'::text])),
+    CONSTRAINT orders_status_check CHECK (status = ANY (ARRAY['open'::text, 'in_progress'::text, 'ready'::text, 'closed'::text, 'cancelled'::text]))
+);
+
+CREATE TABLE tables (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    number INTEGER NOT NULL,
+    capacity INTEGER DEFAULT 4,
+    status TEXT DEFAULT 'available'::text NOT NULL,
+    current_order_id UUID,
+    location TEXT,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    name TEXT NOT NULL,
+    CONSTRAINT tables_pkey PRIMARY KEY (id),
+    CONSTRAINT tables_company_id_number_key UNIQUE NULLS DISTINCT (company_id, number),
+    CONSTRAINT tables_company_name_unique UNIQUE NULLS DISTINCT (company_id, name),
+    CONSTRAINT tables_status_check CHECK (status = ANY (ARRAY['available'::text, 'occupied'::text, 'reserved'::text, 'maintenance'::text]))
+);
+
+CREATE TABLE companies (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    name TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    cnpj TEXT,
+    owner_id UUID NOT NULL,
+    plan_type TEXT DEFAULT 'free'::text NOT NULL,
+    realtime_enabled BOOLEAN DEFAULT false,
+    is_active BOOLEAN DEFAULT true,
+    logo_url TEXT,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    city TEXT,
+    state TEXT,
+    country TEXT DEFAULT 'BR'::text,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT companies_pkey PRIMARY KEY (id),
+    CONSTRAINT companies_cnpj_key UNIQUE NULLS DISTINCT (cnpj),
+    CONSTRAINT companies_slug_key UNIQUE NULLS DISTINCT (slug),
+    CONSTRAINT companies_plan_type_check CHECK (plan_type = ANY (ARRAY['free'::text, 'basic'::text, 'premium'::text]))
+);
+
+CREATE TABLE faturacoes (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    order_id UUID NOT NULL,
+    company_id UUID NOT NULL,
+    table_id UUID,
+    total NUMERIC NOT NULL,
+    payment_method TEXT,
+    payment_status TEXT,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT faturacoes_pkey PRIMARY KEY (id)
+);
+
+CREATE TABLE company_settings (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    realtime_enabled BOOLEAN DEFAULT false,
+    currency TEXT DEFAULT 'BRL'::text,
+    timezone TEXT DEFAULT 'America/Sao_Paulo'::text,
+    language TEXT DEFAULT 'pt_BR'::text,
+    tax_rate NUMERIC(5, 2) DEFAULT 0,
+    service_fee NUMERIC(5, 2) DEFAULT 0,
+    receipt_footer TEXT,
+    notifications_enabled BOOLEAN DEFAULT true,
+    auto_print_orders BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT company_settings_pkey PRIMARY KEY (id),
+    CONSTRAINT company_settings_company_id_key UNIQUE NULLS DISTINCT (company_id)
+);
+
+CREATE TABLE sales (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    order_id UUID NOT NULL,
+    total NUMERIC(10, 2) NOT NULL,
+    subtotal NUMERIC(10, 2) NOT NULL,
+    discount NUMERIC(10, 2) DEFAULT 0,
+    tax NUMERIC(10, 2) DEFAULT 0,
+    payment_method TEXT NOT NULL,
+    sale_date TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    cashier_id UUID,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT sales_pkey1 PRIMARY KEY (id),
+    CONSTRAINT sales_payment_method_check CHECK (payment_method = ANY (ARRAY['cash'::text, 'credit'::text, 'debit'::text, 'pix'::text, 'other'::text]))
+);
+
+CREATE TABLE products (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    price NUMERIC(10, 2) DEFAULT 0 NOT NULL,
+    cost NUMERIC(10, 2) DEFAULT 0,
+    stock NUMERIC(10, 3) DEFAULT 0 NOT NULL,
+    min_stock NUMERIC(10, 3) DEFAULT 0,
+    category TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    barcode TEXT,
+    image_url TEXT,
+    is_active BOOLEAN DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    internal_notes TEXT,
+    CONSTRAINT products_pkey1 PRIMARY KEY (id),
+    CONSTRAINT products_category_check CHECK (category = ANY (ARRAY['drink'::text, 'food'::text, 'ingredient'::text, 'other'::text])),
+    CONSTRAINT products_unit_check CHECK (unit = ANY (ARRAY['un'::text, 'kg'::text, 'l'::text, 'ml'::text, 'g'::text]))
+);
+
+CREATE TABLE company_users (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    role TEXT DEFAULT 'waiter'::text NOT NULL,
+    is_active BOOLEAN DEFAULT true,
+    invited_by UUID,
+    invited_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    accepted_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT company_users_pkey PRIMARY KEY (id),
+    CONSTRAINT company_users_company_id_user_id_key UNIQUE NULLS DISTINCT (company_id, user_id),
+    CONSTRAINT company_users_role_check CHECK (role = ANY (ARRAY['owner'::text, 'admin'::text, 'manager'::text, 'waiter'::text, 'cashier'::text, 'kitchen'::text]))
+);
+
+CREATE TABLE suppliers (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    name TEXT NOT NULL,
+    contact TEXT,
+    phone TEXT,
+    email TEXT,
+    cnpj TEXT,
+    address TEXT,
+    city TEXT,
+    state TEXT,
+    country TEXT DEFAULT 'BR'::text,
+    notes TEXT,
+    is_active BOOLEAN DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT suppliers_pkey1 PRIMARY KEY (id)
+);
+
+CREATE TABLE reservations (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    table_id UUID,
+    customer_name TEXT NOT NULL,
+    customer_phone TEXT,
+    customer_email TEXT,
+    party_size INTEGER NOT NULL,
+    reservation_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    status TEXT DEFAULT 'pending'::text NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT reservations_pkey PRIMARY KEY (id),
+    CONSTRAINT reservations_status_check CHECK (status = ANY (ARRAY['pending'::text, 'confirmed'::text, 'arrived'::text, 'cancelled'::text, 'no_show'::text]))
+);
+
+CREATE TABLE stock_movements (
+    id BIGSERIAL NOT NULL,
+    product_id UUID NOT NULL,
+    movement_type stock_movement_type NOT NULL,
+    quantity NUMERIC(12, 3) NOT NULL,
+    related_order_id UUID,
+    related_production_id UUID,
+    reason TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    company_id UUID NOT NULL,
+    CONSTRAINT stock_movements_pkey PRIMARY KEY (id)
+);
+
+CREATE TABLE recipes (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    name TEXT NOT NULL,
+    yield_quantity NUMERIC(10, 3) DEFAULT 1 NOT NULL,
+    yield_unit TEXT NOT NULL,
+    preparation_time INTEGER,
+    instructions TEXT,
+    notes TEXT,
+    is_active BOOLEAN DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT recipes_pkey1 PRIMARY KEY (id),
+    CONSTRAINT recipes_yield_unit_check CHECK (yield_unit = ANY (ARRAY['un'::text, 'kg'::text, 'l'::text, 'ml'::text, 'g'::text]))
+);
+
+CREATE TABLE order_items (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    order_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    quantity NUMERIC(10, 3) DEFAULT 1 NOT NULL,
+    unit_price NUMERIC(10, 2) NOT NULL,
+    subtotal NUMERIC(10, 2) NOT NULL,
+    notes TEXT,
+    status TEXT DEFAULT 'pending'::text,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT order_items_pkey1 PRIMARY KEY (id),
+    CONSTRAINT order_items_status_check CHECK (status = ANY (ARRAY['pending'::text, 'preparing'::text, 'ready'::text, 'delivered'::text, 'cancelled'::text]))
+);
+
+CREATE TABLE internal_productions (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    company_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    recipe_id UUID,
+    quantity NUMERIC(10, 3) NOT NULL,
+    date DATE DEFAULT CURRENT_DATE NOT NULL,
+    status TEXT DEFAULT 'planned'::text NOT NULL,
+    cost NUMERIC(10, 2) DEFAULT 0,
+    notes TEXT,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT internal_productions_pkey PRIMARY KEY (id),
+    CONSTRAINT internal_productions_status_check CHECK (status = ANY (ARRAY['planned'::text, 'in_progress'::text, 'completed'::text, 'cancelled'::text]))
+);
+
+CREATE TABLE recipe_ingredients (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    recipe_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    quantity NUMERIC(10, 3) NOT NULL,
+    unit TEXT NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT recipe_ingredients_pkey1 PRIMARY KEY (id),
+    CONSTRAINT recipe_ingredients_unit_check CHECK (unit = ANY (ARRAY['un'::text, 'kg'::text, 'l'::text, 'ml'::text, 'g'::text]))
+);
+
+CREATE TABLE production_ingredients (
+    id UUID DEFAULT gen_random_uuid() NOT NULL,
+    production_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    quantity NUMERIC(10, 3) NOT NULL,
+    unit TEXT NOT NULL,
+    cost NUMERIC(10, 2) DEFAULT 0,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT production_ingredients_pkey1 PRIMARY KEY (id),
+    CONSTRAINT production_ingredients_unit_check CHECK (unit = ANY (ARRAY['un'::text, 'kg'::text, 'l'::text, 'ml'::text, 'g'::text]))
+);
+
+ALTER TABLE companies ADD CONSTRAINT companies_owner_id_fkey FOREIGN KEY(owner_id) REFERENCES auth.users (id) ON DELETE CASCADE;
+ALTER TABLE faturacoes ADD CONSTRAINT faturacoes_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id);
+ALTER TABLE faturacoes ADD CONSTRAINT faturacoes_order_id_fkey FOREIGN KEY(order_id) REFERENCES orders (id) ON DELETE CASCADE;
+ALTER TABLE faturacoes ADD CONSTRAINT faturacoes_table_id_fkey FOREIGN KEY(table_id) REFERENCES tables (id);
+ALTER TABLE company_settings ADD CONSTRAINT company_settings_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE sales ADD CONSTRAINT sales_cashier_id_fkey FOREIGN KEY(cashier_id) REFERENCES auth.users (id);
+ALTER TABLE sales ADD CONSTRAINT sales_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE sales ADD CONSTRAINT sales_order_id_fkey1 FOREIGN KEY(order_id) REFERENCES orders (id) ON DELETE RESTRICT;
+ALTER TABLE products ADD CONSTRAINT products_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE company_users ADD CONSTRAINT company_users_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE company_users ADD CONSTRAINT company_users_invited_by_fkey FOREIGN KEY(invited_by) REFERENCES auth.users (id);
+ALTER TABLE company_users ADD CONSTRAINT company_users_user_id_fkey FOREIGN KEY(user_id) REFERENCES auth.users (id) ON DELETE CASCADE;
+ALTER TABLE suppliers ADD CONSTRAINT suppliers_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE reservations ADD CONSTRAINT reservations_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE reservations ADD CONSTRAINT reservations_table_id_fkey FOREIGN KEY(table_id) REFERENCES tables (id) ON DELETE SET NULL;
+ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE recipes ADD CONSTRAINT recipes_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE recipes ADD CONSTRAINT recipes_product_id_fkey1 FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE CASCADE;
+ALTER TABLE order_items ADD CONSTRAINT order_items_order_id_fkey1 FOREIGN KEY(order_id) REFERENCES orders (id) ON DELETE CASCADE;
+ALTER TABLE order_items ADD CONSTRAINT order_items_product_id_fkey1 FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE RESTRICT;
+ALTER TABLE internal_productions ADD CONSTRAINT internal_productions_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE internal_productions ADD CONSTRAINT internal_productions_product_id_fkey FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE RESTRICT;
+ALTER TABLE internal_productions ADD CONSTRAINT internal_productions_recipe_id_fkey FOREIGN KEY(recipe_id) REFERENCES recipes (id) ON DELETE SET NULL;
+ALTER TABLE recipe_ingredients ADD CONSTRAINT recipe_ingredients_product_id_fkey FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE RESTRICT;
+ALTER TABLE recipe_ingredients ADD CONSTRAINT recipe_ingredients_recipe_id_fkey1 FOREIGN KEY(recipe_id) REFERENCES recipes (id) ON DELETE CASCADE;
+ALTER TABLE production_ingredients ADD CONSTRAINT production_ingredients_product_id_fkey FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE RESTRICT;
+ALTER TABLE production_ingredients ADD CONSTRAINT production_ingredients_production_id_fkey1 FOREIGN KEY(production_id) REFERENCES internal_productions (id) ON DELETE CASCADE;
+ALTER TABLE tables ADD CONSTRAINT tables_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE orders ADD CONSTRAINT orders_table_id_fkey1 FOREIGN KEY(table_id) REFERENCES tables (id) ON DELETE SET NULL;
+ALTER TABLE orders ADD CONSTRAINT orders_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+ALTER TABLE tables ADD CONSTRAINT fk_tables_current_order FOREIGN KEY(current_order_id) REFERENCES orders (id) ON DELETE SET NULL;
+
+COMMENT ON COLUMN tables.number IS 'Numeric table identifier. Used by mobile app for sorting/display.';
+COMMENT ON COLUMN tables.name IS 'Human-readable table name (e.g., "Mesa 5", "VIP Table 1"). Must be unique within company.';
+COMMENT ON COLUMN products.internal_notes IS 'Notas internas para controle do produto (não visíveis para clientes)';
+
+CREATE INDEX idx_orders_closed_at ON orders (closed_at);
+CREATE INDEX idx_orders_table_id ON orders (table_id);
+CREATE INDEX idx_orders_company_id ON orders (company_id);
+CREATE INDEX idx_orders_status ON orders (status);
+CREATE INDEX idx_orders_opened_at ON orders (opened_at);
+CREATE INDEX idx_tables_company_id ON tables (company_id);
+CREATE INDEX idx_tables_status ON tables (status);
+CREATE UNIQUE INDEX tables_company_id_number_idx ON tables (company_id, number);
+CREATE INDEX idx_tables_current_order_id ON tables (current_order_id);
+CREATE UNIQUE INDEX tables_company_id_name_idx ON tables (company_id, name);
+CREATE INDEX idx_companies_owner_id ON companies (owner_id);
+CREATE INDEX idx_companies_slug ON companies (slug);
+CREATE INDEX idx_companies_is_active ON companies (is_active);
+CREATE INDEX idx_faturacoes_company_id ON faturacoes (company_id);
+CREATE INDEX idx_company_settings_company_id ON company_settings (company_id);
+CREATE INDEX idx_sales_order_id ON sales (order_id);
+CREATE INDEX idx_sales_cashier_id ON sales (cashier_id);
+CREATE INDEX idx_sales_sale_date ON sales (sale_date);
+CREATE INDEX idx_sales_company_id ON sales (company_id);
+CREATE INDEX idx_sales_payment_method ON sales (payment_method);
+CREATE INDEX idx_products_is_active ON products (is_active);
+CREATE INDEX idx_products_category ON products (category);
+CREATE INDEX idx_products_stock ON products (stock);
+CREATE INDEX idx_products_company_id ON products (company_id);
+CREATE INDEX company_users_user_company_idx ON company_users (user_id, company_id);
+CREATE INDEX idx_company_users_user_id ON company_users (user_id);
+CREATE INDEX idx_company_users_user_company ON company_users (user_id, company_id);
+CREATE INDEX idx_company_users_role ON company_users (role);
+CREATE INDEX idx_company_users_company_id ON company_users (company_id);
+CREATE INDEX idx_company_users_invited_by ON company_users (invited_by);
+CREATE INDEX idx_suppliers_company_id ON suppliers (company_id);
+CREATE INDEX idx_suppliers_is_active ON suppliers (is_active);
+CREATE INDEX idx_reservations_company_id ON reservations (company_id);
+CREATE INDEX idx_reservations_reservation_date ON reservations (reservation_date);
+CREATE INDEX idx_reservations_table_id ON reservations (table_id);
+CREATE INDEX stock_movements_company_created_idx ON stock_movements (company_id, created_at);
+CREATE INDEX stock_movements_company_id_idx ON stock_movements (company_id);
+CREATE INDEX idx_recipes_is_active ON recipes (is_active);
+CREATE INDEX idx_recipes_product_id ON recipes (product_id);
+CREATE INDEX idx_recipes_company_id ON recipes (company_id);
+CREATE INDEX idx_order_items_status ON order_items (status);
+CREATE INDEX idx_order_items_order_id ON order_items (order_id);
+CREATE INDEX idx_order_items_product_id ON order_items (product_id);
+CREATE INDEX idx_internal_productions_product_id ON internal_productions (product_id);
+CREATE INDEX idx_internal_productions_status ON internal_productions (status);
+CREATE INDEX idx_internal_productions_company_id ON internal_productions (company_id);
+CREATE INDEX idx_internal_productions_recipe_id ON internal_productions (recipe_id);
+CREATE INDEX idx_internal_productions_date ON internal_productions (date);
+CREATE INDEX idx_recipe_ingredients_recipe_id ON recipe_ingredients (recipe_id);
+CREATE INDEX idx_recipe_ingredients_product_id ON recipe_ingredients (product_id);
+CREATE INDEX idx_production_ingredients_production_id ON production_ingredients (production_id);
+CREATE INDEX idx_production_ingredients_product_id ON production_ingredients (product_id);
@@ -0,0 +1,29 @@
+-- migrate: no-transaction
+-- Drop indexes that other indexes on the same table already cover.
+
+-- shadowed: covered by companies_slug_key
+DROP INDEX CONCURRENTLY IF EXISTS idx_companies_slug;
+
+-- shadowed: covered by company_settings_company_id_key
+DROP INDEX CONCURRENTLY IF EXISTS idx_company_settings_company_id;
+
+-- prefix: covered by company_users_company_id_user_id_key
+DROP INDEX CONCURRENTLY IF EXISTS idx_company_users_company_id;
+
+-- duplicate: covered by company_users_user_company_idx
+DROP INDEX CONCURRENTLY IF EXISTS idx_company_users_user_company;
+
+-- prefix: covered by company_users_user_company_idx
+DROP INDEX CONCURRENTLY IF EXISTS idx_company_users_user_id;
+
+-- prefix: covered by stock_movements_company_created_idx
+DROP INDEX CONCURRENTLY IF EXISTS stock_movements_company_id_idx;
+
+-- prefix: covered by tables_company_id_number_key
+DROP INDEX CONCURRENTLY IF EXISTS idx_tables_company_id;
+
+-- shadowed: covered by tables_company_name_unique
+DROP INDEX CONCURRENTLY IF EXISTS tables_company_id_name_idx;
+
+-- shadowed: covered by tables_company_id_number_key
+DROP INDEX CONCURRENTLY IF EXISTS tables_company_id_number_idx;
@@ -0,0 +1,129 @@
+-- Incremental rollups behind the dashboard KPIs.
+--
+-- sales_daily holds one row per company and local day (company_settings
+-- timezone) and company_kpis one row per company with the active table and
+-- low-stock product counts. Statement-level triggers with transition tables
+-- fold each INSERT/UPDATE/DELETE into the rollups with a single upsert, so a
+-- bulk write costs one aggregate, and reading the KPIs never touches sales,
+-- tables or products.
+--
+-- The trigger functions address the rollups through TG_TABLE_SCHEMA: pooled
+-- schemas are renamed when claimed, so a captured search_path would go stale.
+-- A product is low on stock when it is active, has a min_stock and its stock
+-- is at or below it.
+
+CREATE TABLE sales_daily (
+    company_id UUID NOT NULL,
+    day DATE NOT NULL,
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    total NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT sales_daily_pkey PRIMARY KEY (company_id, day)
+);
+
+CREATE TABLE company_kpis (
+    company_id UUID NOT NULL,
+    active_tables INTEGER NOT NULL DEFAULT 0,
+    low_stock_items INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT company_kpis_pkey PRIMARY KEY (company_id)
+);
+
+CREATE FUNCTION sales_daily_apply() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changes text[] := ARRAY[]::text[];
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changes := changes || 'SELECT company_id, sale_date, total, 1 AS sign FROM new_rows'::text;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        changes := changes || 'SELECT company_id, sale_date, total, -1 AS sign FROM old_rows'::text;
+    END IF;
+    EXECUTE format(
+        $sql$
+        INSERT INTO %1$I.sales_daily AS d (company_id, day, sales_count, total)
+        SELECT c.company_id,
+               (c.sale_date AT TIME ZONE coalesce(s.timezone, 'America/Sao_Paulo'))::date,
+               sum(c.sign),
+               sum(c.sign * c.total)
+        FROM (%2$s) c
+        LEFT JOIN %1$I.company_settings s ON s.company_id = c.company_id
+        GROUP BY 1, 2
+        HAVING sum(c.sign) <> 0 OR sum(c.sign * c.total) <> 0
+        ON CONFLICT (company_id, day) DO UPDATE
+        SET sales_count = d.sales_count + EXCLUDED.sales_count,
+            total = d.total + EXCLUDED.total,
+            updated_at = now()
+        $sql$,
+        TG_TABLE_SCHEMA,
+        array_to_string(changes, ' UNION ALL ')
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- company_kpis_apply(column, predicate): add +1/-1 to company_kpis.<column>
+-- for every row entering/leaving the predicate.
+CREATE FUNCTION company_kpis_apply() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changes text[] := ARRAY[]::text[];
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changes := changes || format('SELECT company_id, 1 AS delta FROM new_rows WHERE %s', TG_ARGV[1]);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        changes := changes || format('SELECT company_id, -1 AS delta FROM old_rows WHERE %s', TG_ARGV[1]);
+    END IF;
+    EXECUTE format(
+        $sql$
+        INSERT INTO %1$I.company_kpis AS k (company_id, %2$I)
+        SELECT company_id, sum(delta) FROM (%3$s) c
+        GROUP BY company_id
+        HAVING sum(delta) <> 0
+        ON CONFLICT (company_id) DO UPDATE
+        SET %2$I = k.%2$I + EXCLUDED.%2$I, updated_at = now()
+        $sql$,
+        TG_TABLE_SCHEMA,
+        TG_ARGV[0],
+        array_to_string(changes, ' UNION ALL ')
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- CREATE TRIGGER blocks writes to its table until commit, so this file only
+-- attaches them; 0008 backfills the history of existing tenants afterwards,
+-- outside this transaction.
+CREATE TRIGGER sales_daily_insert AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_apply();
+CREATE TRIGGER sales_daily_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_apply();
+CREATE TRIGGER sales_daily_delete AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_apply();
+
+CREATE TRIGGER company_kpis_tables_insert AFTER INSERT ON tables
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('active_tables', 'status = ''occupied''');
+CREATE TRIGGER company_kpis_tables_update AFTER UPDATE ON tables
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('active_tables', 'status = ''occupied''');
+CREATE TRIGGER company_kpis_tables_delete AFTER DELETE ON tables
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('active_tables', 'status = ''occupied''');
+
+CREATE TRIGGER company_kpis_products_insert AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('low_stock_items', 'is_active AND min_stock > 0 AND stock <= min_stock');
+CREATE TRIGGER company_kpis_products_update AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('low_stock_items', 'is_active AND min_stock > 0 AND stock <= min_stock');
+CREATE TRIGGER company_kpis_products_delete AFTER DELETE ON products
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION company_kpis_apply('low_stock_items', 'is_active AND min_stock > 0 AND stock <= min_stock');
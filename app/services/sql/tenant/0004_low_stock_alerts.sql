@@ -0,0 +1,71 @@
+-- Low-stock set and threshold-crossing events.
+--
+-- A product is low on stock when it is active, has a min_stock and its stock
+-- is at or below it (the same predicate company_kpis counts, see 0003).
+-- idx_products_low_stock (built concurrently by 0006) only holds those
+-- products, so listing a company's low-stock items reads just them, however
+-- large the catalog is; Postgres moves a product in or out of the index as
+-- its stock changes.
+--
+-- Writers keep updating products.stock themselves and log the change in
+-- stock_movements; the set follows products.stock only. Every product entering
+-- or leaving the low-stock set, through an insert or an update of products,
+-- gets a stock_alerts row ('low' / 'restored') and the transaction sends one
+-- NOTIFY stock_alerts with the schema and the last alert id, so listeners only
+-- need to read past their cursor.
+
+CREATE TABLE stock_alerts (
+    id BIGSERIAL NOT NULL,
+    company_id UUID NOT NULL,
+    product_id UUID NOT NULL,
+    kind TEXT NOT NULL,
+    stock NUMERIC(10, 3) NOT NULL,
+    min_stock NUMERIC(10, 3) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT stock_alerts_pkey PRIMARY KEY (id),
+    CONSTRAINT stock_alerts_kind_check CHECK (kind = ANY (ARRAY['low'::text, 'restored'::text]))
+);
+
+CREATE FUNCTION stock_alerts_emit() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    EXECUTE format(
+        $sql$
+        WITH crossed AS (
+            INSERT INTO %1$I.stock_alerts (company_id, product_id, kind, stock, min_stock)
+            SELECT n.company_id,
+                   n.id,
+                   CASE WHEN n.is_active AND n.min_stock > 0 AND n.stock <= n.min_stock
+                        THEN 'low' ELSE 'restored' END,
+                   n.stock,
+                   coalesce(n.min_stock, 0)
+            FROM new_rows n
+            LEFT JOIN %2$s o ON o.id = n.id
+            WHERE coalesce(n.is_active AND n.min_stock > 0 AND n.stock <= n.min_stock, false)
+                  <> coalesce(o.is_active AND o.min_stock > 0 AND o.stock <= o.min_stock, false)
+            ORDER BY n.id
+            RETURNING id
+        )
+        SELECT pg_notify('stock_alerts', json_build_object('schema', %1$L, 'last_id', max(id))::text)
+        FROM crossed
+        HAVING count(*) > 0
+        $sql$,
+        TG_TABLE_SCHEMA,
+        CASE WHEN TG_OP = 'UPDATE' THEN 'old_rows'
+             ELSE format('(SELECT * FROM %I.products WHERE false)', TG_TABLE_SCHEMA) END
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER stock_alerts_insert AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_alerts_emit();
+CREATE TRIGGER stock_alerts_update AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_alerts_emit();
+
+ALTER TABLE stock_alerts ADD CONSTRAINT stock_alerts_company_id_fkey FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE;
+
+CREATE INDEX stock_alerts_company_id_idx ON stock_alerts (company_id, id);
@@ -0,0 +1,19 @@
+-- Periodic per-product checkpoints over the stock_movements ledger.
+--
+-- A checkpoint stores a product's stock once every movement created up to
+-- as_of has been applied. Stock at any instant is the nearest checkpoint plus
+-- (or minus) the movements between it and that instant, read from
+-- stock_movements_product_created_idx (built concurrently by 0007), so the
+-- cost follows the checkpoint interval instead of the ledger's age.
+-- Checkpoints are written and drift in products.stock is repaired by
+-- app/services/stock_ledger.py.
+
+CREATE TABLE stock_checkpoints (
+    product_id UUID NOT NULL,
+    as_of TIMESTAMP WITH TIME ZONE NOT NULL,
+    stock NUMERIC(14, 3) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT stock_checkpoints_pkey PRIMARY KEY (product_id, as_of)
+);
+
+ALTER TABLE stock_checkpoints ADD CONSTRAINT stock_checkpoints_product_id_fkey FOREIGN KEY(product_id) REFERENCES products (id) ON DELETE CASCADE;
@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- The low-stock set of 0004, built without blocking writes to products on
+-- existing tenants. The runner drops an invalid index left by an interrupted
+-- build before re-running this file.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_low_stock ON products (company_id, name)
+    INCLUDE (id, stock, min_stock, unit)
+    WHERE is_active AND min_stock > 0 AND stock <= min_stock;
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- The per-product history index of 0005, built without blocking writes to
+-- stock_movements on existing tenants. The runner drops an invalid index left
+-- by an interrupted build before re-running this file.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS stock_movements_product_created_idx
+    ON stock_movements (product_id, created_at) INCLUDE (quantity);
@@ -0,0 +1,71 @@
+-- migrate: no-transaction
+-- Seed the 0003 rollups from the history of existing tenants (new tenants
+-- have none, so the loops below do nothing inside their build transaction).
+--
+-- The 0003 triggers are live by now and keep folding writes into the
+-- rollups, so the backfill overwrites instead of adding: each rollup row is
+-- recomputed from its source rows in a transaction of its own that first
+-- locks that row. A writer that got to the row first has committed before
+-- the recount reads, and one that comes later waits for the recount to
+-- commit and then adds its change on top, so nothing is counted twice.
+-- Sales are walked forward by sale_date one day-long window at a time,
+-- using idx_sales_sale_date, and no write to sales, tables or products is
+-- ever blocked. Recounting is idempotent, so re-running the file is safe.
+
+DO $$
+DECLARE
+    window_start timestamptz;
+    watermark timestamptz := '-infinity';
+    bucket record;
+BEGIN
+    LOOP
+        SELECT min(sale_date) INTO window_start FROM sales WHERE sale_date >= watermark;
+        EXIT WHEN window_start IS NULL;
+        watermark := window_start + interval '1 day';
+        FOR bucket IN
+            SELECT DISTINCT sales.company_id,
+                   coalesce(s.timezone, 'America/Sao_Paulo') AS timezone,
+                   (sales.sale_date AT TIME ZONE coalesce(s.timezone, 'America/Sao_Paulo'))::date AS day
+            FROM sales
+            LEFT JOIN company_settings s ON s.company_id = sales.company_id
+            WHERE sales.sale_date >= window_start AND sales.sale_date < watermark
+        LOOP
+            INSERT INTO sales_daily AS d (company_id, day) VALUES (bucket.company_id, bucket.day)
+            ON CONFLICT (company_id, day) DO UPDATE SET updated_at = d.updated_at;
+            UPDATE sales_daily d
+            SET sales_count = t.sales_count, total = t.total, updated_at = now()
+            FROM (
+                SELECT count(*)::integer AS sales_count, coalesce(sum(total), 0) AS total
+                FROM sales
+                WHERE company_id = bucket.company_id
+                  AND sale_date >= bucket.day::timestamp AT TIME ZONE bucket.timezone
+                  AND sale_date < (bucket.day + 1)::timestamp AT TIME ZONE bucket.timezone
+            ) t
+            WHERE d.company_id = bucket.company_id AND d.day = bucket.day;
+            COMMIT;
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
+DO $$
+DECLARE
+    company record;
+BEGIN
+    FOR company IN SELECT id FROM companies ORDER BY id LOOP
+        INSERT INTO company_kpis AS k (company_id) VALUES (company.id)
+        ON CONFLICT (company_id) DO UPDATE SET updated_at = k.updated_at;
+        UPDATE company_kpis
+        SET active_tables = (
+                SELECT count(*) FROM tables WHERE company_id = company.id AND status = 'occupied'
+            ),
+            low_stock_items = (
+                SELECT count(*) FROM products
+                WHERE company_id = company.id AND is_active AND min_stock > 0 AND stock <= min_stock
+            ),
+            updated_at = now()
+        WHERE company_id = company.id;
+        COMMIT;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,76 @@
+"""Run provisioning SQL through whichever database path is configured.
+
+Provisioning issues DDL scripts and calls a few SQL functions. With the
+default PostgREST backend they go through the shared service-role admin
+client (``execute_sql`` and named RPCs); with ``STORAGE_BACKEND=postgres``
+they run on the psycopg pool. Either way a script runs in one transaction.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from psycopg import AsyncConnection, sql
+
+from app.services.postgres_backend import PostgresClient
+from app.services.storage import StorageClient
+from app.services.supabase_admin import SupabaseAdmin, supabase_admin
+from app.services.supabase_client import supabase_client
+
+
+class SupabaseSqlExecutor:
+    """Runs scripts via the ``execute_sql`` RPC and calls functions as RPCs."""
+
+    def __init__(self, admin: Optional[SupabaseAdmin] = None) -> None:
+        self._admin = admin
+
+    @property
+    def admin(self) -> SupabaseAdmin:
+        return self._admin or supabase_admin
+
+    async def execute(self, script: str) -> None:
+        await self.admin.rpc("execute_sql", {"sql_command": script})
+
+    async def call(self, function: str, **params: Any) -> Any:
+        response = await self.admin.rpc(function, params)
+        return response.data
+
+
+class PostgresSqlExecutor:
+    """Runs scripts and function calls on the psycopg backend's pool."""
+
+    def __init__(self, client: PostgresClient) -> None:
+        self.client = client
+
+    async def execute(self, script: str) -> None:
+        async def work(conn: AsyncConnection) -> None:
+            await conn.execute(script, prepare=False)
+
+        await self.client._run(work)
+
+    async def call(self, function: str, **params: Any) -> Any:
+        query = sql.SQL("SELECT {}({}) AS result").format(
+            sql.Identifier(function),
+            sql.SQL(", ").join(
+                sql.SQL("{} => {}").format(sql.Identifier(name), sql.Placeholder(name))
+                for name in params
+            ),
+        )
+
+        async def work(conn: AsyncConnection) -> Any:
+            cursor = await conn.execute(query, params)
+            row = await cursor.fetchone()
+            return row["result"] if row else None
+
+        return await self.client._run(work)
+
+
+def sql_executor(
+    storage: Optional[StorageClient] = None, admin: Optional[SupabaseAdmin] = None
+) -> SupabaseSqlExecutor | PostgresSqlExecutor:
+    """Pick the executor matching the configured storage backend."""
+
+    storage = storage or supabase_client
+    if isinstance(storage, PostgresClient):
+        return PostgresSqlExecutor(storage)
+    return SupabaseSqlExecutor(admin)
@@ -0,0 +1,312 @@
+"""Checkpointed stock ledger: point-in-time stock and drift repair.
+
+``stock_movements`` is the append-only record of every stock change; the
+writer that logs a movement updates ``products.stock`` itself, so the number
+drifts when a writer edits it without logging one. This module keeps per-product checkpoints and reconciles against
+them::
+
+    python -m app.services.stock_ledger checkpoint                  # all tenants
+    python -m app.services.stock_ledger reconcile                   # report drift
+    python -m app.services.stock_ledger reconcile --repair --report drift.json
+    python -m app.services.stock_ledger stock --schema org_bar --at 2026-01-31T23:59:59-03:00
+
+``checkpoint`` folds, for every product with new movements, the movements
+created up to ``now() - STOCK_CHECKPOINT_LAG`` into a new checkpoint. The lag
+keeps a checkpoint from sealing an instant that an uncommitted transaction
+can still add movements to. A product's first checkpoint trusts its current
+``products.stock``. Stock at any instant (:func:`stock_at`) is the nearest
+checkpoint corrected by the movements in between, which is a bounded range
+scan of ``stock_movements_product_created_idx`` however old the ledger is.
+
+``reconcile`` compares ``products.stock`` with the ledger and, with
+``--repair``, shifts the drifted products back by their drift. The repair is
+relative, so movements that commit during the run are kept. Physical counts
+should update the stock and log a ``manual_adjustment`` movement; edits
+without a movement are reported as drift.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+from psycopg import AsyncConnection, sql
+
+from app.services.postgres_backend import PostgresClient, _jsonable
+from app.services.tenant_migrations import discover_tenant_schemas
+from app.utils.env import env_float
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTED = "checkpointed"
+CURRENT = "current"
+CLEAN = "clean"
+DRIFT = "drift"
+REPAIRED = "repaired"
+UNMANAGED = "unmanaged"
+BUSY = "busy"
+FAILED = "failed"
+
+# Stock of each selected product at %(at)s (NULL: now) from its nearest
+# checkpoint; products without one fall back to products.stock.
+LEDGER_QUERY = """
+    SELECT p.id AS product_id, p.company_id, p.stock AS observed, r.stock + coalesce(d.delta, 0) AS stock
+    FROM products p
+    CROSS JOIN (SELECT coalesce(%(at)s::timestamptz, 'infinity') AS at) q
+    CROSS JOIN LATERAL (
+        SELECT refs.as_of, refs.stock FROM (
+            (SELECT 0 AS rank, c.as_of, c.stock FROM stock_checkpoints c
+             WHERE c.product_id = p.id AND c.as_of <= q.at ORDER BY c.as_of DESC LIMIT 1)
+            UNION ALL
+            (SELECT 1, c.as_of, c.stock FROM stock_checkpoints c
+             WHERE c.product_id = p.id AND c.as_of > q.at ORDER BY c.as_of LIMIT 1)
+            UNION ALL
+            SELECT 2, 'infinity'::timestamptz, p.stock
+        ) refs
+        ORDER BY refs.rank
+        LIMIT 1
+    ) r
+    CROSS JOIN LATERAL (
+        SELECT sum(CASE WHEN r.as_of <= q.at THEN m.quantity ELSE -m.quantity END) AS delta
+        FROM stock_movements m
+        WHERE m.product_id = p.id
+          AND m.created_at > least(r.as_of, q.at)
+          AND m.created_at <= greatest(r.as_of, q.at)
+    ) d
+    WHERE (%(company_id)s::uuid IS NULL OR p.company_id = %(company_id)s::uuid)
+      AND (%(product_ids)s::uuid[] IS NULL OR p.id = ANY(%(product_ids)s::uuid[]))
+"""
+
+CHECKPOINT_QUERY = """
+    INSERT INTO stock_checkpoints (product_id, as_of, stock)
+    SELECT p.id,
+           h.as_of,
+           CASE WHEN c.as_of IS NULL THEN p.stock - coalesce(later.delta, 0)
+                ELSE c.stock + since.delta END
+    FROM products p
+    CROSS JOIN (SELECT now() - make_interval(secs => %(lag)s) AS as_of) h
+    LEFT JOIN LATERAL (
+        SELECT c.as_of, c.stock FROM stock_checkpoints c
+        WHERE c.product_id = p.id ORDER BY c.as_of DESC LIMIT 1
+    ) c ON true
+    LEFT JOIN LATERAL (
+        SELECT sum(m.quantity) AS delta FROM stock_movements m
+        WHERE m.product_id = p.id AND m.created_at > c.as_of AND m.created_at <= h.as_of
+    ) since ON c.as_of IS NOT NULL
+    LEFT JOIN LATERAL (
+        SELECT sum(m.quantity) AS delta FROM stock_movements m
+        WHERE m.product_id = p.id AND m.created_at > h.as_of
+    ) later ON c.as_of IS NULL
+    WHERE c.as_of IS NULL OR (c.as_of < h.as_of AND since.delta IS NOT NULL)
+    ON CONFLICT DO NOTHING
+    RETURNING as_of
+"""
+
+REPAIR_QUERY = """
+    WITH ledger AS ({ledger}), drift AS (
+        SELECT product_id, observed - stock AS drift FROM ledger WHERE observed <> stock
+    )
+    UPDATE products p
+    SET stock = p.stock - drift.drift, updated_at = now()
+    FROM drift
+    WHERE p.id = drift.product_id
+    RETURNING p.id AS product_id, p.company_id, p.stock + drift.drift AS observed, p.stock AS stock
+"""
+
+
+def checkpoint_lag() -> float:
+    return env_float("STOCK_CHECKPOINT_LAG", 300.0)
+
+
+def _ledger_params(
+    at: Optional[datetime.datetime] = None,
+    company_id: Optional[str] = None,
+    product_ids: Optional[Sequence[str]] = None,
+) -> dict[str, Any]:
+    return {
+        "at": at,
+        "company_id": company_id,
+        "product_ids": list(product_ids) if product_ids is not None else None,
+    }
+
+
+async def _in_tenant(
+    client: PostgresClient,
+    schema: str,
+    job: str,
+    work: Callable[[AsyncConnection, dict[str, Any]], Awaitable[None]],
+) -> dict[str, Any]:
+    """Run ``work`` inside ``schema`` under a per-tenant, per-job advisory lock."""
+
+    started = time.perf_counter()
+    record: dict[str, Any] = {"schema": schema}
+
+    async def run(conn: AsyncConnection) -> None:
+        cursor = await conn.execute(
+            "SELECT pg_try_advisory_xact_lock(hashtext(%s), hashtext(%s)) AS locked,"
+            " to_regclass(format('%%I.stock_checkpoints', %s::text)) IS NOT NULL AS managed",
+            [f"stock_ledger:{job}", schema, schema],
+        )
+        row = await cursor.fetchone()
+        if not row["locked"]:
+            record["status"] = BUSY
+            return
+        if not row["managed"]:
+            record["status"] = UNMANAGED
+            return
+        await conn.execute(
+            sql.SQL("SET LOCAL search_path TO {}, public").format(sql.Identifier(schema))
+        )
+        await work(conn, record)
+
+    try:
+        await client._run(run)
+    except Exception as exc:
+        logger.warning("Stock %s of %s failed: %s", job, schema, exc)
+        record.update(status=FAILED, error=str(exc))
+    record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+async def checkpoint(client: PostgresClient, schema: str, *, lag: Optional[float] = None) -> dict[str, Any]:
+    """Write a checkpoint for every product of ``schema`` with movements since its last one."""
+
+    async def work(conn: AsyncConnection, record: dict[str, Any]) -> None:
+        cursor = await conn.execute(CHECKPOINT_QUERY, {"lag": checkpoint_lag() if lag is None else lag})
+        rows = await cursor.fetchall()
+        record["checkpoints"] = len(rows)
+        record["as_of"] = rows[0]["as_of"].isoformat() if rows else None
+        record["status"] = CHECKPOINTED if rows else CURRENT
+
+    return await _in_tenant(client, schema, "checkpoint", work)
+
+
+async def reconcile(client: PostgresClient, schema: str, *, repair: bool = False) -> dict[str, Any]:
+    """Report (and with ``repair``, fix) products whose stock disagrees with the ledger."""
+
+    async def work(conn: AsyncConnection, record: dict[str, Any]) -> None:
+        if repair:
+            cursor = await conn.execute(REPAIR_QUERY.format(ledger=LEDGER_QUERY), _ledger_params())
+        else:
+            cursor = await conn.execute(
+                f"SELECT * FROM ({LEDGER_QUERY}) ledger WHERE observed <> stock", _ledger_params()
+            )
+        drifted = [
+            {**_jsonable(row), "drift": float(row["observed"] - row["stock"])}
+            for row in await cursor.fetchall()
+        ]
+        record["drifted"] = sorted(drifted, key=lambda row: row["product_id"])
+        record["status"] = (REPAIRED if repair else DRIFT) if drifted else CLEAN
+
+    return await _in_tenant(client, schema, "reconcile", work)
+
+
+async def stock_at(
+    client: PostgresClient,
+    schema: str,
+    *,
+    at: Optional[datetime.datetime] = None,
+    company_id: Optional[str] = None,
+    product_ids: Optional[Sequence[str]] = None,
+) -> dict[str, Decimal]:
+    """Ledger stock per product id at ``at`` (default: now), from the nearest checkpoint."""
+
+    async def work(conn: AsyncConnection) -> dict[str, Decimal]:
+        await conn.execute(
+            sql.SQL("SET LOCAL search_path TO {}, public").format(sql.Identifier(schema))
+        )
+        cursor = await conn.execute(LEDGER_QUERY, _ledger_params(at, company_id, product_ids))
+        return {str(row["product_id"]): row["stock"] for row in await cursor.fetchall()}
+
+    return await client._run(work)
+
+
+async def run_tenants(
+    schemas: Sequence[str],
+    job: Callable[[str], Awaitable[dict[str, Any]]],
+    *,
+    concurrency: int = 4,
+) -> dict[str, Any]:
+    """Run ``job`` for every schema, ``concurrency`` at a time, and summarize the records."""
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+
+    async def run(schema: str) -> dict[str, Any]:
+        async with semaphore:
+            return await job(schema)
+
+    records = sorted(await asyncio.gather(*(run(schema) for schema in schemas)), key=lambda r: r["schema"])
+    counts: dict[str, int] = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    return {
+        "tenants": len(records),
+        "counts": counts,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "tenants_detail": records,
+    }
+
+
+async def _main(args: argparse.Namespace) -> int:
+    client = PostgresClient(args.dsn, schema="reflex", cache=False)
+    try:
+        if args.command == "stock":
+            if len(args.schema or []) != 1:
+                raise SystemExit("stock needs exactly one --schema")
+            at = datetime.datetime.fromisoformat(args.at) if args.at else None
+            stock = await stock_at(client, args.schema[0], at=at, company_id=args.company_id)
+            print(json.dumps(_jsonable(stock), indent=2))
+            return 0
+        schemas = args.schema or await discover_tenant_schemas(client, include_pool=False)
+        if args.command == "checkpoint":
+            report = await run_tenants(
+                schemas, lambda schema: checkpoint(client, schema, lag=args.lag), concurrency=args.concurrency
+            )
+        else:
+            report = await run_tenants(
+                schemas, lambda schema: reconcile(client, schema, repair=args.repair), concurrency=args.concurrency
+            )
+    finally:
+        await client.aclose()
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    summary = {key: value for key, value in report.items() if key != "tenants_detail"}
+    summary["drifted"] = {
+        record["schema"]: len(record["drifted"]) for record in report["tenants_detail"] if record.get("drifted")
+    }
+    summary["failed"] = [
+        {"schema": record["schema"], "error": record.get("error")}
+        for record in report["tenants_detail"]
+        if record["status"] == FAILED
+    ]
+    print(json.dumps(summary, indent=2))
+    return 1 if report["counts"].get(FAILED) or report["counts"].get(DRIFT) else 0
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["checkpoint", "reconcile", "stock"])
+    parser.add_argument("--dsn", help="Postgres DSN (default: DATABASE_URL)")
+    parser.add_argument("--schema", action="append", help="only this tenant schema (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--lag", type=float, help="checkpoint lag in seconds (default: STOCK_CHECKPOINT_LAG)")
+    parser.add_argument("--repair", action="store_true", help="reconcile: fix the drifted products")
+    parser.add_argument("--at", help="stock: ISO timestamp (default: now)")
+    parser.add_argument("--company-id", help="stock: only this company's products")
+    parser.add_argument("--report", help="write the full per-tenant report to this JSON file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Behaviour shared by every storage backend behind ``supabase_client``.
+
+Backends (PostgREST in ``supabase_client``, direct Postgres in
+``postgres_backend``) expose the same coroutine methods and inherit the
+lookup cache, request coalescing, retry policy and circuit breaker from
+:class:`StorageClient`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from app.services.cache import ReadThroughCache, SingleFlight, TTLCache
+from app.services.redis_client import get_redis
+from app.services.resilience import CircuitBreaker, RetryPolicy, is_transient
+from app.utils.env import env_float, env_int
+from app.utils.validators import validate_cpf_cnpj, validate_email, validate_postal_code
+
+USER_REQUIRED_FIELDS = (
+    "email",
+    "username",
+    "tax_number",
+    "first_name",
+    "last_name",
+    "birth_date",
+    "country",
+    "postal_code",
+    "house_number",
+)
+USER_UNIQUE_FIELDS = ("email", "tax_number", "username")
+
+
+def build_cache() -> Optional[ReadThroughCache]:
+    """Create the lookup cache, with a Redis tier when Redis is configured."""
+
+    ttl = env_float("SUPABASE_CACHE_TTL", 30.0)
+    if ttl <= 0:
+        return None
+    return ReadThroughCache(
+        TTLCache(maxsize=env_int("SUPABASE_CACHE_MAXSIZE", 1024), ttl=ttl),
+        redis=get_redis(),
+    )
+
+
+def build_retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        attempts=env_int("SUPABASE_RETRY_ATTEMPTS", 3),
+        base_delay=env_float("SUPABASE_RETRY_BASE_DELAY", 0.1),
+        max_delay=env_float("SUPABASE_RETRY_MAX_DELAY", 2.0),
+    )
+
+
+def build_breaker(name: str = "supabase") -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=env_int("SUPABASE_BREAKER_FAILURES", 5),
+        reset_timeout=env_float("SUPABASE_BREAKER_RESET", 30.0),
+        name=name,
+    )
+
+
+def user_row_error(row: dict[str, Any]) -> Optional[str]:
+    """Return why ``row`` cannot be stored in `users`, or ``None`` when it is valid."""
+
+    missing = [field for field in USER_REQUIRED_FIELDS if not str(row.get(field) or "").strip()]
+    if missing:
+        return f"Campos obrigatórios ausentes: {', '.join(missing)}."
+    if not validate_email(row["email"]):
+        return "Email inválido."
+    if not validate_cpf_cnpj(row["tax_number"]):
+        return "CPF ou CNPJ inválido."
+    if not validate_postal_code(row["postal_code"]):
+        return "CEP inválido."
+    try:
+        datetime.date.fromisoformat(str(row["birth_date"]))
+    except ValueError:
+        return "Data de nascimento inválida (use AAAA-MM-DD)."
+    return None
+
+
+def dedupe_user_rows(
+    rows: Sequence[dict[str, Any]], results: List[Optional[dict[str, Any]]]
+) -> list[tuple[int, dict[str, Any]]]:
+    """Drop rows that collide on email, tax_number or username within a batch.
+
+    A later row with the same email replaces the earlier one (last write
+    wins, as sequential upserts would). A row that clashes with a different
+    user on tax_number or username is rejected. Outcomes are written to
+    ``results`` by input index; rows already marked there are skipped.
+    """
+
+    accepted: dict[int, dict[str, Any]] = {}
+    owners: dict[tuple[str, Any], int] = {}
+    for index, row in enumerate(rows):
+        if results[index] is not None:
+            continue
+        clashes = {
+            owners[(field, row[field])]
+            for field in USER_UNIQUE_FIELDS
+            if (field, row[field]) in owners
+        }
+        if len(clashes) > 1 or any(accepted[other]["email"] != row["email"] for other in clashes):
+            results[index] = {
+                "index": index,
+                "status": "duplicate",
+                "error": "Email, CPF/CNPJ ou username repetido no lote.",
+            }
+            continue
+        for previous in clashes:
+            replaced = accepted.pop(previous)
+            for field in USER_UNIQUE_FIELDS:
+                owners.pop((field, replaced[field]), None)
+            results[previous] = {
+                "index": previous,
+                "status": "duplicate",
+                "error": f"Substituída pela linha {index}.",
+            }
+        accepted[index] = row
+        for field in USER_UNIQUE_FIELDS:
+            owners[(field, row[field])] = index
+    return sorted(accepted.items())
+
+
+class StorageClient(ABC):
+    """Base class wiring the cache and resilience policies shared by backends.
+
+    ``cache=True`` builds the cache from ``SUPABASE_CACHE_*``; pass ``False``
+    to disable it or a :class:`ReadThroughCache` to inject one.
+    """
+
+    breaker_name = "supabase"
+
+    def __init__(
+        self,
+        cache: Optional[ReadThroughCache] | bool = True,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.cache: Optional[ReadThroughCache] = build_cache() if cache is True else cache or None
+        self.inflight = SingleFlight()
+        self.retry: RetryPolicy = retry or build_retry_policy()
+        self.breaker: CircuitBreaker = breaker or build_breaker(self.breaker_name)
+
+    async def _cached(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve ``key`` from the lookup cache, loading it on a miss."""
+
+        if self.cache is None:
+            return await loader()
+        return await self.cache.get_or_load(key, loader)
+
+    async def _invalidate(self, *keys: str) -> None:
+        if self.cache is not None:
+            await self.cache.invalidate(*keys)
+
+    async def _invalidate_user(self, email: Optional[str]) -> None:
+        if email:
+            await self._invalidate(f"user:email:{email}", f"session:email:{email}")
+
+    async def _invalidate_memberships(self) -> None:
+        """Drop every membership-derived entry (the affected users are unknown)."""
+
+        if self.cache is not None:
+            await self.cache.invalidate_prefix("user_boteco:")
+            await self.cache.invalidate_prefix("session:")
+
+    def cache_stats(self) -> dict[str, int]:
+        """Return lookup cache counters (empty when caching is disabled)."""
+
+        return self.cache.stats() if self.cache is not None else {}
+
+    def health(self) -> dict[str, Any]:
+        """Return breaker state and cache counters for monitoring."""
+
+        return {"breaker": self.breaker.snapshot(), "cache": self.cache_stats()}
+
+    async def aclose(self) -> None:
+        """Release pooled connections held by the backend."""
+
+    @abstractmethod
+    async def _upsert_user_rows(self, rows: List[dict[str, Any]]) -> List[dict[str, Any]]:
+        """Upsert ``rows`` into `users` on email in a single statement/request."""
+
+    async def upsert_users_bulk(
+        self,
+        rows: Sequence[dict[str, Any]],
+        *,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """Validate, dedupe and upsert many users with chunked multi-row writes.
+
+        Rows are checked with :mod:`app.utils.validators`, deduplicated on
+        email, tax_number and username, then sent ``chunk_size`` at a time
+        with at most ``concurrency`` chunks in flight. A chunk rejected by
+        the database is bisected so one bad row does not sink its neighbours.
+
+        Returns ``{"results": [...], "stats": {...}}`` where each result has
+        the input ``index``, a ``status`` (``upserted``, ``invalid``,
+        ``duplicate`` or ``failed``) and the stored ``id`` or an ``error``.
+        """
+
+        chunk_size = max(1, chunk_size or env_int("USER_BULK_CHUNK_SIZE", 500))
+        concurrency = max(1, concurrency or env_int("USER_BULK_CONCURRENCY", 4))
+        started = time.perf_counter()
+
+        cleaned = [
+            {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+            for row in rows
+        ]
+        results: List[Optional[dict[str, Any]]] = [None] * len(cleaned)
+        for index, row in enumerate(cleaned):
+            error = user_row_error(row)
+            if error:
+                results[index] = {"index": index, "status": "invalid", "error": error}
+        accepted = dedupe_user_rows(cleaned, results)
+
+        chunks = [accepted[i : i + chunk_size] for i in range(0, len(accepted), chunk_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+        requests = 0
+
+        async def send(chunk: list[tuple[int, dict[str, Any]]]) -> None:
+            nonlocal requests
+            try:
+                requests += 1
+                stored = await self._upsert_user_rows([row for _, row in chunk])
+            except Exception as exc:
+                if len(chunk) == 1 or is_transient(exc):
+                    for index, _ in chunk:
+                        results[index] = {"index": index, "status": "failed", "error": str(exc)}
+                    return
+                middle = len(chunk) // 2
+                await send(chunk[:middle])
+                await send(chunk[middle:])
+                return
+            ids = {record.get("email"): record.get("id") for record in stored}
+            for index, row in chunk:
+                results[index] = {"index": index, "status": "upserted", "id": ids.get(row["email"])}
+
+        async def run(chunk: list[tuple[int, dict[str, Any]]]) -> None:
+            async with semaphore:
+                await send(chunk)
+
+        await asyncio.gather(*(run(chunk) for chunk in chunks))
+        emails = [row["email"] for _, row in accepted]
+        if emails:
+            await self._invalidate(
+                *(f"user:email:{email}" for email in emails),
+                *(f"session:email:{email}" for email in emails),
+            )
+
+        elapsed = time.perf_counter() - started
+        counts = {status: 0 for status in ("upserted", "invalid", "duplicate", "failed")}
+        for result in results:
+            counts[result["status"]] += 1  # type: ignore[index]
+        if counts["failed"]:
+            logging.warning("Bulk user upsert: %s of %s rows failed.", counts["failed"], len(rows))
+        return {
+            "results": results,
+            "stats": {
+                "rows": len(rows),
+                "chunks": len(chunks),
+                "requests": requests,
+                **counts,
+                "elapsed_s": round(elapsed, 4),
+                "rows_per_s": round(counts["upserted"] / elapsed, 1) if elapsed > 0 else None,
+            },
+        }
@@ -0,0 +1,130 @@
+"""Process-wide Supabase admin client used by the provisioning API.
+
+The service-role client and its HTTP connection pool are created on first
+use and reused for the lifetime of the process, so provisioning requests do
+not pay client construction, TCP and TLS setup every time. A transport
+failure (or a failed health check) drops the pool and reconnects.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Optional
+
+import httpx
+from postgrest import APIResponse
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.services.supabase_client import build_http_client
+
+
+class SupabaseAdmin:
+    """Lazily created, shared service-role client with reconnect on failure."""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        key: Optional[str] = None,
+        http_client_factory: Callable[[], httpx.AsyncClient] = build_http_client,
+    ) -> None:
+        self._url = url
+        self._key = key
+        self._http_client_factory = http_client_factory
+        self._http: Optional[httpx.AsyncClient] = None
+        self._client: Optional[AsyncClient] = None
+        self._lock = asyncio.Lock()
+        self.connects = 0
+        self.reconnects = 0
+
+    @property
+    def url(self) -> Optional[str]:
+        return self._url or os.getenv("SUPABASE_URL")
+
+    @property
+    def key(self) -> Optional[str]:
+        return self._key or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.key)
+
+    async def client(self) -> AsyncClient:
+        """Return the shared client, creating it (and its pool) on first use."""
+
+        if self._client is not None:
+            return self._client
+        if not self.configured:
+            raise ConnectionError("Supabase URL or service role key not configured for provisioning.")
+        async with self._lock:
+            if self._client is None:
+                # Credentials are read once per connection, not per request.
+                self._url, self._key = self.url, self.key
+                self._http = self._http_client_factory()
+                self._client = AsyncClient(
+                    self._url,
+                    self._key,
+                    options=AsyncClientOptions(schema="reflex", httpx_client=self._http),
+                )
+                self.connects += 1
+        return self._client
+
+    async def reconnect(self) -> None:
+        """Drop the current pool so the next call opens fresh connections."""
+
+        async with self._lock:
+            http, self._http, self._client = self._http, None, None
+            self.reconnects += 1
+        if http is not None:
+            try:
+                await http.aclose()
+            except Exception as exc:  # pragma: no cover - best effort
+                logging.warning("Error closing Supabase admin pool: %s", exc)
+
+    async def rpc(self, function: str, params: dict[str, Any]) -> APIResponse:
+        """Call an RPC, reconnecting once if the pooled connection is broken."""
+
+        client = await self.client()
+        try:
+            return await client.rpc(function, params).execute()
+        except httpx.TransportError as exc:
+            logging.warning("Supabase admin connection failed (%s); reconnecting.", exc)
+            await self.reconnect()
+            client = await self.client()
+            return await client.rpc(function, params).execute()
+
+    async def health(self) -> dict[str, Any]:
+        """Ping PostgREST over the pool; reconnect when the ping fails."""
+
+        if not self.configured:
+            return {"ok": False, "error": "not configured"}
+        await self.client()
+        started = time.perf_counter()
+        try:
+            response = await self._http.head(  # type: ignore[union-attr]
+                f"{self._url}/rest/v1/",
+                headers={"apikey": self._key, "Authorization": f"Bearer {self._key}"},
+            )
+            ok, error = response.status_code < 500, None
+        except httpx.HTTPError as exc:
+            ok, error = False, str(exc)
+        if not ok:
+            await self.reconnect()
+        return {
+            "ok": ok,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+        }
+
+    async def aclose(self) -> None:
+        async with self._lock:
+            http, self._http, self._client = self._http, None, None
+        if http is not None:
+            await http.aclose()
+
+
+supabase_admin = SupabaseAdmin()
@@ -5,52 +5,142 @@ from __future__ import annotations
 import inspect
 import logging
 import os
-from typing import Any, Awaitable, Callable, List, Optional
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
 
 import httpx
 from postgrest import APIResponse
-from supabase import Client, ClientOptions, create_client
+from supabase import AsyncClient, AsyncClientOptions
 
+from app.services.postgres_backend import PostgresClient
+from app.services.resilience import call_with_resilience
+from app.services.storage import StorageClient
+from app.utils.env import env_float, env_int
 
-class SupabaseClient:
-    """A helper class to interact with the Supabase backend."""
 
-    def __init__(self) -> None:
-        self.url: Optional[str] = os.environ.get("SUPABASE_URL")
-        self.key: Optional[str] = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get(
-            "SUPABASE_KEY"
+def build_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP transport shared by every Supabase request."""
+
+    max_connections = env_int("SUPABASE_HTTP_MAX_CONNECTIONS", 50)
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=env_int("SUPABASE_HTTP_MAX_KEEPALIVE", max_connections),
+            keepalive_expiry=30.0,
+        ),
+        timeout=httpx.Timeout(env_float("SUPABASE_HTTP_TIMEOUT", 10.0)),
+        follow_redirects=True,
+    )
+
+
+USER_COLUMNS = (
+    "id,email,username,tax_number,first_name,last_name,birth_date,"
+    "country,postal_code,house_number,is_owner"
+)
+"""Projection used for user lookups; avoids shipping unused columns."""
+
+SESSION_COLUMNS = (
+    f"{USER_COLUMNS},"
+    "user_boteco(boteco_id,plan,assigned_role,boteco(id,username,public_name))"
+)
+"""User projection plus the latest boteco membership, embedded by PostgREST."""
+
+
+class SupabaseClient(StorageClient):
+    """A helper class to interact with the Supabase backend.
+
+    All requests go through a native ``AsyncClient`` so PostgREST round trips
+    never block the Reflex event loop, and they share a single pooled
+    ``httpx.AsyncClient`` so connections (and TLS sessions) are reused.
+
+    User and membership lookups are served through the read-through cache
+    from :class:`StorageClient` and invalidated by the writes that touch the
+    same keys. Every request passes through the circuit breaker; idempotent
+    ones are also retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        key: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        **policies: Any,
+    ) -> None:
+        super().__init__(**policies)
+        self.url: Optional[str] = url or os.environ.get("SUPABASE_URL")
+        self.key: Optional[str] = (
+            key or os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_KEY")
         )
-        self.client: Optional[Client] = self._initialize_client()
+        self.http_client: httpx.AsyncClient = http_client or build_http_client()
+        self.client: Optional[AsyncClient] = self._initialize_client()
 
-    def _initialize_client(self) -> Optional[Client]:
-        """Create a Supabase client if credentials are present."""
+    def _initialize_client(self) -> Optional[AsyncClient]:
+        """Create an async Supabase client if credentials are present."""
 
         if not self.url or not self.key:
             logging.warning("Supabase credentials not configured. Skipping client init.")
             return None
         try:
-            return create_client(self.url, self.key, options=ClientOptions(schema="reflex"))
+            return AsyncClient(
+                self.url,
+                self.key,
+                options=AsyncClientOptions(schema="reflex", httpx_client=self.http_client),
+            )
         except Exception as exc:  # pragma: no cover - defensive guard
             logging.exception("Error initializing Supabase client: %s", exc)
             return None
 
-    def _require_client(self) -> Client:
+    async def aclose(self) -> None:
+        """Close the shared HTTP connection pool."""
+
+        await self.http_client.aclose()
+
+    def _require_client(self) -> AsyncClient:
         if not self.client:
             raise ConnectionError(
                 "Supabase client not initialized. Check SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY."
             )
         return self.client
 
-    async def _execute(self, action: Callable[[Client], Awaitable[APIResponse] | APIResponse]) -> APIResponse:
-        """Execute an action against Supabase, supporting sync or async clients."""
+    async def _execute(
+        self,
+        action: Callable[[AsyncClient], Awaitable[APIResponse] | APIResponse],
+        *,
+        key: Optional[Hashable] = None,
+        idempotent: Optional[bool] = None,
+    ) -> APIResponse:
+        """Execute an action against Supabase, awaiting the request when needed.
+
+        Idempotent reads pass a ``key`` made of table, filter and projection;
+        concurrent calls with the same key share a single in-flight request.
+        Keyed calls are retried on transient errors unless ``idempotent`` is
+        ``False``; unkeyed writes opt in with ``idempotent=True``. Reads turn off
+        postgrest-py's own GET retry (``.retry(False)``) so retries are not
+        multiplied and the breaker sees every failed attempt.
+        """
 
         client = self._require_client()
-        try:
-            result = action(client)
-            response = await result if inspect.isawaitable(result) else result
-        except Exception as exc:
-            logging.exception("Supabase request failed: %s", exc)
-            raise
+        retry = self.retry if (key is not None if idempotent is None else idempotent) else None
+
+        async def call() -> APIResponse:
+            try:
+                return await call_with_resilience(
+                    lambda: self._send(client, action), retry=retry, breaker=self.breaker
+                )
+            except Exception as exc:
+                logging.exception("Supabase request failed: %s", exc)
+                raise
+
+        if key is not None:
+            return await self.inflight.do(key, call)
+        return await call()
+
+    @staticmethod
+    async def _send(
+        client: AsyncClient,
+        action: Callable[[AsyncClient], Awaitable[APIResponse] | APIResponse],
+    ) -> APIResponse:
+        result = action(client)
+        response = await result if inspect.isawaitable(result) else result
 
         error = getattr(response, "error", None)
         if error:
@@ -65,80 +155,236 @@ class SupabaseClient:
         response = await self._execute(
             lambda client: client.table("users").insert(user_data).execute()
         )
+        await self._invalidate_user(user_data.get("email"))
         return response.data or []
 
     async def upsert_user(self, user_data: dict[str, Any]) -> List[dict[str, Any]]:
         """Insert or update a user record based on email uniqueness."""
 
         response = await self._execute(
-            lambda client: client.table("users").upsert(user_data, on_conflict="email").execute()
+            lambda client: client.table("users")
+            .upsert(user_data, on_conflict="email")
+            .execute(),
+            idempotent=True,
+        )
+        await self._invalidate_user(user_data.get("email"))
+        return response.data or []
+
+    async def _upsert_user_rows(self, rows: List[dict[str, Any]]) -> List[dict[str, Any]]:
+        """Upsert a chunk of users in one PostgREST request.
+
+        ``default_to_null=False`` lets rows omit columns other rows set, so
+        the table defaults apply instead of explicit NULLs.
+        """
+
+        response = await self._execute(
+            lambda client: client.table("users")
+            .upsert(rows, on_conflict="email", default_to_null=False)
+            .execute(),
+            idempotent=True,
         )
         return response.data or []
 
     async def delete_boteco(self, boteco_id: str) -> APIResponse:
         """Delete a boteco record (used for rollbacks)."""
 
-        return await self._execute(
-            lambda client: client.table("boteco").delete().eq("id", boteco_id).execute()
+        response = await self._execute(
+            lambda client: client.table("boteco").delete().eq("id", boteco_id).execute(),
+            idempotent=True,
         )
+        await self._invalidate_memberships()
+        return response
 
     async def create_boteco_and_associate_user(
         self, boteco_data: dict[str, Any], user_boteco_data: dict[str, Any]
     ) -> tuple[APIResponse, APIResponse]:
-        """Create a boteco and associate the current user with basic rollback handling."""
+        """Create a boteco and associate the current user in one transactional RPC.
+
+        Both inserts run server-side in ``reflex.create_boteco_with_owner``
+        (see ``app/services/sql/migrations``), so a failure leaves no orphan
+        boteco and only a single PostgREST round trip is made.
+        """
 
-        boteco_response = await self._execute(
-            lambda client: client.table("boteco").insert(boteco_data).execute()
+        response = await self._execute(
+            lambda client: client.rpc(
+                "create_boteco_with_owner",
+                {"boteco_data": boteco_data, "user_boteco_data": user_boteco_data},
+            ).execute()
         )
-        if not boteco_response.data:
+        payload = response.data if isinstance(response.data, dict) else {}
+        boteco = payload.get("boteco")
+        if not boteco:
             raise ValueError("Failed to create boteco. Nenhum dado retornado.")
+        user_boteco = payload.get("user_boteco")
+        if not user_boteco:
+            raise ValueError("Falha ao associar o usuário ao boteco recém-criado.")
 
-        boteco_id = boteco_response.data[0]["id"]
-        try:
-            user_boteco_data["boteco_id"] = boteco_id
-            user_boteco_response = await self._execute(
-                lambda client: client.table("user_boteco").insert(user_boteco_data).execute()
-            )
-            if not user_boteco_response.data:
-                raise ValueError("Falha ao associar o usuário ao boteco recém-criado.")
-            return boteco_response, user_boteco_response
-        except Exception as exc:
-            logging.exception("Transaction failed, rolling back boteco creation: %s", exc)
-            await self.delete_boteco(boteco_id)
-            raise
-
-    async def provision_schema(self, boteco_username: str) -> httpx.Response:
-        """Call the internal API to provision a new schema for the boteco."""
-
-        api_url = "http://localhost:8000/api/provision_org"
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(api_url, json={"boteco_username": boteco_username})
-                response.raise_for_status()
-                return response
-        except httpx.HTTPError as exc:
-            logging.exception("Provisioning request failed: %s", exc)
-            raise
+        user_boteco_data["boteco_id"] = boteco["id"]
+        await self._invalidate(f"user_boteco:user:{user_boteco.get('user_id')}")
+        await self._invalidate_user(boteco.get("created_by_email"))
+        return APIResponse(data=[boteco]), APIResponse(data=[user_boteco])
 
     async def check_user_has_boteco(self, user_id: str) -> bool:
         """Check if a user is associated with any boteco."""
 
+        async def load() -> bool:
+            response = await self._execute(
+                lambda client: client.table("user_boteco")
+                .select("id", count="exact")
+                .eq("user_id", user_id)
+                .limit(1)
+                .retry(False)
+                .execute(),
+                key=("user_boteco", "user_id", user_id, "count:id"),
+            )
+            return bool(getattr(response, "count", 0) > 0)
+
+        return await self._cached(f"user_boteco:user:{user_id}", load)
+
+    async def get_user_by_email(self, email: str) -> List[dict[str, Any]]:
+        """Return user records that match the given email (list)."""
+
+        async def load() -> List[dict[str, Any]]:
+            response = await self._execute(
+                lambda client: client.table("users")
+                .select(USER_COLUMNS)
+                .eq("email", email)
+                .limit(1)
+                .retry(False)
+                .execute(),
+                key=("users", "email", email, USER_COLUMNS),
+            )
+            return response.data or []
+
+        return await self._cached(f"user:email:{email}", load)
+
+    async def bootstrap_session(self, email: str) -> Optional[dict[str, Any]]:
+        """Load the user, boteco membership and plan for a sign-in in one request.
+
+        Returns ``None`` when no user matches, otherwise a dict with ``user``
+        (projected columns), ``has_boteco``, ``plan`` and ``boteco`` (the most
+        recent membership's boteco, if any).
+        """
+
+        return await self._cached(f"session:email:{email}", lambda: self._load_session(email))
+
+    async def _load_session(self, email: str) -> Optional[dict[str, Any]]:
         response = await self._execute(
-            lambda client: client.table("user_boteco")
-            .select("id", count="exact")
-            .eq("user_id", user_id)
+            lambda client: client.table("users")
+            .select(SESSION_COLUMNS)
+            .eq("email", email)
+            .order("created_at", desc=True, foreign_table="user_boteco")
+            .limit(1, foreign_table="user_boteco")
             .limit(1)
-            .execute()
+            .retry(False)
+            .execute(),
+            key=("users", "email", email, SESSION_COLUMNS),
         )
-        return bool(getattr(response, "count", 0) > 0)
+        if not response.data:
+            return None
+        user = dict(response.data[0])
+        memberships = user.pop("user_boteco", None) or []
+        membership = memberships[0] if memberships else {}
+        return {
+            "user": user,
+            "has_boteco": bool(membership),
+            "plan": membership.get("plan"),
+            "boteco": membership.get("boteco"),
+        }
 
-    async def get_user_by_email(self, email: str) -> List[dict[str, Any]]:
-        """Return user records that match the given email (list)."""
+    async def get_dashboard_kpis(self, tenant_schema: str) -> Optional[dict[str, Any]]:
+        """Read today's KPIs of a tenant from its rollups (``reflex.dashboard_kpis``).
+
+        Returns ``None`` when the tenant schema has no rollups yet.
+        """
 
         response = await self._execute(
-            lambda client: client.table("users").select("*").eq("email", email).limit(1).execute()
+            lambda client: client.rpc("dashboard_kpis", {"tenant_schema": tenant_schema}, get=True)
+            .retry(False)
+            .execute(),
+            key=("dashboard_kpis", tenant_schema),
         )
-        return response.data or []
+        return response.data if isinstance(response.data, dict) else None
+
+    async def get_low_stock_items(
+        self, tenant_schema: str, company_id: Optional[str] = None
+    ) -> Optional[List[dict[str, Any]]]:
+        """List the active products at or below their ``min_stock``.
+
+        Served by the tenant's partial low-stock index, so the cost follows the
+        number of low items rather than the catalog size. Returns ``None`` when
+        the tenant schema predates the low-stock set.
+        """
+
+        response = await self._execute(
+            lambda client: client.rpc(
+                "low_stock_items", {"tenant_schema": tenant_schema, "company": company_id}, get=True
+            )
+            .retry(False)
+            .execute(),
+            key=("low_stock_items", tenant_schema, company_id),
+        )
+        return response.data if isinstance(response.data, list) else None
+
+    async def get_stock_alerts(
+        self, tenant_schema: str, after_id: int = 0, limit: int = 100
+    ) -> Optional[List[dict[str, Any]]]:
+        """Return up to ``limit`` threshold-crossing events with an id above ``after_id``."""
+
+        response = await self._execute(
+            lambda client: client.rpc(
+                "stock_alerts",
+                {"tenant_schema": tenant_schema, "after_id": after_id, "max_rows": limit},
+                get=True,
+            )
+            .retry(False)
+            .execute(),
+            key=("stock_alerts", tenant_schema, after_id, limit),
+        )
+        return response.data if isinstance(response.data, list) else None
+
+    async def close_order(
+        self,
+        tenant_schema: str,
+        order_id: str,
+        payment_method: str,
+        cashier_id: Optional[str] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Close an order, record its sale and deduct stock in one statement.
+
+        Runs ``reflex.close_order`` server-side: items, recipes and stock
+        movements are handled as sets, so the cost does not grow with round
+        trips per item. Returns ``None`` when the order is missing or no
+        longer open.
+        """
+
+        response = await self._execute(
+            lambda client: client.rpc(
+                "close_order",
+                {
+                    "tenant_schema": tenant_schema,
+                    "order_id": order_id,
+                    "payment_method": payment_method,
+                    "cashier_id": cashier_id,
+                },
+            ).execute()
+        )
+        return response.data if isinstance(response.data, dict) else None
+
+
+def create_storage_client() -> StorageClient:
+    """Build the storage backend selected by ``STORAGE_BACKEND``.
+
+    ``postgrest`` (default) talks to Supabase over HTTP; ``postgres`` uses a
+    direct psycopg connection pool on ``DATABASE_URL``.
+    """
+
+    backend = os.getenv("STORAGE_BACKEND", "postgrest").strip().lower()
+    if backend == "postgres":
+        return PostgresClient()
+    if backend != "postgrest":
+        logging.warning("Unknown STORAGE_BACKEND %r; falling back to postgrest.", backend)
+    return SupabaseClient()
 
 
-supabase_client = SupabaseClient()
+supabase_client = create_storage_client()
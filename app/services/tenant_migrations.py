@@ -0,0 +1,374 @@
+"""Apply tenant template changes to every existing ``org_*`` schema.
+
+New tenants are built from all files in ``app/services/sql/tenant``; this
+runner brings existing tenants up to date with the files they are missing::
+
+    python -m app.services.tenant_migrations                 # all tenants
+    python -m app.services.tenant_migrations --dry-run       # list pending work
+    python -m app.services.tenant_migrations --concurrency 8 --max-failures 5 --report report.json
+
+Tenant schemas (and unclaimed warm-pool schemas) are discovered from the
+catalog and migrated in parallel over the psycopg pool. Each tenant is
+migrated in one transaction that:
+
+* takes a per-tenant advisory lock, so concurrent runners never touch the
+  same schema;
+* reads the tenant's ``tenant_migrations`` ledger and applies, in order, the
+  template files it has not recorded, under ``TENANT_MIGRATION_LOCK_TIMEOUT``;
+* records the applied versions (and, for pooled schemas, the new template
+  version) before committing.
+
+Files whose first line is ``-- migrate: no-transaction`` (for ``CREATE
+INDEX CONCURRENTLY``) break that transaction: the files before them commit
+first, then the file runs statement by statement on a dedicated connection
+holding the same advisory lock, and is recorded once it has finished. Such
+files must be safe to re-run; an invalid index one of them builds (left by an
+interrupted run) is dropped and rebuilt, and one still invalid afterwards
+fails the tenant instead of being recorded. Before anything is applied, a tenant's pending
+files go through the lock-impact analyzer, like the ``reflex`` migrations;
+a file it reports errors for fails the tenant (``--skip-lock-check`` to
+override).
+
+A failed tenant rolls back on its own and the run continues until more than
+``--max-failures`` tenants have failed; then no new tenants are started.
+Because the ledger is the source of truth, re-running resumes where the last
+run stopped. Schemas without a ledger (built before the template existed) are
+reported as ``unmanaged`` and left alone.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from psycopg import AsyncConnection, sql
+from psycopg.rows import dict_row
+
+from app.services.lock_analyzer import index_tables_from
+from app.services.migrations import (
+    INVALID_INDEXES,
+    MigrationError,
+    check_locks,
+    concurrent_indexes,
+    uses_transaction,
+)
+from app.services.postgres_backend import PostgresClient
+from app.services.tenant_pool import POOL_PREFIX
+from app.services.tenant_template import TemplateFile, load_template_files
+from app.utils.env import env_int
+
+logger = logging.getLogger(__name__)
+
+MIGRATED = "migrated"
+CURRENT = "current"
+PENDING = "pending"
+UNMANAGED = "unmanaged"
+BUSY = "busy"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+async def discover_tenant_schemas(client: PostgresClient, *, include_pool: bool = True) -> list[str]:
+    """Return every ``org_*`` schema (and pooled schema) in name order."""
+
+    async def work(conn: AsyncConnection) -> list[str]:
+        cursor = await conn.execute(
+            r"""
+            SELECT nspname FROM pg_namespace
+            WHERE nspname LIKE 'org\_%%' OR (%s AND nspname LIKE %s)
+            ORDER BY nspname
+            """,
+            [include_pool, POOL_PREFIX.replace("_", r"\_") + "%"],
+        )
+        return [row["nspname"] for row in await cursor.fetchall()]
+
+    return await client._run(work)
+
+
+# Files applied in one transaction, their timings, and the no-transaction file that stopped it.
+_Step = tuple[list[TemplateFile], dict[int, float], Optional[TemplateFile]]
+
+
+async def _record_applied(conn: AsyncConnection, schema: str, files: Sequence[TemplateFile]) -> None:
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            sql.SQL("INSERT INTO {}.tenant_migrations (version, name, checksum) VALUES (%s, %s, %s)").format(
+                sql.Identifier(schema)
+            ),
+            [(file.version, file.name, file.checksum) for file in files],
+        )
+    if schema.startswith(POOL_PREFIX):
+        await conn.execute(
+            "UPDATE reflex.tenant_schema_pool SET template_version = %s WHERE schema_name = %s",
+            [files[-1].version, schema],
+        )
+
+
+async def _invalid_indexes(conn: AsyncConnection, names: list[str]) -> list[str]:
+    if not names:
+        return []
+    cursor = await conn.execute(INVALID_INDEXES, [names])
+    return [row["name"] for row in await cursor.fetchall()]
+
+
+async def _apply_outside_transaction(
+    client: PostgresClient, schema: str, file: TemplateFile, *, lock_timeout_ms: int
+) -> Optional[float]:
+    """Run a no-transaction file on its own connection; ``None`` if another runner holds the tenant."""
+
+    async with await AsyncConnection.connect(client.dsn, autocommit=True, row_factory=dict_row) as conn:
+        cursor = await conn.execute(
+            "SELECT pg_try_advisory_lock(hashtext('tenant_migrations'), hashtext(%s)) AS locked", [schema]
+        )
+        if not (await cursor.fetchone())["locked"]:
+            return None
+        try:
+            # Session settings end with this connection.
+            await conn.execute(sql.SQL("SET search_path TO {}, public").format(sql.Identifier(schema)))
+            await conn.execute(sql.SQL("SET lock_timeout = {}").format(sql.Literal(f"{lock_timeout_ms}ms")))
+            cursor = await conn.execute("SELECT 1 FROM tenant_migrations WHERE version = %s", [file.version])
+            if await cursor.fetchone() is not None:
+                return 0.0
+            indexes = concurrent_indexes(file)
+            started = time.perf_counter()
+            # An interrupted build leaves an invalid index that IF NOT EXISTS would skip.
+            for name in await _invalid_indexes(conn, indexes):
+                logger.warning("Dropping invalid index %s.%s left by an interrupted build", schema, name)
+                await conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.SQL(name)))
+            for statement in file.statements:
+                await conn.execute(statement, prepare=False)
+            if invalid := await _invalid_indexes(conn, indexes):
+                raise MigrationError(
+                    f"{file.version:04d}_{file.name} left invalid indexes: {', '.join(invalid)}"
+                )
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            async with conn.transaction():
+                await _record_applied(conn, schema, [file])
+            return elapsed
+        finally:
+            # Closing the connection releases the lock only once the server notices.
+            if not conn.broken:
+                await conn.execute(
+                    "SELECT pg_advisory_unlock(hashtext('tenant_migrations'), hashtext(%s))", [schema]
+                )
+
+
+async def migrate_tenant(
+    client: PostgresClient,
+    schema: str,
+    files: Sequence[TemplateFile],
+    *,
+    lock_timeout_ms: int,
+    dry_run: bool = False,
+    lock_check: bool = True,
+) -> dict[str, Any]:
+    """Bring one tenant schema up to date and describe what happened."""
+
+    started = time.perf_counter()
+    record: dict[str, Any] = {"schema": schema, "applied": [], "timings_ms": {}}
+    index_tables: dict[str, str] = {}
+    for file in files:
+        index_tables.update(index_tables_from(file.text))
+
+    async def work(conn: AsyncConnection) -> Optional[_Step]:
+        """Apply the pending files up to the next no-transaction one, which is returned."""
+
+        await conn.execute(
+            sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(f"{lock_timeout_ms}ms"))
+        )
+        cursor = await conn.execute(
+            "SELECT pg_try_advisory_xact_lock(hashtext('tenant_migrations'), hashtext(%s)) AS locked,"
+            " to_regclass(format('%%I.tenant_migrations', %s::text)) IS NOT NULL AS managed",
+            [schema, schema],
+        )
+        row = await cursor.fetchone()
+        if not row["locked"]:
+            record["status"] = BUSY
+            return None
+        if not row["managed"]:
+            record["status"] = UNMANAGED
+            return None
+        cursor = await conn.execute(
+            sql.SQL("SELECT version, checksum FROM {}.tenant_migrations").format(
+                sql.Identifier(schema)
+            )
+        )
+        ledger = {row["version"]: row["checksum"] for row in await cursor.fetchall()}
+        changed = [f.version for f in files if f.version in ledger and ledger[f.version] != f.checksum]
+        if changed:
+            # Applied files must not be edited; add a new file instead.
+            record["checksum_mismatch"] = changed
+        pending = [file for file in files if file.version not in ledger]
+        record.setdefault("pending", [file.version for file in pending])
+        if not pending:
+            record["status"] = MIGRATED if record["applied"] else CURRENT
+            return None
+        if lock_check:
+            check_locks(pending, index_tables)
+        if dry_run:
+            record["status"] = PENDING
+            return None
+        batch = []
+        for file in pending:
+            if not uses_transaction(file):
+                break
+            batch.append(file)
+        timings = {}
+        if batch:
+            await conn.execute(
+                sql.SQL("SET LOCAL search_path TO {}, public").format(sql.Identifier(schema))
+            )
+            for file in batch:
+                file_started = time.perf_counter()
+                await conn.execute(";\n".join(file.statements) + ";", prepare=False)
+                timings[file.version] = round((time.perf_counter() - file_started) * 1000, 2)
+            await _record_applied(conn, schema, batch)
+        return batch, timings, pending[len(batch)] if len(batch) < len(pending) else None
+
+    try:
+        while (step := await client._run(work)) is not None:
+            batch, timings, outside = step
+            record["applied"].extend(file.version for file in batch)
+            record["timings_ms"].update(timings)
+            if outside is None:
+                record["status"] = MIGRATED
+                break
+            elapsed = await _apply_outside_transaction(
+                client, schema, outside, lock_timeout_ms=lock_timeout_ms
+            )
+            if elapsed is None:
+                record["status"] = BUSY
+                break
+            record["applied"].append(outside.version)
+            record["timings_ms"][outside.version] = elapsed
+    except Exception as exc:
+        logger.warning("Migration of %s failed: %s", schema, exc)
+        # Files committed before the failure stay applied.
+        record.update(status=FAILED, error=str(exc))
+    record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+async def migrate_tenants(
+    client: PostgresClient,
+    schemas: Sequence[str],
+    files: Sequence[TemplateFile],
+    *,
+    concurrency: int = 4,
+    max_failures: int = 0,
+    lock_timeout_ms: Optional[int] = None,
+    dry_run: bool = False,
+    lock_check: bool = True,
+) -> dict[str, Any]:
+    """Fan ``files`` out to ``schemas``; stop starting tenants past the failure budget."""
+
+    lock_timeout_ms = lock_timeout_ms or env_int("TENANT_MIGRATION_LOCK_TIMEOUT", 5000)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    records: list[dict[str, Any]] = []
+    failures = 0
+    started = time.perf_counter()
+
+    async def run(schema: str) -> None:
+        nonlocal failures
+        async with semaphore:
+            if failures > max_failures:
+                records.append({"schema": schema, "status": SKIPPED, "ms": 0.0})
+                return
+            record = await migrate_tenant(
+                client,
+                schema,
+                files,
+                lock_timeout_ms=lock_timeout_ms,
+                dry_run=dry_run,
+                lock_check=lock_check,
+            )
+        if record["status"] == FAILED:
+            failures += 1
+        records.append(record)
+
+    await asyncio.gather(*(run(schema) for schema in schemas))
+    return build_report(records, elapsed=time.perf_counter() - started, budget_exceeded=failures > max_failures)
+
+
+def build_report(records: list[dict[str, Any]], *, elapsed: float, budget_exceeded: bool) -> dict[str, Any]:
+    records = sorted(records, key=lambda record: record["schema"])
+    counts: dict[str, int] = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    migrated = sorted(record["ms"] for record in records if record["status"] == MIGRATED)
+    return {
+        "tenants": len(records),
+        "counts": counts,
+        "budget_exceeded": budget_exceeded,
+        "elapsed_s": round(elapsed, 3),
+        "tenants_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else None,
+        "migrate_p50_ms": round(statistics.median(migrated), 2) if migrated else None,
+        "migrate_p99_ms": (
+            round(statistics.quantiles(migrated, n=100, method="inclusive")[98], 2)
+            if len(migrated) > 1
+            else (migrated[0] if migrated else None)
+        ),
+        "slowest": [
+            {"schema": record["schema"], "ms": record["ms"]}
+            for record in sorted(records, key=lambda record: record["ms"], reverse=True)[:10]
+            if record["status"] == MIGRATED
+        ],
+        "tenants_detail": records,
+    }
+
+
+async def _main(args: argparse.Namespace) -> int:
+    client = PostgresClient(args.dsn, schema="reflex", cache=False)
+    try:
+        schemas = args.schema or await discover_tenant_schemas(client, include_pool=not args.skip_pool)
+        files = load_template_files()
+        logger.info("Migrating %s tenant schemas to template version %s", len(schemas), files[-1].version)
+        report = await migrate_tenants(
+            client,
+            schemas,
+            files,
+            concurrency=args.concurrency,
+            max_failures=args.max_failures,
+            dry_run=args.dry_run,
+            lock_check=not args.skip_lock_check,
+        )
+    finally:
+        await client.aclose()
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    summary = {key: value for key, value in report.items() if key != "tenants_detail"}
+    summary["failed"] = [
+        {"schema": record["schema"], "error": record.get("error")}
+        for record in report["tenants_detail"]
+        if record["status"] == FAILED
+    ]
+    print(json.dumps(summary, indent=2))
+    return 1 if report["counts"].get(FAILED) or report["budget_exceeded"] else 0
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", help="Postgres DSN (default: DATABASE_URL)")
+    parser.add_argument("--schema", action="append", help="only migrate this schema (repeatable)")
+    parser.add_argument("--skip-pool", action="store_true", help="leave warm-pool schemas alone")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-failures", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--skip-lock-check", action="store_true", help="apply files the lock analyzer rejects"
+    )
+    parser.add_argument("--report", help="write the full per-tenant report to this JSON file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Warm pool of pre-built tenant schemas.
+
+Building a tenant schema is the slowest step of onboarding, so a background
+task keeps ``TENANT_POOL_SIZE`` unassigned schemas ready. Provisioning claims
+one through ``reflex.claim_tenant_schema`` (see
+``app/services/sql/migrations/0002_tenant_schema_pool.sql``), which renames it
+to ``org_<username>`` in a single short transaction, and falls back to
+building the schema from scratch when the pool is empty or disabled. Claims
+only take schemas of the current ``TEMPLATE_VERSION``, so each refill first
+drops pooled schemas built from an older template
+(``reflex.prune_tenant_pool``, migration ``0006_prune_tenant_pool.sql``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import statistics
+import uuid
+from collections import deque
+from typing import Any, Optional
+
+from app.services.sql_executor import sql_executor
+from app.services.tenant_template import TEMPLATE_VERSION, tenant_script
+from app.utils.env import env_float, env_int
+
+POOL_PREFIX = "tenant_pool_"
+
+
+class TenantSchemaPool:
+    """Claims pooled tenant schemas and refills the pool below a low-water mark."""
+
+    def __init__(
+        self,
+        executor: Any = None,
+        size: Optional[int] = None,
+        low_water: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> None:
+        self._executor = executor
+        self.size = env_int("TENANT_POOL_SIZE", 0) if size is None else size
+        self.low_water = (
+            env_int("TENANT_POOL_LOW_WATER", max(1, self.size // 2))
+            if low_water is None
+            else low_water
+        )
+        self.concurrency = max(1, concurrency or env_int("TENANT_POOL_REFILL_CONCURRENCY", 2))
+        self.interval = env_float("TENANT_POOL_REFILL_INTERVAL", 30.0)
+        self.latencies: dict[str, deque[float]] = {
+            "pool": deque(maxlen=512),
+            "create": deque(maxlen=512),
+        }
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    @property
+    def executor(self) -> Any:
+        return self._executor or sql_executor()
+
+    async def claim(self, schema: str, executor: Any = None) -> bool:
+        """Rename a pooled schema to ``schema``; ``False`` means build it instead."""
+
+        if not self.enabled:
+            return False
+        try:
+            claimed = await (executor or self.executor).call(
+                "claim_tenant_schema", target_schema=schema, template_version=TEMPLATE_VERSION
+            )
+        except Exception as exc:
+            logging.warning("Tenant pool claim failed, building %s instead: %s", schema, exc)
+            return False
+        finally:
+            self.request_refill()
+        return claimed == schema
+
+    async def refill(self, executor: Any = None) -> int:
+        """Drop outdated pooled schemas, then top up to ``size`` below ``low_water``."""
+
+        if not self.enabled:
+            return 0
+        executor = executor or self.executor
+        pruned = await executor.call("prune_tenant_pool", template_version=TEMPLATE_VERSION)
+        if pruned:
+            logging.info("Tenant pool dropped %s schemas from older templates.", pruned)
+        available = await executor.call("tenant_pool_available", template_version=TEMPLATE_VERSION)
+        if available is None or available >= self.low_water:
+            return 0
+        missing = self.size - available
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def build() -> None:
+            async with semaphore:
+                schema = f"{POOL_PREFIX}{uuid.uuid4().hex[:16]}"
+                await executor.execute(tenant_script(schema, pooled=True))
+
+        await asyncio.gather(*(build() for _ in range(missing)))
+        logging.info("Tenant pool refilled with %s schemas (had %s).", missing, available)
+        return missing
+
+    def request_refill(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def record(self, source: str, elapsed_ms: float) -> None:
+        self.latencies[source].append(elapsed_ms)
+
+    def stats(self) -> dict[str, Any]:
+        """Return pool settings and claim vs create latency percentiles (ms)."""
+
+        summary: dict[str, Any] = {
+            "enabled": self.enabled,
+            "size": self.size,
+            "low_water": self.low_water,
+        }
+        for source, samples in self.latencies.items():
+            values = sorted(samples)
+            summary[source] = {
+                "count": len(values),
+                "p50_ms": round(statistics.median(values), 2) if values else None,
+                "p99_ms": (
+                    round(statistics.quantiles(values, n=100, method="inclusive")[98], 2)
+                    if len(values) > 1
+                    else (round(values[0], 2) if values else None)
+                ),
+            }
+        return summary
+
+    async def maintain(self) -> None:
+        """Refill on claims and every ``interval`` seconds (a lifespan task)."""
+
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.refill()
+            except Exception as exc:
+                logging.warning("Tenant pool refill failed: %s", exc)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+tenant_pool = TenantSchemaPool()
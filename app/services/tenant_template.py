@@ -0,0 +1,148 @@
+"""Versioned template that builds a tenant schema in one transaction.
+
+The template is the ordered set of files in ``app/services/sql/tenant``
+(``NNNN_name.sql``); ``TEMPLATE_VERSION`` is the highest file number. A build
+runs every statement in a single script, grouped into phases so that types
+and tables come first, then constraints, functions and other objects, and
+indexes last, when the tables are still empty. An index a later file drops
+is never built for new tenants; only existing tenants run the drop. Index
+statements written ``CONCURRENTLY`` for existing tenants (in
+``-- migrate: no-transaction`` files) run as plain statements in the build,
+since nothing else can see the new schema yet.
+
+The schema records what built it: ``tenant_migrations`` lists the applied
+template files with their checksums, and ``tenant_build_log`` stores a
+``clock_timestamp()`` marker after each phase so per-phase timings can be
+read back with :func:`phase_timings`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+from pathlib import Path
+from typing import Iterable
+
+from app.utils.sql import SqlFile, load_sql_files, strip_comments
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "sql" / "tenant"
+PHASES = ("types", "tables", "objects", "indexes")
+
+TemplateFile = SqlFile
+
+_CREATED_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX (?:CONCURRENTLY )?(?:IF NOT EXISTS )?(\w+) ON ")
+_DROPPED_INDEX = re.compile(r"DROP INDEX (?:CONCURRENTLY )?(?:IF EXISTS )?(\w+)$")
+_CONCURRENTLY = re.compile(r"\bINDEX\s+CONCURRENTLY\b", re.IGNORECASE)
+
+
+def statement_phase(statement: str) -> str:
+    """Return the build phase a template statement belongs to."""
+
+    text = " ".join(strip_comments(statement).split()).upper()
+    if text.startswith("CREATE TYPE"):
+        return "types"
+    if re.match(r"CREATE (UNLOGGED )?TABLE", text):
+        return "tables"
+    if re.match(r"(CREATE (UNIQUE )?INDEX|DROP INDEX|ALTER INDEX|REINDEX)", text):
+        return "indexes"
+    return "objects"
+
+
+def load_template_files(directory: Path = TEMPLATE_DIR) -> list[TemplateFile]:
+    return load_sql_files(directory)
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class TenantTemplate:
+    """The tenant object set, rendered as one phased DDL script."""
+
+    def __init__(self, directory: Path = TEMPLATE_DIR) -> None:
+        self.files = load_template_files(directory)
+
+    @property
+    def version(self) -> int:
+        return max((file.version for file in self.files), default=0)
+
+    def phases(self) -> dict[str, list[str]]:
+        """Group every statement by phase, keeping file order within a phase."""
+
+        grouped: dict[str, list[str]] = {phase: [] for phase in PHASES}
+        created: dict[str, str] = {}
+        for file in self.files:
+            for statement in file.statements:
+                text = " ".join(strip_comments(statement).split()).upper()
+                dropped = _DROPPED_INDEX.match(text)
+                if dropped and dropped.group(1) in created:
+                    grouped["indexes"].remove(created.pop(dropped.group(1)))
+                    continue
+                phase = statement_phase(statement)
+                if phase == "indexes":
+                    # CONCURRENTLY cannot run inside the build's transaction.
+                    statement = _CONCURRENTLY.sub("INDEX", statement, count=1)
+                if match := _CREATED_INDEX.match(text):
+                    created[match.group(1)] = statement
+                grouped[phase].append(statement)
+        return grouped
+
+    def script(self, schema: str, *, pooled: bool = False) -> str:
+        """Return the script that builds ``schema``; run it as one transaction.
+
+        ``schema`` must already be validated (``[a-zA-Z0-9_]+``). ``pooled``
+        also registers the schema in ``reflex.tenant_schema_pool`` so it
+        becomes claimable in the same transaction that built it.
+        """
+
+        lines = [
+            f'CREATE SCHEMA "{schema}";',
+            f'SET LOCAL search_path TO "{schema}", public;',
+            "CREATE TABLE tenant_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "checksum TEXT NOT NULL, applied_at TIMESTAMPTZ NOT NULL DEFAULT now());",
+            "CREATE TABLE tenant_build_log (phase TEXT PRIMARY KEY, "
+            "finished_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp());",
+            "INSERT INTO tenant_build_log (phase) VALUES ('start');",
+        ]
+        for phase, statements in self.phases().items():
+            lines.extend(f"{statement};" for statement in statements)
+            lines.append(f"INSERT INTO tenant_build_log (phase) VALUES ('{phase}');")
+        if self.files:
+            lines.append(
+                "INSERT INTO tenant_migrations (version, name, checksum) VALUES "
+                + ", ".join(
+                    f"({file.version}, {_literal(file.name)}, {_literal(file.checksum)})"
+                    for file in self.files
+                )
+                + ";"
+            )
+        if pooled:
+            lines.append(
+                "INSERT INTO reflex.tenant_schema_pool (schema_name, template_version) "
+                f"VALUES ({_literal(schema)}, {self.version});"
+            )
+        return "\n".join(lines)
+
+
+def phase_timings(rows: Iterable[tuple[str, datetime.datetime]]) -> dict[str, float]:
+    """Turn ``tenant_build_log`` rows into milliseconds spent in each phase."""
+
+    markers = dict(rows)
+    timings: dict[str, float] = {}
+    previous = markers.get("start")
+    for phase in PHASES:
+        finished = markers.get(phase)
+        if previous is not None and finished is not None:
+            timings[phase] = round((finished - previous).total_seconds() * 1000, 3)
+        previous = finished or previous
+    return timings
+
+
+tenant_template = TenantTemplate()
+TEMPLATE_VERSION = tenant_template.version
+
+
+def tenant_script(schema: str, *, pooled: bool = False) -> str:
+    """Return the build script for ``schema`` from the current template."""
+
+    return tenant_template.script(schema, pooled=pooled)
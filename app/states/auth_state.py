@@ -15,19 +15,33 @@ class AuthState(rx.State):
     """Custom auth state to register/sign-in users into the onboarding flow."""
 
     @staticmethod
-    def _prefill_onboarding(user: Dict[str, Any]) -> None:
-        """Populate onboarding fields from a user payload."""
-
-        OnboardingState.user_id = user.get("id")
-        OnboardingState.personal_first_name = user.get("first_name", "")
-        OnboardingState.personal_last_name = user.get("last_name", "")
-        OnboardingState.personal_email = user.get("email", "")
-        OnboardingState.personal_tax_number = user.get("tax_number", "")
-        OnboardingState.personal_birth_date = user.get("birth_date", "")
-        OnboardingState.personal_country = user.get("country", "Brasil")
-        OnboardingState.personal_postal_code = user.get("postal_code", "")
-        OnboardingState.personal_house_number = user.get("house_number", "")
-        OnboardingState.current_step = 1
+    def _prefill_onboarding(onboarding: OnboardingState, user: Dict[str, Any]) -> None:
+        """Populate the session's onboarding fields from a user payload."""
+
+        onboarding.user_id = user.get("id")
+        onboarding.personal_first_name = user.get("first_name", "")
+        onboarding.personal_last_name = user.get("last_name", "")
+        onboarding.personal_email = user.get("email", "")
+        onboarding.personal_tax_number = user.get("tax_number", "")
+        onboarding.personal_birth_date = user.get("birth_date", "")
+        onboarding.personal_country = user.get("country", "Brasil")
+        onboarding.personal_postal_code = user.get("postal_code", "")
+        onboarding.personal_house_number = user.get("house_number", "")
+        onboarding.current_step = 1
+
+    @classmethod
+    def _apply_session(cls, onboarding: OnboardingState, session: Dict[str, Any]) -> str:
+        """Prefill onboarding from a bootstrap payload and pick the landing route."""
+
+        cls._prefill_onboarding(onboarding, session["user"])
+        onboarding.has_boteco = session["has_boteco"]
+        if not session["has_boteco"]:
+            return "/onboarding/step-1-personal"
+        onboarding.selected_plan = session.get("plan") or ""
+        boteco = session.get("boteco") or {}
+        onboarding.business_username = boteco.get("username", "")
+        onboarding.business_public_name = boteco.get("public_name", "")
+        return "/app"
 
     @staticmethod
     def _build_user_payload(form_data: Dict[str, Any]) -> Tuple[Dict[str, Any], str | None]:
@@ -70,7 +84,7 @@ class AuthState(rx.State):
 
     @classmethod
     async def _perform_register(
-        cls, form_data: Dict[str, Any], client=supabase_client
+        cls, form_data: Dict[str, Any], onboarding: OnboardingState, client=supabase_client
     ) -> Tuple[str | None, str | None]:
         """Shared registration logic to ease testing."""
 
@@ -81,7 +95,7 @@ class AuthState(rx.State):
             created = await client.create_user(user_data)
             if not created:
                 return None, "Não foi possível criar a conta. Tente novamente."
-            cls._prefill_onboarding(created[0])
+            cls._prefill_onboarding(onboarding, created[0])
             return "/onboarding/step-1-personal", None
         except Exception as exc:  # pragma: no cover - guarded by tests on helpers
             logging.exception("Failed to register user: %s", exc)
@@ -89,7 +103,8 @@ class AuthState(rx.State):
 
     @rx.event
     async def register(self, form_data: dict):
-        redirect_to, error = await self._perform_register(form_data)
+        onboarding = await self.get_state(OnboardingState)
+        redirect_to, error = await self._perform_register(form_data, onboarding)
         if error:
             yield rx.toast.error(error)
             return
@@ -97,7 +112,7 @@ class AuthState(rx.State):
 
     @classmethod
     async def _perform_signin(
-        cls, form_data: Dict[str, Any], client=supabase_client
+        cls, form_data: Dict[str, Any], onboarding: OnboardingState, client=supabase_client
     ) -> Tuple[str | None, str | None]:
         """Shared sign-in logic used by the event handler and tests."""
 
@@ -105,19 +120,47 @@ class AuthState(rx.State):
         if not email:
             return None, "Forneça um email para entrar."
         try:
-            users = await client.get_user_by_email(email)
-            if not users:
+            session = await client.bootstrap_session(email)
+            if not session:
                 return None, "Usuário não encontrado. Por favor registre-se."
-            cls._prefill_onboarding(users[0])
-            return "/onboarding/step-1-personal", None
+            return cls._apply_session(onboarding, session), None
         except Exception as exc:  # pragma: no cover - guarded by tests on helpers
             logging.exception("Sign-in failed: %s", exc)
             return None, "Erro no login. Tente novamente."
 
     @rx.event
     async def signin(self, form_data: dict):
-        redirect_to, error = await self._perform_signin(form_data)
+        onboarding = await self.get_state(OnboardingState)
+        redirect_to, error = await self._perform_signin(form_data, onboarding)
         if error:
             yield rx.toast.error(error)
             return
         yield rx.redirect(redirect_to)
+
+    @classmethod
+    async def _perform_dashboard_check(
+        cls, onboarding: OnboardingState, client=supabase_client
+    ) -> str | None:
+        """Decide whether `/app` must redirect, querying Supabase at most once."""
+
+        if onboarding.has_boteco:
+            return None
+        email = onboarding.personal_email
+        if not email:
+            return "/signin"
+        try:
+            session = await client.bootstrap_session(email)
+        except Exception as exc:  # pragma: no cover - depends on external services
+            logging.exception("Dashboard session bootstrap failed: %s", exc)
+            return None
+        if not session:
+            return "/signup"
+        redirect_to = cls._apply_session(onboarding, session)
+        return None if redirect_to == "/app" else redirect_to
+
+    @rx.event
+    async def check_dashboard_access(self):
+        onboarding = await self.get_state(OnboardingState)
+        redirect_to = await self._perform_dashboard_check(onboarding)
+        if redirect_to:
+            return rx.redirect(redirect_to)
@@ -0,0 +1,84 @@
+"""KPIs shown on the `/app` dashboard."""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional
+
+import reflex as rx
+
+from app.services.cache import ReadThroughCache, TTLCache
+from app.services.provisioning import tenant_schema
+from app.services.redis_client import get_redis
+from app.services.supabase_client import supabase_client
+from app.states.onboarding_state import OnboardingState
+from app.utils.env import env_float, env_int
+
+EMPTY_KPIS: dict[str, Any] = {
+    "sales_today": 0,
+    "sales_count_today": 0,
+    "active_tables": 0,
+    "low_stock_items": 0,
+}
+
+
+def build_kpi_cache() -> Optional[ReadThroughCache]:
+    """Short-lived cache for dashboard KPIs (``DASHBOARD_KPI_TTL`` seconds, 0 disables)."""
+
+    ttl = env_float("DASHBOARD_KPI_TTL", 10.0)
+    if ttl <= 0:
+        return None
+    return ReadThroughCache(
+        TTLCache(maxsize=env_int("DASHBOARD_KPI_CACHE_MAXSIZE", 1024), ttl=ttl),
+        redis=get_redis(),
+        namespace="dashboard",
+    )
+
+
+kpi_cache = build_kpi_cache()
+
+
+def format_brl(value: Any) -> str:
+    """Format ``value`` as Brazilian reais, e.g. ``R$ 1.234,50``."""
+
+    text = f"{float(value or 0):,.2f}"
+    return "R$ " + text.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+class DashboardState(rx.State):
+    """Today's sales, occupied tables and low-stock products of the boteco."""
+
+    sales_today: str = "R$ 0,00"
+    sales_count_today: int = 0
+    active_tables: int = 0
+    low_stock_label: str = "0 itens"
+
+    @classmethod
+    async def _load_kpis(
+        cls, boteco_username: str, client=supabase_client, cache=kpi_cache
+    ) -> dict[str, Any]:
+        """Read the tenant's rollups through the KPI cache; shared with tests."""
+
+        schema = tenant_schema(boteco_username)
+
+        async def load() -> dict[str, Any]:
+            return await client.get_dashboard_kpis(schema) or {}
+
+        kpis = await cache.get_or_load(f"kpis:{schema}", load) if cache is not None else await load()
+        return {**EMPTY_KPIS, **kpis}
+
+    @rx.event
+    async def load_kpis(self):
+        username = (await self.get_state(OnboardingState)).business_username
+        if not username:
+            return
+        try:
+            kpis = await self._load_kpis(username)
+        except Exception as exc:  # pragma: no cover - depends on external services
+            logging.exception("Failed to load dashboard KPIs: %s", exc)
+            return
+        self.sales_today = format_brl(kpis["sales_today"])
+        self.sales_count_today = int(kpis["sales_count_today"])
+        self.active_tables = int(kpis["active_tables"])
+        low_stock = int(kpis["low_stock_items"])
+        self.low_stock_label = f"{low_stock} {'item' if low_stock == 1 else 'itens'}"
@@ -1,7 +1,10 @@
+import asyncio
 import logging
 
 import reflex as rx
 
+from app.services.idempotency import fingerprint, idempotency
+from app.services.provisioning_jobs import FAILED, SUCCEEDED, provisioning_jobs
 from app.services.supabase_client import supabase_client
 from app.utils.validators import (
     validate_cpf_cnpj,
@@ -25,6 +28,7 @@ class OnboardingState(rx.State):
     personal_postal_code: str = ""
     personal_house_number: str = ""
     user_id: str | None = None
+    has_boteco: bool = False
 
     business_public_name: str = ""
     business_username: str = ""
@@ -36,6 +40,10 @@ class OnboardingState(rx.State):
 
     selected_plan: str = ""
 
+    provision_job_id: str = ""
+    provision_status: str = ""
+    provision_error: str = ""
+
     @rx.event
     async def handle_personal_submit(self, form_data: dict):
         """Persist the personal details and advance the onboarding."""
@@ -157,7 +165,11 @@ class OnboardingState(rx.State):
 
     @rx.event
     async def handle_payment_submit(self, form_data: dict):
-        """Finalize onboarding, provision tenant schema, and redirect to success."""
+        """Finalize onboarding, queue tenant provisioning, and redirect to success.
+
+        The schema is created by a provisioning worker; the success page
+        follows the job with :meth:`poll_provisioning`.
+        """
 
         if not self.user_id:
             yield rx.toast.error("ID do usuário não encontrado. Por favor, volte ao passo 1.")
@@ -166,7 +178,6 @@ class OnboardingState(rx.State):
         self.is_loading = True
         yield
 
-        created_boteco_id = None
         try:
             boteco_data = {
                 "public_name": self.business_public_name,
@@ -187,24 +198,17 @@ class OnboardingState(rx.State):
                 "assigned_role": "owner",
                 "plan": self.selected_plan,
             }
-            boteco_res, _ = await supabase_client.create_boteco_and_associate_user(
-                boteco_data, user_boteco_data
+            job = await self._submit_onboarding(
+                f"onboarding:{self.user_id}:{self.business_username}",
+                boteco_data,
+                user_boteco_data,
             )
-            if boteco_res.data and len(boteco_res.data) > 0:
-                created_boteco_id = boteco_res.data[0]["id"]
-
-            try:
-                await supabase_client.provision_schema(self.business_username)
-                logging.info("Schema provisioning triggered for: %s", self.business_username)
-            except Exception as provision_error:
-                logging.exception(
-                    "Provisioning failed, rolling back DB records: %s", provision_error
-                )
-                if created_boteco_id:
-                    await supabase_client.delete_boteco(created_boteco_id)
-                raise provision_error
 
+            self.provision_job_id = job["id"]
+            self.provision_status = job["status"]
+            self.provision_error = ""
             self.is_loading = False
+            self.has_boteco = True
             self.current_step = 1
             self.selected_plan = ""
             yield rx.redirect("/onboarding/success")
@@ -212,3 +216,78 @@ class OnboardingState(rx.State):
             logging.exception("Error during payment/provisioning: %s", exc)
             self.is_loading = False
             yield rx.toast.error(f"Erro na finalização: {exc}. Tente novamente.")
+
+    @classmethod
+    async def _submit_onboarding(
+        cls,
+        key: str,
+        boteco_data: dict,
+        user_boteco_data: dict,
+        client=supabase_client,
+        jobs=provisioning_jobs,
+        keys=idempotency,
+    ) -> dict:
+        """Complete onboarding at most once per ``key`` and return the provisioning job.
+
+        A resubmit (double click, timeout, reload) for the same user and
+        boteco replays the first job instead of creating the boteco again.
+        A job that failed has had its boteco rolled back, so replaying it
+        would leave the user stuck: its entry is dropped and the request
+        runs again.
+        """
+
+        request_fingerprint = fingerprint({"boteco": boteco_data, "user_boteco": user_boteco_data})
+
+        def work():
+            return cls._complete_onboarding(boteco_data, user_boteco_data, client=client, jobs=jobs)
+
+        job, replayed = await keys.run(key, request_fingerprint, work)
+        if replayed:
+            current = await jobs.get(job["id"])
+            if current is None or current["status"] == FAILED:
+                await keys.invalidate(key, job)
+                job, _ = await keys.run(key, request_fingerprint, work)
+        return job
+
+    @classmethod
+    async def _complete_onboarding(
+        cls, boteco_data: dict, user_boteco_data: dict, client=supabase_client, jobs=provisioning_jobs
+    ) -> dict:
+        """Create the boteco and queue its provisioning job, returning the job."""
+
+        created_boteco_id = None
+        boteco_res, _ = await client.create_boteco_and_associate_user(
+            boteco_data, user_boteco_data
+        )
+        if boteco_res.data and len(boteco_res.data) > 0:
+            created_boteco_id = boteco_res.data[0]["id"]
+
+        try:
+            return await jobs.enqueue(boteco_data["username"], boteco_id=created_boteco_id)
+        except Exception as provision_error:
+            logging.exception(
+                "Could not queue provisioning, rolling back DB records: %s", provision_error
+            )
+            if created_boteco_id:
+                await client.delete_boteco(created_boteco_id)
+            raise provision_error
+
+    @rx.event(background=True)
+    async def poll_provisioning(self):
+        """Follow the queued provisioning job so the success page shows progress."""
+
+        async with self:
+            job_id = self.provision_job_id
+        while job_id:
+            job = await provisioning_jobs.get(job_id)
+            status = job["status"] if job else FAILED
+            async with self:
+                self.provision_status = status
+                self.provision_error = (
+                    (job.get("error") or "") if job else "Job de provisionamento não encontrado."
+                )
+                if status == FAILED:
+                    self.has_boteco = False
+            if status in (SUCCEEDED, FAILED):
+                return
+            await asyncio.sleep(1)
@@ -0,0 +1,32 @@
+import logging
+import os
+from typing import Optional
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to ``default`` when unset or invalid."""
+
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logging.warning("Invalid integer for %s; using default %s.", name, default)
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a numeric setting, falling back to ``default`` when unset or invalid."""
+
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logging.warning("Invalid number for %s; using default %s.", name, default)
+        return default
+
+
+def database_url() -> Optional[str]:
+    """Return the direct Postgres DSN in a form psycopg accepts."""
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("REFLEX_DB_URL")
+    if db_url and "+psycopg" in db_url:
+        db_url = db_url.replace("postgresql+psycopg://", "postgresql://")
+    return db_url
@@ -0,0 +1,151 @@
+"""Helpers for handling SQL scripts (migration and template files)."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+# First line of a file that must run outside a transaction.
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+_DOLLAR_TAG = re.compile(r"\$[A-Za-z_]*\$")
+_FILE_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+
+@dataclass(frozen=True)
+class SqlFile:
+    """A numbered SQL file (``NNNN_name.sql``) split into statements."""
+
+    version: int
+    name: str
+    checksum: str
+    statements: tuple[str, ...]
+    text: str = ""
+
+
+def load_sql_files(directory: Path) -> list[SqlFile]:
+    """Load the numbered ``.sql`` files in ``directory``, ordered by number."""
+
+    files = []
+    for path in directory.glob("*.sql"):
+        match = _FILE_RE.match(path.name)
+        if not match:
+            continue
+        text = path.read_text(encoding="utf-8")
+        files.append(
+            SqlFile(
+                version=int(match.group(1)),
+                name=match.group(2),
+                checksum=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                statements=tuple(split_statements(text)),
+                text=text,
+            )
+        )
+    return sorted(files, key=lambda file: file.version)
+
+
+def split_statements(script: str) -> list[str]:
+    """Split ``script`` on top-level semicolons.
+
+    Semicolons inside quotes, ``$tag$`` bodies and comments do not end a
+    statement. Comment-only fragments are dropped; comments inside a
+    statement are kept.
+    """
+
+    statements: list[str] = []
+    current: list[str] = []
+    i, length = 0, len(script)
+    while i < length:
+        char = script[i]
+        if char == "-" and script.startswith("--", i):
+            end = script.find("\n", i)
+            end = length if end == -1 else end
+            current.append(script[i:end])
+            i = end
+        elif char == "/" and script.startswith("/*", i):
+            end = script.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+            current.append(script[i:end])
+            i = end
+        elif char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if script[end] == char:
+                    if end + 1 < length and script[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(script[i : end + 1])
+            i = end + 1
+        elif char == "$" and (match := _DOLLAR_TAG.match(script, i)):
+            tag = match.group()
+            end = script.find(tag, match.end())
+            end = length if end == -1 else end + len(tag)
+            current.append(script[i:end])
+            i = end
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if strip_comments(statement).strip()]
+
+
+_DUMP_STATEMENT_START = re.compile(
+    r"\n(?=(?:CREATE|ALTER|COMMENT|DROP|GRANT|REVOKE|INSERT|UPDATE|DELETE|TRUNCATE|REINDEX"
+    r"|VACUUM|CLUSTER|LOCK|SET|SELECT)\b)"
+)
+
+
+def split_script(script: str) -> list[str]:
+    """Split ``script`` like :func:`split_statements`, also handling dumps.
+
+    Dumps such as ``schema.sql`` omit semicolons; there a new statement
+    starts at every unindented keyword line outside dollar-quoted bodies.
+    """
+
+    statements: list[str] = []
+    for statement in split_statements(script):
+        if _DOLLAR_TAG.search(statement):
+            statements.append(statement)
+            continue
+        statements.extend(
+            part.strip()
+            for part in _DUMP_STATEMENT_START.split(statement)
+            if strip_comments(part).strip()
+        )
+    return statements
+
+
+def split_top_level(text: str, separator: str = ",") -> list[str]:
+    """Split ``text`` on ``separator`` outside parentheses and quotes."""
+
+    parts, current, depth, quote = [], [], 0, ""
+    for char in text:
+        if quote:
+            quote = "" if char == quote else quote
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def strip_comments(statement: str) -> str:
+    """Remove ``--`` and ``/* */`` comments (quote-unaware; for classification only)."""
+
+    return re.sub(r"--[^\n]*|/\*.*?\*/", "", statement, flags=re.S)
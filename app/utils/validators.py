@@ -26,3 +26,12 @@ def validate_postal_code(postal_code: str) -> bool:
         return False
     clean_cep = re.sub(r"\D", "", postal_code)
     return len(clean_cep) == 8
+
+
+def validate_email(email: str) -> bool:
+    """Validate a plausible email address (single @, dotted domain, no spaces)."""
+
+    if not email:
+        return False
+    pattern = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+    return bool(re.match(pattern, email))
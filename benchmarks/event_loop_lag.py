@@ -0,0 +1,101 @@
+"""Measure Reflex event-loop lag while 200 ``upsert_user`` calls are in flight.
+
+Compares the previous behaviour (a synchronous ``supabase.Client`` whose
+``.execute()`` blocks the loop) with the async client backed by the shared
+``httpx.AsyncClient`` pool. PostgREST is simulated by in-process transports
+that add a fixed latency, so no Supabase project is needed::
+
+    python -m benchmarks.event_loop_lag --calls 200 --latency-ms 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from supabase import Client, ClientOptions
+
+from app.services.supabase_client import SupabaseClient
+
+URL = "http://supabase.bench"
+KEY = "bench-key"
+
+
+def _row(request: httpx.Request) -> list[dict]:
+    return [{"id": "bench", "email": "bench@boteco.pt"}]
+
+
+def _blocking_client(latency: float) -> Client:
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return httpx.Response(201, json=_row(request))
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    return Client(URL, KEY, options=ClientOptions(schema="reflex", httpx_client=http))
+
+
+def _async_transport(latency: float) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(201, json=_row(request))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _monitor_lag(stop: asyncio.Event, interval: float, samples: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def _run(client: SupabaseClient, calls: int, interval: float) -> dict[str, float]:
+    stop = asyncio.Event()
+    samples: list[float] = []
+    monitor = asyncio.create_task(_monitor_lag(stop, interval, samples))
+    await asyncio.sleep(interval)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client.upsert_user({"email": f"user{i}@boteco.pt"}) for i in range(calls))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    samples = samples or [0.0]
+    return {
+        "wall_s": elapsed,
+        "lag_max_ms": max(samples),
+        "lag_p99_ms": statistics.quantiles(samples, n=100, method="inclusive")[98] if len(samples) > 1 else samples[0],
+        "lag_mean_ms": statistics.fmean(samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--tick-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+    interval = args.tick_ms / 1000
+
+    before = SupabaseClient(url=URL, key=KEY)
+    before.client = _blocking_client(latency)  # type: ignore[assignment]
+    after = SupabaseClient(url=URL, key=KEY, http_client=_async_transport(latency))
+
+    print(f"{args.calls} concurrent upsert_user calls, {args.latency_ms:.0f} ms simulated latency")
+    for label, client in (("sync client (before)", before), ("async client (after)", after)):
+        result = asyncio.run(_run(client, args.calls, interval))
+        print(
+            f"{label:<22} wall={result['wall_s']:.2f}s "
+            f"lag max={result['lag_max_ms']:.1f}ms p99={result['lag_p99_ms']:.1f}ms "
+            f"mean={result['lag_mean_ms']:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Load-test ``POST /api/provision_org`` with a per-request vs a shared admin client.
+
+A tiny local HTTP server stands in for Supabase; ``--handshake-ms`` delays
+every new connection to model TCP + TLS setup to a remote project::
+
+    python -m benchmarks.provision_latency --requests 500 --concurrency 20 --handshake-ms 30
+
+``per-request`` reproduces the old route (a new client and connection pool
+for every call); ``shared`` is the current lazily created admin client.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+import app.api.provision as provision
+from app.services.supabase_admin import SupabaseAdmin
+
+
+class PerRequestAdmin(SupabaseAdmin):
+    """Builds a client (and its HTTP pool) for every RPC, like the old route."""
+
+    async def rpc(self, function: str, params: dict[str, Any]):
+        http = httpx.AsyncClient()
+        try:
+            client = AsyncClient(
+                self.url, self.key, options=AsyncClientOptions(schema="reflex", httpx_client=http)
+            )
+            return await client.rpc(function, params).execute()
+        finally:
+            await http.aclose()
+
+
+async def _serve(handshake_ms: float, latency_ms: float) -> tuple[asyncio.AbstractServer, dict[str, int]]:
+    counters = {"connections": 0}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        counters["connections"] += 1
+        await asyncio.sleep(handshake_ms / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(latency_ms / 1000)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: 4\r\n\r\nnull"
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, counters
+
+
+async def _run(label: str, admin: SupabaseAdmin, requests: int, concurrency: int) -> None:
+    provision.supabase_admin = admin
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=provision.api_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://app.local") as client:
+
+        async def one(index: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/provision_org", json={"boteco_username": f"bench_{index}"}
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    await admin.aclose()
+    p50, p99 = (statistics.quantiles(latencies, n=100, method="inclusive")[i] for i in (49, 98))
+    print(f"  {label:<12} {requests / elapsed:8.0f} req/s  p50={p50:7.2f}ms  p99={p99:7.2f}ms")
+
+
+async def _main(args: argparse.Namespace) -> None:
+    server, counters = await _serve(args.handshake_ms, args.latency_ms)
+    port = server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, "
+        f"handshake {args.handshake_ms}ms, upstream latency {args.latency_ms}ms"
+    )
+    async with server:
+        for label, admin in (
+            ("per-request", PerRequestAdmin(url=url, key="bench-key")),
+            ("shared", SupabaseAdmin(url=url, key="bench-key")),
+        ):
+            counters["connections"] = 0
+            await _run(label, admin, args.requests, args.concurrency)
+            print(f"  {'':<12} upstream connections opened: {counters['connections']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
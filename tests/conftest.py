@@ -1,9 +1,59 @@
 from __future__ import annotations
 
+import json
 import sys
 from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+import pytest
 
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+class FakeSupabase:
+    """In-process PostgREST stand-in that records every HTTP round trip."""
+
+    def __init__(self, handler: Callable[[httpx.Request], Any]) -> None:
+        self.handler = handler
+        self.requests: list[httpx.Request] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        result = self.handler(request)
+        if hasattr(result, "__await__"):
+            result = await result
+        if isinstance(result, httpx.Response):
+            return result
+        return httpx.Response(200, json=result)
+
+    @staticmethod
+    def body(request: httpx.Request) -> Any:
+        return json.loads(request.content or b"null")
+
+    def client(self, **kwargs: Any):
+        from app.services.supabase_client import SupabaseClient
+
+        return SupabaseClient(
+            url="http://supabase.test",
+            key="test-key",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self)),
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def fake_supabase() -> Callable[[Callable[[httpx.Request], Any]], FakeSupabase]:
+    return FakeSupabase
+
+
+@pytest.fixture(autouse=True)
+def fresh_provisioning_admission(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Give every test an empty provisioning token bucket and slot table."""
+
+    from app.services.admission import MemoryAdmissionBackend, provisioning_admission
+
+    monkeypatch.setattr(provisioning_admission, "_backend", MemoryAdmissionBackend())
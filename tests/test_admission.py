@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import app.api.provision as provision
+from app.services.admission import (
+    AdmissionRejected,
+    MemoryAdmissionBackend,
+    ProvisioningAdmission,
+)
+
+
+def test_concurrency_cap_queues_callers_in_order():
+    active = 0
+    peak = 0
+    order = []
+
+    async def provision_one(n, admission):
+        nonlocal active, peak
+        async with admission.slot():
+            active += 1
+            peak = max(peak, active)
+            order.append(n)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+    async def scenario():
+        admission = ProvisioningAdmission(
+            backend=MemoryAdmissionBackend(), concurrency=2, rate=0, max_wait=5, poll_interval=0.005
+        )
+        await asyncio.gather(*(provision_one(n, admission) for n in range(8)))
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert peak == 2
+    assert order == list(range(8))
+    assert (stats["admitted"], stats["rejected"], stats["in_flight"]) == (8, 0, 0)
+
+
+def test_token_bucket_paces_bursts_and_rejects_past_the_deadline():
+    async def scenario():
+        admission = ProvisioningAdmission(
+            backend=MemoryAdmissionBackend(), concurrency=0, rate=20, burst=2, max_wait=0.2
+        )
+        started = time.perf_counter()
+        for _ in range(4):
+            async with admission.slot():
+                pass
+        paced = time.perf_counter() - started
+        strict = ProvisioningAdmission(
+            backend=MemoryAdmissionBackend(), concurrency=0, rate=0.1, burst=1, max_wait=0.2
+        )
+        async with strict.slot():
+            pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with strict.slot():
+                pass
+        return paced, rejected.value.retry_after
+
+    paced, retry_after = asyncio.run(scenario())
+
+    # Two tokens of burst, then one every 50ms.
+    assert 0.08 <= paced < 1
+    assert 5 <= retry_after <= 10
+
+
+def test_saturated_route_answers_429_with_retry_after(monkeypatch):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def provision_org(username):
+            await gate.wait()
+            return f"org_{username}"
+
+        monkeypatch.setattr(provision.provisioning, "provision_org", provision_org)
+        monkeypatch.setattr(
+            provision,
+            "provisioning_admission",
+            ProvisioningAdmission(
+                backend=MemoryAdmissionBackend(), concurrency=1, rate=0, max_wait=0.05
+            ),
+        )
+        transport = httpx.ASGITransport(app=provision.api_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+            first = asyncio.create_task(
+                client.post("/api/provision_org", json={"boteco_username": "bar_a"})
+            )
+            await asyncio.sleep(0.01)
+            busy = await client.post(
+                "/api/provision_org",
+                json={"boteco_username": "bar_b"},
+                headers={"Idempotency-Key": "retry-me"},
+            )
+            gate.set()
+            done = await first
+            retried = await client.post(
+                "/api/provision_org",
+                json={"boteco_username": "bar_b"},
+                headers={"Idempotency-Key": "retry-me"},
+            )
+            return busy, done, retried
+
+    busy, done, retried = asyncio.run(scenario())
+
+    assert busy.status_code == 429
+    assert int(busy.headers["retry-after"]) >= 1
+    assert done.status_code == 200
+    assert retried.status_code == 200
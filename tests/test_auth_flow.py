@@ -4,24 +4,17 @@ from app.states.auth_state import AuthState
 from app.states.onboarding_state import OnboardingState
 
 
-def reset_onboarding_state() -> None:
-    OnboardingState.current_step = 1
-    OnboardingState.is_loading = False
-    OnboardingState.personal_first_name = ""
-    OnboardingState.personal_last_name = ""
-    OnboardingState.personal_email = ""
-    OnboardingState.personal_tax_number = ""
-    OnboardingState.personal_birth_date = ""
-    OnboardingState.personal_country = "Brasil"
-    OnboardingState.personal_postal_code = ""
-    OnboardingState.personal_house_number = ""
-    OnboardingState.user_id = None
-    OnboardingState.selected_plan = ""
+def new_onboarding() -> OnboardingState:
+    """A fresh per-session onboarding state, as ``get_state`` would return."""
+
+    return OnboardingState(_reflex_internal_init=True)
 
 
 class DummyClient:
-    def __init__(self, users=None):
+    def __init__(self, users=None, memberships=None):
         self.users = users or []
+        self.memberships = memberships or {}
+        self.bootstrap_calls = 0
 
     async def create_user(self, data):
         return [{"id": "user-1", **data}]
@@ -29,9 +22,22 @@ class DummyClient:
     async def get_user_by_email(self, email):
         return [user for user in self.users if user.get("email") == email]
 
+    async def bootstrap_session(self, email):
+        self.bootstrap_calls += 1
+        users = await self.get_user_by_email(email)
+        if not users:
+            return None
+        membership = self.memberships.get(users[0]["id"])
+        return {
+            "user": users[0],
+            "has_boteco": membership is not None,
+            "plan": membership["plan"] if membership else None,
+            "boteco": membership["boteco"] if membership else None,
+        }
+
 
 def test_register_prefills_onboarding_and_redirects():
-    reset_onboarding_state()
+    onboarding = new_onboarding()
     client = DummyClient()
     redirect, error = asyncio.run(
         AuthState._perform_register(
@@ -44,21 +50,22 @@ def test_register_prefills_onboarding_and_redirects():
                 "personal_postal_code": "12345678",
                 "personal_house_number": "100",
             },
+            onboarding,
             client=client,
         )
     )
 
     assert error is None
     assert redirect == "/onboarding/step-1-personal"
-    assert OnboardingState.personal_first_name == "Ana"
-    assert OnboardingState.personal_last_name == "Silva"
-    assert OnboardingState.personal_email == "ana@boteco.pt"
-    assert OnboardingState.user_id == "user-1"
-    assert OnboardingState.current_step == 1
+    assert onboarding.personal_first_name == "Ana"
+    assert onboarding.personal_last_name == "Silva"
+    assert onboarding.personal_email == "ana@boteco.pt"
+    assert onboarding.user_id == "user-1"
+    assert onboarding.current_step == 1
 
 
 def test_signin_loads_user_and_redirects():
-    reset_onboarding_state()
+    onboarding = new_onboarding()
     client = DummyClient(
         users=[
             {
@@ -73,25 +80,76 @@ def test_signin_loads_user_and_redirects():
     )
 
     redirect, error = asyncio.run(
-        AuthState._perform_signin({"email": "bruno@boteco.pt"}, client=client)
+        AuthState._perform_signin({"email": "bruno@boteco.pt"}, onboarding, client=client)
     )
 
     assert error is None
     assert redirect == "/onboarding/step-1-personal"
-    assert OnboardingState.user_id == "existing-1"
-    assert OnboardingState.personal_first_name == "Bruno"
-    assert OnboardingState.personal_last_name == "Souza"
-    assert OnboardingState.personal_email == "bruno@boteco.pt"
+    assert onboarding.user_id == "existing-1"
+    assert onboarding.personal_first_name == "Bruno"
+    assert onboarding.personal_last_name == "Souza"
+    assert onboarding.personal_email == "bruno@boteco.pt"
 
 
 def test_signin_handles_missing_user():
-    reset_onboarding_state()
+    onboarding = new_onboarding()
     client = DummyClient(users=[])
 
     redirect, error = asyncio.run(
-        AuthState._perform_signin({"email": "missing@boteco.pt"}, client=client)
+        AuthState._perform_signin({"email": "missing@boteco.pt"}, onboarding, client=client)
     )
 
     assert redirect is None
     assert error == "Usuário não encontrado. Por favor registre-se."
-    assert OnboardingState.user_id is None
+    assert onboarding.user_id is None
+
+
+def test_signin_with_boteco_goes_to_dashboard_in_one_query():
+    onboarding = new_onboarding()
+    client = DummyClient(
+        users=[{"id": "owner-1", "first_name": "Carla", "email": "carla@boteco.pt"}],
+        memberships={
+            "owner-1": {"plan": "boteco_pro", "boteco": {"id": "b-1", "username": "bar_da_carla"}}
+        },
+    )
+
+    redirect, error = asyncio.run(
+        AuthState._perform_signin({"email": "carla@boteco.pt"}, onboarding, client=client)
+    )
+    dashboard_redirect = asyncio.run(AuthState._perform_dashboard_check(onboarding, client=client))
+
+    assert error is None
+    assert redirect == "/app"
+    assert dashboard_redirect is None
+    assert client.bootstrap_calls == 1
+    assert onboarding.has_boteco is True
+    assert onboarding.selected_plan == "boteco_pro"
+    assert onboarding.business_username == "bar_da_carla"
+
+
+def test_dashboard_check_sends_users_without_boteco_to_onboarding():
+    onboarding = new_onboarding()
+    onboarding.personal_email = "bruno@boteco.pt"
+    client = DummyClient(users=[{"id": "existing-1", "email": "bruno@boteco.pt"}])
+
+    redirect = asyncio.run(AuthState._perform_dashboard_check(onboarding, client=client))
+
+    assert redirect == "/onboarding/step-1-personal"
+    assert client.bootstrap_calls == 1
+
+
+def test_sessions_do_not_share_onboarding_data():
+    client = DummyClient(
+        users=[{"id": "owner-1", "first_name": "Carla", "email": "carla@boteco.pt"}],
+        memberships={
+            "owner-1": {"plan": "boteco_pro", "boteco": {"id": "b-1", "username": "bar_da_carla"}}
+        },
+    )
+    carla, other = new_onboarding(), new_onboarding()
+
+    asyncio.run(AuthState._perform_signin({"email": "carla@boteco.pt"}, carla, client=client))
+    redirect = asyncio.run(AuthState._perform_dashboard_check(other, client=client))
+
+    assert carla.has_boteco is True
+    assert (other.has_boteco, other.business_username, other.personal_email) == (False, "", "")
+    assert redirect == "/signin"
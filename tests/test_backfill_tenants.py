@@ -0,0 +1,83 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.services.backfill_tenants import backfill, load_checkpoint, read_usernames
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+def test_usernames_file_and_checkpoint_parsing(tmp_path):
+    assert read_usernames(["bar_a", "  # imported chain", "bar_b  # filial", "", "bar_a"]) == [
+        "bar_a",
+        "bar_b",
+    ]
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text(
+        json.dumps({"username": "bar_a", "status": "failed"})
+        + "\n"
+        + json.dumps({"username": "bar_a", "status": "provisioned"})
+        + "\n"
+    )
+    assert load_checkpoint(checkpoint)["bar_a"]["status"] == "provisioned"
+
+
+@pytest.fixture
+def tenant_db():
+    psycopg = pytest.importorskip("psycopg")
+
+    def cleanup(conn):
+        for (name,) in conn.execute(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'org_backfilltest_%'"
+        ).fetchall():
+            conn.execute(f'DROP SCHEMA "{name}" CASCADE')
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+        cleanup(conn)
+        # A half-made tenant from the old CREATE SCHEMA path, and one that
+        # has data but predates the template.
+        conn.execute("CREATE SCHEMA org_backfilltest_empty")
+        conn.execute("CREATE SCHEMA org_backfilltest_legacy")
+        conn.execute("CREATE TABLE org_backfilltest_legacy.orders (id int)")
+    yield psycopg
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        cleanup(conn)
+
+
+@needs_db
+def test_backfill_provisions_repairs_and_resumes(tenant_db, tmp_path):
+    from app.services.postgres_backend import PostgresClient
+
+    usernames = [f"backfilltest_{n}" for n in range(6)] + [
+        "backfilltest_empty",
+        "backfilltest_legacy",
+        "not valid!",
+    ]
+    checkpoint = tmp_path / "checkpoint.jsonl"
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="public", cache=False)
+        try:
+            first = await backfill(client, usernames, concurrency=3, checkpoint=checkpoint)
+            second = await backfill(client, usernames, concurrency=3, checkpoint=checkpoint)
+            return first, second
+        finally:
+            await client.aclose()
+
+    first, second = asyncio.run(scenario())
+
+    assert first["counts"] == {"provisioned": 6, "repaired": 1, "unmanaged": 1, "invalid": 1}
+    assert (first["outdated"], first["unmanaged"]) == ([], ["backfilltest_legacy"])
+    assert first["build_p50_ms"] > 0
+    assert second["skipped_from_checkpoint"] == 7
+    assert second["counts"] == {"unmanaged": 1, "invalid": 1}
+    with tenant_db.connect(DSN) as conn:
+        repaired = conn.execute(
+            "SELECT count(*) FROM pg_tables WHERE schemaname = 'org_backfilltest_empty'"
+        ).fetchone()[0]
+    assert repaired == 22
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+def make_user(n: int, **overrides):
+    return {
+        "email": f"user{n}@boteco.pt",
+        "username": f"user.{n}",
+        "tax_number": f"{n:011d}",
+        "first_name": "Ana",
+        "last_name": "Silva",
+        "birth_date": "1990-05-01",
+        "country": "Brasil",
+        "postal_code": "12345678",
+        "house_number": "10",
+        **overrides,
+    }
+
+
+def echo(fake_supabase):
+    def handler(request: httpx.Request):
+        return [{"id": f"id-{row['email']}", **row} for row in fake_supabase.body(request)]
+
+    return handler
+
+
+def test_bulk_upsert_sends_multi_row_chunks(fake_supabase):
+    backend = fake_supabase(echo(fake_supabase))
+    client = backend.client(cache=False)
+
+    report = asyncio.run(
+        client.upsert_users_bulk([make_user(n) for n in range(1, 251)], chunk_size=100, concurrency=2)
+    )
+
+    assert len(backend.requests) == 3
+    assert [len(fake_supabase.body(request)) for request in backend.requests] == [100, 100, 50]
+    assert backend.requests[0].url.params["on_conflict"] == "email"
+    assert "missing=default" in backend.requests[0].headers["prefer"]
+    assert report["stats"]["upserted"] == 250
+    assert report["stats"]["chunks"] == 3
+    assert report["results"][0] == {"index": 0, "status": "upserted", "id": "id-user1@boteco.pt"}
+
+
+def test_bulk_upsert_validates_and_dedupes_before_sending(fake_supabase):
+    backend = fake_supabase(echo(fake_supabase))
+    client = backend.client(cache=False)
+    rows = [
+        make_user(1),
+        make_user(2, tax_number="123"),  # invalid CPF/CNPJ
+        make_user(3, tax_number=f"{1:011d}"),  # tax number owned by row 0
+        make_user(1, first_name="Ana Maria"),  # same email: supersedes row 0
+        make_user(4, email="sem-arroba"),
+    ]
+
+    report = asyncio.run(client.upsert_users_bulk(rows))
+
+    statuses = [result["status"] for result in report["results"]]
+    assert statuses == ["duplicate", "invalid", "duplicate", "upserted", "invalid"]
+    assert fake_supabase.body(backend.requests[0]) == [rows[3]]
+    assert report["stats"]["requests"] == 1
+
+
+def test_bulk_upsert_bisects_a_rejected_chunk(fake_supabase):
+    def handler(request: httpx.Request):
+        rows = fake_supabase.body(request)
+        if any(row["email"] == "user3@boteco.pt" for row in rows):
+            return httpx.Response(
+                409, json={"code": "23505", "message": "duplicate key", "details": None, "hint": None}
+            )
+        return [{"id": row["email"], "email": row["email"]} for row in rows]
+
+    backend = fake_supabase(handler)
+    client = backend.client(cache=False)
+
+    report = asyncio.run(client.upsert_users_bulk([make_user(n) for n in range(1, 9)], chunk_size=8))
+
+    statuses = [result["status"] for result in report["results"]]
+    assert statuses == ["upserted", "upserted", "failed", "upserted", "upserted", "upserted", "upserted", "upserted"]
+    assert report["stats"]["failed"] == 1
+    assert len(backend.requests) == 7  # 8 -> 4+4 -> 2+2 -> 1+1
+
+
+def test_backend_without_the_bulk_hook_cannot_be_created():
+    from app.services.storage import StorageClient
+
+    class Incomplete(StorageClient):
+        pass
+
+    with pytest.raises(TypeError, match="_upsert_user_rows"):
+        Incomplete(cache=False)
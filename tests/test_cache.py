@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+from app.services.cache import ReadThroughCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b", None) is None
+    assert cache.evictions == 1
+
+    clock.now = 11
+    assert cache.get("a", None) is None
+    assert cache.expirations == 1
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_read_through_cache_shares_values_through_redis():
+    redis = FakeRedis()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return {"id": "user-1"}
+
+    async def scenario():
+        first = ReadThroughCache(TTLCache(), redis=redis)
+        second = ReadThroughCache(TTLCache(), redis=redis)
+        assert await first.get_or_load("user:email:a", loader) == {"id": "user-1"}
+        assert await second.get_or_load("user:email:a", loader) == {"id": "user-1"}
+        await second.invalidate("user:email:a")
+        return second.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert len(loads) == 1
+    assert stats["redis_hits"] == 1
+    assert redis.store == {}
+
+
+def test_load_overtaken_by_an_invalidation_is_not_stored():
+    redis = FakeRedis()
+    rows = {"user:email:a": "old"}
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_loader():
+        value = rows["user:email:a"]
+        started.set()
+        await release.wait()
+        return value
+
+    async def loader():
+        return rows["user:email:a"]
+
+    async def scenario():
+        cache = ReadThroughCache(TTLCache(), redis=redis)
+        reader = asyncio.create_task(cache.get_or_load("user:email:a", slow_loader))
+        await started.wait()
+        # A write lands while the read is in flight.
+        rows["user:email:a"] = "new"
+        await cache.invalidate("user:email:a")
+        release.set()
+        stale = await reader
+        return stale, await cache.get_or_load("user:email:a", loader), cache.stats()
+
+    stale, fresh, stats = asyncio.run(scenario())
+
+    assert (stale, fresh) == ("old", "new")
+    assert stats["stale_loads"] == 1
+    assert json.loads(redis.store["supabase:user:email:a"]) == "new"
+
+
+def test_supabase_lookups_are_cached_until_a_write_invalidates_them(fake_supabase):
+    def handler(request):
+        if request.method == "GET":
+            return [{"id": "user-1", "email": "ana@boteco.pt"}]
+        return [json.loads(request.content)]
+
+    backend = fake_supabase(handler)
+    client = backend.client()
+
+    async def scenario():
+        await client.get_user_by_email("ana@boteco.pt")
+        await client.get_user_by_email("ana@boteco.pt")
+        await client.upsert_user({"email": "ana@boteco.pt", "first_name": "Ana"})
+        await client.get_user_by_email("ana@boteco.pt")
+
+    asyncio.run(scenario())
+
+    assert [request.method for request in backend.requests] == ["GET", "POST", "GET"]
+    assert client.cache_stats()["hits"] == 1
+    assert client.cache_stats()["misses"] == 2
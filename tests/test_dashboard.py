@@ -0,0 +1,171 @@
+import asyncio
+import os
+import shutil
+import uuid
+
+import pytest
+
+from app.services.cache import ReadThroughCache, TTLCache
+from app.services.tenant_template import TEMPLATE_DIR, TenantTemplate, load_template_files
+from app.states.dashboard_state import DashboardState, format_brl
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+MIGRATION = TEMPLATE_DIR.parent / "migrations" / "0003_dashboard_kpis.sql"
+SCHEMA = "org_dashtest"
+
+
+class DummyClient:
+    def __init__(self, kpis):
+        self.kpis = kpis
+        self.calls = []
+
+    async def get_dashboard_kpis(self, tenant_schema):
+        self.calls.append(tenant_schema)
+        return self.kpis
+
+
+def test_kpis_are_cached_per_tenant_and_filled_with_defaults():
+    client = DummyClient({"sales_today": 12.5, "active_tables": 2})
+    cache = ReadThroughCache(TTLCache(maxsize=8, ttl=60), redis=None, namespace="dashboard")
+
+    async def scenario():
+        first = await DashboardState._load_kpis("bar_do_ze", client=client, cache=cache)
+        second = await DashboardState._load_kpis("bar_do_ze", client=client, cache=cache)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == second == {
+        "sales_today": 12.5,
+        "sales_count_today": 0,
+        "active_tables": 2,
+        "low_stock_items": 0,
+    }
+    assert client.calls == ["org_bar_do_ze"]
+    with pytest.raises(ValueError):
+        asyncio.run(DashboardState._load_kpis("Bar do Zé", client=client, cache=cache))
+
+
+def test_format_brl():
+    assert format_brl(0) == "R$ 0,00"
+    assert format_brl(None) == "R$ 0,00"
+    assert format_brl("1234.5") == "R$ 1.234,50"
+
+
+@pytest.fixture
+def dashboard_db(tmp_path):
+    psycopg = pytest.importorskip("psycopg")
+    for file in sorted(TEMPLATE_DIR.glob("*.sql"))[:2]:
+        shutil.copy(file, tmp_path / file.name)
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS reflex")
+        conn.execute(MIGRATION.read_text())
+        with conn.transaction():
+            conn.execute(TenantTemplate(tmp_path).script(SCHEMA), prepare=False)
+    yield psycopg
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+@needs_db
+def test_rollups_are_backfilled_and_maintained_by_triggers(dashboard_db):
+    from app.services.postgres_backend import PostgresClient
+    from app.services.tenant_migrations import migrate_tenants
+
+    owner, company = uuid.uuid4(), uuid.uuid4()
+    with dashboard_db.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.execute("INSERT INTO auth.users (id) VALUES (%s)", [owner])
+        conn.execute(
+            "INSERT INTO companies (id, name, slug, owner_id) VALUES (%s, 'Bar', %s, %s)",
+            [company, f"bar-{company}", owner],
+        )
+        conn.execute("INSERT INTO company_settings (company_id) VALUES (%s)", [company])
+        order = conn.execute(
+            "INSERT INTO orders (company_id) VALUES (%s) RETURNING id", [company]
+        ).fetchone()[0]
+        # History from before the rollups existed.
+        conn.execute(
+            "INSERT INTO sales (company_id, order_id, total, subtotal, payment_method, sale_date)"
+            " SELECT %s, %s, 10, 10, 'pix', now() - n * interval '1 day'"
+            " FROM generate_series(0, 2) AS n",
+            [company, order],
+        )
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        try:
+            files = load_template_files()
+            # Triggers attached, history not yet backfilled.
+            attached = await migrate_tenants(client, [SCHEMA], [f for f in files if f.version < 8])
+            # Writes between the triggers and the backfill must not be counted twice.
+            async with await dashboard_db.AsyncConnection.connect(DSN, autocommit=True) as conn:
+                await conn.execute(f"SET search_path TO {SCHEMA}, public")
+                await conn.execute(
+                    "INSERT INTO sales (company_id, order_id, total, subtotal, payment_method, sale_date)"
+                    " VALUES (%s, %s, 5, 5, 'cash', now())",
+                    [company, order],
+                )
+                await conn.execute(
+                    "UPDATE sales SET total = 12 WHERE sale_date < now() - interval '12 hours'"
+                    " AND sale_date > now() - interval '36 hours'"
+                )
+                await conn.execute(
+                    "INSERT INTO tables (company_id, number, name, status) VALUES (%s, 9, 'Mesa 9', 'occupied')",
+                    [company],
+                )
+            report = await migrate_tenants(client, [SCHEMA], files)
+            backfilled = await client.get_dashboard_kpis(SCHEMA)
+            async with await dashboard_db.AsyncConnection.connect(DSN, autocommit=True) as conn:
+                await conn.execute(f"SET search_path TO {SCHEMA}, public")
+                await conn.execute(
+                    "INSERT INTO sales (company_id, order_id, total, subtotal, payment_method, sale_date)"
+                    " VALUES (%s, %s, 25.5, 25.5, 'cash', now()), (%s, %s, 99, 99, 'cash', now() - interval '2 days')",
+                    [company, order, company, order],
+                )
+                await conn.execute(
+                    "UPDATE sales SET total = total + 1 WHERE company_id = %s AND total = 25.5", [company]
+                )
+                await conn.execute(
+                    "INSERT INTO tables (company_id, number, name, status) VALUES"
+                    " (%s, 1, 'Mesa 1', 'occupied'), (%s, 2, 'Mesa 2', 'occupied'), (%s, 3, 'Mesa 3', 'available')",
+                    [company, company, company],
+                )
+                await conn.execute("UPDATE tables SET status = 'available' WHERE number = 2")
+                await conn.execute(
+                    "INSERT INTO products (company_id, name, category, unit, stock, min_stock) VALUES"
+                    " (%s, 'Limão', 'food', 'un', 2, 5), (%s, 'Gelo', 'food', 'un', 10, 5)",
+                    [company, company],
+                )
+                await conn.execute("DELETE FROM sales WHERE total = 99")
+            return attached, report, backfilled, await client.get_dashboard_kpis(SCHEMA)
+        finally:
+            await client.aclose()
+
+    attached, report, backfilled, live = asyncio.run(scenario())
+
+    assert (attached["counts"], report["counts"]) == ({"migrated": 1}, {"migrated": 1})
+    assert backfilled == {
+        "sales_today": 15,
+        "sales_count_today": 2,
+        "active_tables": 1,
+        "low_stock_items": 0,
+    }
+    assert live == {
+        "sales_today": 41.5,
+        "sales_count_today": 3,
+        "active_tables": 2,
+        "low_stock_items": 1,
+    }
+    with dashboard_db.connect(DSN) as conn:
+        days = conn.execute(
+            f"SELECT sales_count, total FROM {SCHEMA}.sales_daily ORDER BY day"
+        ).fetchall()
+    # Deleting the late sale takes it back out of its day.
+    assert [(count, float(total)) for count, total in days] == [(1, 10.0), (1, 12.0), (3, 41.5)]
@@ -0,0 +1,213 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import app.api.provision as provision
+from app.services.idempotency import (
+    Idempotency,
+    IdempotencyMismatch,
+    MemoryIdempotencyStore,
+    RedisIdempotencyStore,
+)
+from app.services.provisioning_jobs import FAILED, MemoryJobStore, ProvisioningJobs
+from app.states.onboarding_state import OnboardingState
+
+
+class FakeRedis:
+    """Just the string commands the idempotency store uses."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        return int(self.values.pop(key, None) is not None)
+
+
+def test_concurrent_duplicates_wait_for_the_first_request():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"schema": "org_bar_do_ze"}
+
+    async def scenario():
+        # Two workers sharing one Redis.
+        redis = FakeRedis()
+        workers = [
+            Idempotency(store=RedisIdempotencyStore(redis), poll_interval=0.01) for _ in range(2)
+        ]
+        return await asyncio.gather(
+            *(workers[n % 2].run("provision_org:k1", "fp", work) for n in range(6))
+        )
+
+    outcomes = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert [result for result, _ in outcomes] == [{"schema": "org_bar_do_ze"}] * 6
+    assert sorted(replayed for _, replayed in outcomes) == [False] + [True] * 5
+
+
+def test_claim_is_renewed_while_slow_work_runs():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return {"schema": "org_bar"}
+
+    async def scenario():
+        keys = Idempotency(store=MemoryIdempotencyStore(), lock_ttl=0.05, poll_interval=0.01)
+        first = asyncio.create_task(keys.run("k", "fp", work))
+        # Well past lock_ttl: without renewal this duplicate would claim the key.
+        await asyncio.sleep(0.12)
+        second = await keys.run("k", "fp", work)
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert first == ({"schema": "org_bar"}, False)
+    assert second == ({"schema": "org_bar"}, True)
+
+
+def test_failures_release_the_key_and_mismatches_are_rejected():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return "ok"
+
+    async def scenario():
+        keys = Idempotency(store=MemoryIdempotencyStore())
+        with pytest.raises(RuntimeError):
+            await keys.run("k", "fp", flaky)
+        retried = await keys.run("k", "fp", flaky)
+        with pytest.raises(IdempotencyMismatch):
+            await keys.run("k", "other", flaky)
+        return retried
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    assert len(attempts) == 2
+
+
+def test_provision_route_replays_responses_for_the_same_key(monkeypatch):
+    calls = []
+
+    async def provision_org(username):
+        calls.append(username)
+        if username == "bar_down":
+            raise RuntimeError("database unavailable")
+        return f"org_{username}"
+
+    monkeypatch.setattr(provision.provisioning, "provision_org", provision_org)
+    monkeypatch.setattr(provision, "idempotency", Idempotency(store=MemoryIdempotencyStore()))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=provision.api_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+
+            def post(username, key):
+                return client.post(
+                    "/api/provision_org",
+                    json={"boteco_username": username},
+                    headers={"Idempotency-Key": key},
+                )
+
+            first, again = await asyncio.gather(post("bar_do_ze", "a"), post("bar_do_ze", "a"))
+            reused = await post("bar_outro", "a")
+            failed = await post("bar_down", "b")
+            retried = await post("bar_down", "b")
+            return first, again, reused, failed, retried
+
+    first, again, reused, failed, retried = asyncio.run(scenario())
+
+    assert (first.status_code, again.status_code) == (200, 200)
+    assert first.json() == again.json()
+    assert {first.headers.get("idempotent-replayed"), again.headers.get("idempotent-replayed")} == {
+        None,
+        "true",
+    }
+    assert reused.status_code == 422
+    assert (failed.status_code, retried.status_code) == (500, 500)
+    assert calls == ["bar_do_ze", "bar_down", "bar_down"]
+
+
+def test_onboarding_resubmit_creates_the_boteco_once():
+    class Client:
+        def __init__(self):
+            self.created = []
+
+        async def create_boteco_and_associate_user(self, boteco_data, user_boteco_data):
+            self.created.append(boteco_data["username"])
+            await asyncio.sleep(0.02)
+            return SimpleNamespace(data=[{"id": "boteco-1"}]), None
+
+    client = Client()
+    jobs = ProvisioningJobs(store=MemoryJobStore())
+    boteco = {"username": "bar_do_ze", "public_name": "Bar do Zé"}
+
+    keys = Idempotency(store=MemoryIdempotencyStore(), poll_interval=0.01)
+
+    def submit():
+        return OnboardingState._submit_onboarding(
+            "onboarding:user-1:bar_do_ze", boteco, {}, client=client, jobs=jobs, keys=keys
+        )
+
+    async def scenario():
+        return await asyncio.gather(submit(), submit())
+
+    first, second = asyncio.run(scenario())
+
+    assert client.created == ["bar_do_ze"]
+    assert first == second
+    assert first["boteco_id"] == "boteco-1"
+
+
+def test_onboarding_retry_after_a_failed_job_starts_over():
+    class Client:
+        def __init__(self):
+            self.created = []
+
+        async def create_boteco_and_associate_user(self, boteco_data, user_boteco_data):
+            self.created.append(boteco_data["username"])
+            return SimpleNamespace(data=[{"id": f"boteco-{len(self.created)}"}]), None
+
+    client = Client()
+    jobs = ProvisioningJobs(store=MemoryJobStore())
+    keys = Idempotency(store=MemoryIdempotencyStore(), poll_interval=0.01)
+    boteco = {"username": "bar_do_ze", "public_name": "Bar do Zé"}
+
+    def submit():
+        return OnboardingState._submit_onboarding(
+            "onboarding:user-1:bar_do_ze", boteco, {}, client=client, jobs=jobs, keys=keys
+        )
+
+    async def scenario():
+        first = await submit()
+        replayed = await submit()
+        # The worker gave up and rolled the boteco back.
+        await jobs.store.save({**first, "status": FAILED, "error": "boom"})
+        retried = await submit()
+        return first, replayed, retried, await submit()
+
+    first, replayed, retried, replayed_again = asyncio.run(scenario())
+
+    assert replayed == first
+    assert client.created == ["bar_do_ze", "bar_do_ze"]
+    assert retried["id"] != first["id"]
+    assert retried["boteco_id"] == "boteco-2"
+    assert replayed_again == retried
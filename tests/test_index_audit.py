@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from app.services.index_audit import (
+    DUPLICATE,
+    PREFIX,
+    SHADOWED,
+    drop_migration,
+    find_redundant,
+    indexes_from_catalog,
+    indexes_from_paths,
+    indexes_from_sql,
+    parse_index,
+)
+from app.services.tenant_template import TEMPLATE_DIR, TenantTemplate
+
+ROOT = Path(__file__).resolve().parent.parent
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+def kinds(findings):
+    return {(f.index.table, f.index.name): (f.kind, f.covered_by.name) for f in findings}
+
+
+def test_schema_dump_reports_duplicate_prefix_and_shadowed_indexes():
+    found = kinds(find_redundant(indexes_from_paths([ROOT / "schema.sql"])))
+
+    assert found[("company_users", "idx_company_users_user_company")] == (
+        DUPLICATE,
+        "company_users_user_company_idx",
+    )
+    assert found[("company_users", "idx_company_users_user_id")] == (PREFIX, "company_users_user_company_idx")
+    assert found[("tables", "tables_company_id_number_idx")] == (SHADOWED, "tables_company_id_number_key")
+    assert ("orders", "idx_orders_company_id") not in found
+    # Supabase owns auth.users; its indexes are only audited on request.
+    assert not any(table.startswith("auth.") for table, _ in found)
+    managed = kinds(find_redundant(indexes_from_paths([ROOT / "schema.sql"]), include_managed=True))
+    assert managed[("auth.users", "users_instance_id_idx")] == (PREFIX, "users_instance_id_email_idx")
+
+
+def test_unique_partial_and_expression_indexes_are_compared_exactly():
+    script = """
+CREATE TABLE items (id uuid PRIMARY KEY, code text, kind text, CONSTRAINT items_code_key UNIQUE (code));
+CREATE UNIQUE INDEX items_code_kind_idx ON items (code, kind);
+CREATE INDEX items_id_idx ON items USING hash (id);
+CREATE INDEX items_kind_idx ON items (kind) WHERE (kind IS NOT NULL);
+CREATE INDEX items_kind_code_idx ON items (kind, code);
+CREATE INDEX items_lower_code_idx ON items (lower(code));
+CREATE INDEX items_code_idx ON items ("code" ASC);
+"""
+    indexes = indexes_from_sql(script)
+
+    assert {index.name for index in indexes} >= {"items_pkey", "items_code_key"}
+    assert kinds(find_redundant(indexes)) == {("items", "items_code_idx"): (SHADOWED, "items_code_key")}
+
+
+def test_catalog_definitions_parse_like_the_source():
+    index = parse_index(
+        "CREATE UNIQUE INDEX users_email_key ON auth.users USING btree (lower((email)::text)) "
+        "INCLUDE (id) WHERE (deleted_at IS NULL)",
+        constraint="users_email_key",
+    )
+
+    assert (index.table, index.columns, index.include, index.predicate) == (
+        "auth.users",
+        ("lower((email)::text)",),
+        ("id",),
+        "deleted_at is null",
+    )
+
+
+def test_tenant_template_is_clean_and_drop_migrations_render():
+    assert find_redundant(indexes_from_paths([TEMPLATE_DIR])) == []
+
+    first_file_only = TenantTemplate(TEMPLATE_DIR).files[:1]
+    findings = find_redundant(indexes_from_sql(first_file_only[0].text, schema="reflex"))
+    migration = drop_migration(findings)
+
+    assert migration.startswith("-- migrate: no-transaction\n")
+    assert "DROP INDEX CONCURRENTLY IF EXISTS reflex.idx_company_users_user_id;" in migration
+    assert "DROP INDEX IF EXISTS idx_company_users_user_id;" in drop_migration(findings, concurrently=False)
+
+
+@needs_db
+def test_catalog_audit_matches_the_sql_audit(tmp_path):
+    psycopg = pytest.importorskip("psycopg")
+    (tmp_path / "0001_operational_tables.sql").write_text(TenantTemplate(TEMPLATE_DIR).files[0].text)
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id uuid PRIMARY KEY)")
+        conn.execute("DROP SCHEMA IF EXISTS org_indexaudit CASCADE")
+        with conn.transaction():
+            conn.execute(TenantTemplate(tmp_path).script("org_indexaudit"), prepare=False)
+    try:
+        indexes, writes = indexes_from_catalog(DSN, ["org_indexaudit"])
+        from_catalog = find_redundant(indexes, writes)
+        from_sql = find_redundant(indexes_from_sql((tmp_path / "0001_operational_tables.sql").read_text()))
+    finally:
+        with psycopg.connect(DSN, autocommit=True) as conn:
+            conn.execute("DROP SCHEMA org_indexaudit CASCADE")
+
+    assert {(f.index.name, f.kind) for f in from_catalog} == {(f.index.name, f.kind) for f in from_sql}
+    assert all(f.index.size_bytes and f.table_writes == 0 for f in from_catalog)
@@ -0,0 +1,111 @@
+from pathlib import Path
+
+import pytest
+
+from app.services.lock_analyzer import ERROR, MIGRATIONS_DIR, WARNING, analyze_paths, analyze_sql
+from app.services.migrations import MigrationError, MigrationRunner
+from app.services.tenant_template import TEMPLATE_DIR
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def summary(script, **options):
+    return [(f.line, f.table, f.lock, f.severity) for f in analyze_sql(script, **options)]
+
+
+def test_blocking_statements_on_hot_tables_are_flagged():
+    script = """
+CREATE INDEX orders_status_idx ON orders (status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_date_idx ON reflex.sales (sale_date);
+ALTER TABLE orders ADD CONSTRAINT orders_table_fk FOREIGN KEY (table_id) REFERENCES tables (id);
+ALTER TABLE orders ADD CONSTRAINT orders_table_fk2 FOREIGN KEY (table_id) REFERENCES tables (id) NOT VALID;
+ALTER TABLE orders VALIDATE CONSTRAINT orders_table_fk2;
+ALTER TABLE products ADD COLUMN sku text, ALTER COLUMN price TYPE numeric(12, 2);
+ALTER TABLE stock_movements ADD CONSTRAINT positive CHECK (quantity > 0);
+DROP INDEX orders_status_idx;
+ALTER TABLE settings ADD COLUMN theme text;
+-- lock-check: allow
+CREATE INDEX sales_total_idx ON sales (total);
+"""
+
+    assert summary(script) == [
+        (2, "orders", "SHARE", ERROR),
+        (4, "orders, tables", "SHARE ROW EXCLUSIVE", ERROR),
+        (7, "products", "ACCESS EXCLUSIVE", WARNING),
+        (7, "products", "ACCESS EXCLUSIVE", ERROR),
+        (8, "stock_movements", "ACCESS EXCLUSIVE", ERROR),
+        (9, "orders", "ACCESS EXCLUSIVE", ERROR),
+    ]
+    assert summary("ALTER TABLE settings ADD COLUMN theme text;", all_tables=True) == [
+        (1, "settings", "ACCESS EXCLUSIVE", WARNING)
+    ]
+
+
+def test_tables_created_in_the_same_file_are_exempt():
+    script = "CREATE TABLE orders (id int, status text);\nCREATE INDEX orders_status_idx ON orders (status);\n"
+
+    assert summary(script) == []
+    assert summary(script, assume_existing=True) == [(2, "orders", "SHARE", ERROR)]
+
+
+def test_foreign_keys_from_a_new_table_do_not_flag_the_referenced_table():
+    script = """
+CREATE TABLE stock_checkpoints (id uuid PRIMARY KEY, product_id uuid NOT NULL);
+ALTER TABLE stock_checkpoints ADD CONSTRAINT stock_checkpoints_product_id_fkey
+    FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE;
+ALTER TABLE orders ADD CONSTRAINT orders_product_fk FOREIGN KEY (product_id) REFERENCES products (id);
+"""
+
+    assert summary(script) == [(5, "orders, products", "SHARE ROW EXCLUSIVE", ERROR)]
+    assert summary(script, assume_existing=True) == [
+        (3, "products", "SHARE ROW EXCLUSIVE", ERROR),
+        (5, "orders, products", "SHARE ROW EXCLUSIVE", ERROR),
+    ]
+
+
+def test_scans_after_create_trigger_in_the_same_transaction_are_errors():
+    script = """
+CREATE TABLE sales_daily (company_id uuid, total numeric);
+CREATE TRIGGER sales_daily_insert AFTER INSERT ON sales FOR EACH STATEMENT EXECUTE FUNCTION f();
+CREATE TRIGGER sales_daily_ignored AFTER INSERT ON sales_daily FOR EACH STATEMENT EXECUTE FUNCTION f();
+SELECT set_config('search_path', 'org_x', true);
+INSERT INTO sales_daily SELECT company_id, sum(total) FROM sales GROUP BY 1;
+"""
+
+    assert summary(script) == [
+        (3, "sales", "SHARE ROW EXCLUSIVE", WARNING),
+        (6, "sales", "SHARE ROW EXCLUSIVE", ERROR),
+    ]
+    # Outside a transaction each statement commits, releasing the trigger's lock.
+    assert summary("-- migrate: no-transaction\n" + script) == [(4, "sales", "SHARE ROW EXCLUSIVE", WARNING)]
+
+
+def test_repo_migrations_are_clean_and_schema_dump_is_audited():
+    assert [f for f in analyze_paths([MIGRATIONS_DIR]) if f.severity == ERROR] == []
+
+    findings = analyze_paths([ROOT / "schema.sql"], assume_existing=True)
+    flagged = {(f.table, f.lock) for f in findings}
+    assert ("orders", "SHARE") in flagged
+    assert ("sales", "SHARE") in flagged
+    assert ("orders, tables", "SHARE ROW EXCLUSIVE") in flagged
+
+
+def test_tenant_template_is_clean_and_drops_resolve_across_files(tmp_path):
+    assert [f for f in analyze_paths([TEMPLATE_DIR]) if f.severity == ERROR] == []
+
+    (tmp_path / "0001_orders.sql").write_text(
+        "CREATE TABLE orders (id int, status text);\nCREATE INDEX orders_status_idx ON orders (status);\n"
+    )
+    (tmp_path / "0002_drop.sql").write_text("DROP INDEX orders_status_idx;\n")
+
+    assert [(f.line, f.table, f.lock) for f in analyze_paths([tmp_path])] == [
+        (1, "orders", "ACCESS EXCLUSIVE")
+    ]
+
+
+def test_runner_refuses_pending_files_with_unsafe_locks(tmp_path):
+    (tmp_path / "0001_orders_status.sql").write_text("CREATE INDEX orders_status_idx ON reflex.orders (status);\n")
+    runner = MigrationRunner(dsn="postgresql://unused", directory=tmp_path)
+
+    with pytest.raises(MigrationError, match="0001_orders_status:1 SHARE on orders"):
+        runner.check_locks(runner.pending({}))
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from app.services.tenant_template import TEMPLATE_DIR, tenant_script
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+MIGRATION = TEMPLATE_DIR.parent / "migrations" / "0004_low_stock.sql"
+SCHEMA = "org_lowstocktest"
+
+
+@pytest.fixture
+def stock_db():
+    psycopg = pytest.importorskip("psycopg")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS reflex")
+        conn.execute(MIGRATION.read_text())
+        with conn.transaction():
+            conn.execute(tenant_script(SCHEMA), prepare=False)
+        owner, company = uuid.uuid4(), uuid.uuid4()
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.execute("INSERT INTO auth.users (id) VALUES (%s)", [owner])
+        conn.execute(
+            "INSERT INTO companies (id, name, slug, owner_id) VALUES (%s, 'Bar', %s, %s)",
+            [company, f"bar-{company}", owner],
+        )
+        products = {
+            name: conn.execute(
+                "INSERT INTO products (company_id, name, category, unit, stock, min_stock)"
+                " VALUES (%s, %s, 'ingredient', 'un', %s, %s) RETURNING id",
+                [company, name, stock, min_stock],
+            ).fetchone()[0]
+            for name, stock, min_stock in [("Gelo", 20, 5), ("Limão", 3, 5), ("Sal", 0, 0)]
+        }
+    yield psycopg, company, products
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+@needs_db
+def test_stock_updates_maintain_the_low_stock_set_and_emit_crossings(stock_db):
+    psycopg, company, products = stock_db
+    from app.services.postgres_backend import PostgresClient
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        listener = client.listen_stock_alerts()
+        first_notify = asyncio.ensure_future(listener.__anext__())
+        await asyncio.sleep(0.2)
+        try:
+            initial = await client.get_stock_alerts(SCHEMA)
+            async with await psycopg.AsyncConnection.connect(DSN) as conn:
+                await conn.execute(f"SET search_path TO {SCHEMA}, public")
+                # Ice drops below its minimum, lime is restocked above it. Writers
+                # update the stock and log the movement; logging must not move
+                # the stock a second time.
+                await conn.execute(
+                    "UPDATE products SET stock = stock + CASE WHEN id = %s THEN -16 ELSE 7 END"
+                    " WHERE id IN (%s, %s)",
+                    [products["Gelo"], products["Gelo"], products["Limão"]],
+                )
+                await conn.execute(
+                    "INSERT INTO stock_movements (company_id, product_id, movement_type, quantity)"
+                    " VALUES (%s, %s, 'sale', -10), (%s, %s, 'sale', -6), (%s, %s, 'production_in', 7)",
+                    [company, products["Gelo"], company, products["Gelo"], company, products["Limão"]],
+                )
+                await conn.commit()
+            notify = await asyncio.wait_for(first_notify, 5)
+            alerts = await client.get_stock_alerts(SCHEMA, after_id=initial[-1]["id"])
+            items = await client.get_low_stock_items(SCHEMA, str(company))
+            return initial, notify, alerts, items
+        finally:
+            await listener.aclose()
+            await client.aclose()
+
+    initial, notify, alerts, items = asyncio.run(scenario())
+
+    # Lime was created below its minimum; salt has no minimum to cross.
+    assert [(a["product_id"], a["kind"]) for a in initial] == [(str(products["Limão"]), "low")]
+    assert {a["product_id"]: (a["kind"], a["stock"]) for a in alerts} == {
+        str(products["Gelo"]): ("low", 4),
+        str(products["Limão"]): ("restored", 10),
+    }
+    assert notify == {"schema": SCHEMA, "last_id": alerts[-1]["id"]}
+    assert [(item["name"], item["stock"], item["min_stock"]) for item in items] == [("Gelo", 4, 5)]
+
+    with psycopg.connect(DSN) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        assert conn.execute("SELECT low_stock_items FROM company_kpis").fetchone()[0] == 1
+        conn.execute("SET enable_seqscan = off")
+        plan = "\n".join(
+            row[0]
+            for row in conn.execute(
+                "EXPLAIN SELECT id FROM products WHERE company_id = %s"
+                " AND is_active AND min_stock > 0 AND stock <= min_stock",
+                [company],
+            ).fetchall()
+        )
+    assert "idx_products_low_stock" in plan
@@ -0,0 +1,140 @@
+import os
+import threading
+
+import pytest
+
+from app.services.migrations import MigrationError, MigrationRunner, uses_transaction
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+def test_edited_migrations_are_refused(tmp_path):
+    (tmp_path / "0001_items.sql").write_text("CREATE TABLE items (id int);\n")
+    (tmp_path / "0002_index.sql").write_text(
+        "-- migrate: no-transaction\nCREATE INDEX CONCURRENTLY IF NOT EXISTS items_id_idx ON items (id);\n"
+    )
+    runner = MigrationRunner(dsn="postgresql://unused", directory=tmp_path)
+    first, second = runner.files
+
+    assert runner.pending({1: first.checksum}) == [second]
+    assert (uses_transaction(first), uses_transaction(second)) == (True, False)
+    with pytest.raises(MigrationError, match="0001_items"):
+        runner.pending({1: "stale"})
+
+
+@pytest.fixture
+def migration_db(tmp_path):
+    psycopg = pytest.importorskip("psycopg")
+
+    def cleanup(conn):
+        conn.execute("DROP EVENT TRIGGER IF EXISTS migtest_ddl_log")
+        conn.execute("DROP SCHEMA IF EXISTS migtest_app CASCADE")
+        conn.execute("DROP SCHEMA IF EXISTS migtest_ddl CASCADE")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        cleanup(conn)
+    (tmp_path / "0001_items.sql").write_text(
+        "CREATE SCHEMA IF NOT EXISTS migtest_app;\n"
+        "CREATE TABLE migtest_app.items (id int PRIMARY KEY, note text);\n"
+    )
+    (tmp_path / "0002_items_note_idx.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_note_idx ON migtest_app.items (note);\n"
+    )
+    yield psycopg, tmp_path
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        cleanup(conn)
+
+
+def runner(directory, **options):
+    return MigrationRunner(DSN, directory=directory, schema="migtest_app", retry_delay=0.01, **options)
+
+
+@needs_db
+def test_runner_applies_once_and_cold_starts_issue_no_ddl(migration_db):
+    psycopg, directory = migration_db
+
+    applied = runner(directory).run()
+
+    assert [(result["version"], result["status"]) for result in applied] == [(1, "applied"), (2, "applied")]
+    assert [timing["statement"] for timing in applied[0]["statements"]] == [
+        "CREATE SCHEMA IF NOT EXISTS migtest_app",
+        "CREATE TABLE migtest_app.items (id int PRIMARY KEY, note text)",
+    ]
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("CREATE SCHEMA migtest_ddl")
+        conn.execute("CREATE TABLE migtest_ddl.log (tag text)")
+        conn.execute(
+            "CREATE FUNCTION migtest_ddl.log_ddl() RETURNS event_trigger LANGUAGE plpgsql AS "
+            "$$ BEGIN INSERT INTO migtest_ddl.log VALUES (tg_tag); END $$"
+        )
+        conn.execute(
+            "CREATE EVENT TRIGGER migtest_ddl_log ON ddl_command_start "
+            "EXECUTE FUNCTION migtest_ddl.log_ddl()"
+        )
+
+    assert runner(directory).run() == []
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("DROP EVENT TRIGGER migtest_ddl_log")
+        ddl = conn.execute("SELECT tag FROM migtest_ddl.log").fetchall()
+        ledger = conn.execute(
+            "SELECT version, jsonb_array_length(statement_timings) FROM migtest_app.schema_migrations ORDER BY 1"
+        ).fetchall()
+    assert ddl == []
+    assert ledger == [(1, 2), (2, 1)]
+
+
+@needs_db
+def test_lock_timeout_retries_then_fails_without_recording(migration_db):
+    psycopg, directory = migration_db
+    runner(directory).run()
+    (directory / "0003_items_flag.sql").write_text(
+        "ALTER TABLE migtest_app.items ADD COLUMN flag boolean;\n"
+    )
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with psycopg.connect(DSN) as conn:
+            conn.execute("LOCK TABLE migtest_app.items IN ACCESS SHARE MODE")
+            locked.set()
+            release.wait(10)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait(5)
+    try:
+        with pytest.raises(psycopg.errors.LockNotAvailable):
+            runner(directory, lock_timeout_ms=50, lock_retries=2).run()
+    finally:
+        release.set()
+        holder.join()
+
+    [result] = runner(directory).run()
+
+    assert (result["version"], result["status"]) == (3, "applied")
+
+
+@needs_db
+def test_invalid_index_from_an_interrupted_build_is_rebuilt(migration_db):
+    psycopg, directory = migration_db
+    runner(directory).run()
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("INSERT INTO migtest_app.items VALUES (1, 'a'), (2, 'a')")
+        with pytest.raises(psycopg.errors.UniqueViolation):
+            conn.execute("CREATE UNIQUE INDEX CONCURRENTLY items_upper_note_idx ON migtest_app.items (note)")
+    (directory / "0003_items_upper_note_idx.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_upper_note_idx ON migtest_app.items (upper(note));\n"
+    )
+
+    [result] = runner(directory).run()
+
+    assert (result["version"], result["status"]) == (3, "applied")
+    with psycopg.connect(DSN) as conn:
+        assert conn.execute(
+            "SELECT indisvalid, indisunique FROM pg_index"
+            " WHERE indexrelid = 'migtest_app.items_upper_note_idx'::regclass"
+        ).fetchone() == (True, False)
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from app.services.tenant_template import TEMPLATE_DIR, tenant_script
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+MIGRATION = TEMPLATE_DIR.parent / "migrations" / "0005_close_order.sql"
+SCHEMA = "org_closetest"
+
+
+@pytest.fixture
+def order_db():
+    psycopg = pytest.importorskip("psycopg")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS reflex")
+        conn.execute(MIGRATION.read_text())
+        with conn.transaction():
+            conn.execute(tenant_script(SCHEMA), prepare=False)
+        owner, company = uuid.uuid4(), uuid.uuid4()
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.execute("INSERT INTO auth.users (id) VALUES (%s)", [owner])
+        conn.execute(
+            "INSERT INTO companies (id, name, slug, owner_id) VALUES (%s, 'Bar', %s, %s)",
+            [company, f"bar-{company}", owner],
+        )
+        products = {
+            name: conn.execute(
+                "INSERT INTO products (company_id, name, category, unit, stock, price)"
+                " VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                [company, name, category, unit, stock, price],
+            ).fetchone()[0]
+            for name, category, unit, stock, price in [
+                ("Cerveja", "drink", "un", 100, 10),
+                ("Caipirinha", "drink", "un", 0, 20),
+                ("Cachaça", "ingredient", "l", 2, 0),
+                ("Limão", "ingredient", "un", 30, 0),
+                ("Açúcar", "ingredient", "kg", 1, 0),
+            ]
+        }
+        recipe = conn.execute(
+            "INSERT INTO recipes (company_id, product_id, name, yield_unit)"
+            " VALUES (%s, %s, 'Caipirinha', 'un') RETURNING id",
+            [company, products["Caipirinha"]],
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO recipe_ingredients (recipe_id, product_id, quantity, unit) VALUES"
+            " (%s, %s, 50, 'ml'), (%s, %s, 1, 'un'), (%s, %s, 20, 'g')",
+            [recipe, products["Cachaça"], recipe, products["Limão"], recipe, products["Açúcar"]],
+        )
+    yield psycopg, company, products
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+def open_order(conn, company, products, items, *, table_number=None):
+    table = None
+    if table_number is not None:
+        table = conn.execute(
+            "INSERT INTO tables (company_id, number, name, status) VALUES (%s, %s, %s, 'occupied') RETURNING id",
+            [company, table_number, f"Mesa {table_number}"],
+        ).fetchone()[0]
+    order = conn.execute(
+        "INSERT INTO orders (company_id, table_id) VALUES (%s, %s) RETURNING id", [company, table]
+    ).fetchone()[0]
+    if table is not None:
+        conn.execute("UPDATE tables SET current_order_id = %s WHERE id = %s", [order, table])
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO order_items (order_id, product_id, quantity, unit_price, subtotal, status)"
+            " VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (order, products[name], quantity, price, quantity * price, status)
+                for name, quantity, price, status in items
+            ],
+        )
+    return order
+
+
+def stock(conn, products):
+    rows = conn.execute(f"SELECT id, stock FROM {SCHEMA}.products").fetchall()
+    by_id = {row[0]: float(row[1]) for row in rows}
+    return {name: by_id[product] for name, product in products.items()}
+
+
+@needs_db
+def test_close_order_records_the_sale_and_explodes_recipes(order_db):
+    psycopg, company, products = order_db
+    from app.services.postgres_backend import PostgresClient
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        order = open_order(
+            conn,
+            company,
+            products,
+            [
+                ("Cerveja", 2, 10, "delivered"),
+                ("Cerveja", 1, 10, "delivered"),
+                ("Caipirinha", 2, 20, "delivered"),
+                ("Cerveja", 5, 10, "cancelled"),
+            ],
+            table_number=1,
+        )
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        try:
+            first = await client.close_order(SCHEMA, str(order), "pix")
+            again = await client.close_order(SCHEMA, str(order), "pix")
+            return first, again
+        finally:
+            await client.aclose()
+
+    first, again = asyncio.run(scenario())
+
+    assert first["total"] == 70
+    assert (first["stock_movements"], first["products_deducted"], first["tables_freed"]) == (4, 4, 1)
+    assert again is None
+    with psycopg.connect(DSN) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        assert stock(conn, products) == {
+            "Cerveja": 97,
+            "Caipirinha": 0,
+            "Cachaça": 1.9,
+            "Limão": 28,
+            "Açúcar": 0.96,
+        }
+        sale = conn.execute("SELECT id, total, payment_method FROM sales WHERE order_id = %s", [order]).fetchone()
+        assert (str(sale[0]), float(sale[1]), sale[2]) == (first["sale_id"], 70, "pix")
+        assert conn.execute("SELECT status, closed_at IS NOT NULL FROM orders").fetchone() == ("closed", True)
+        assert conn.execute("SELECT status, current_order_id FROM tables").fetchone() == ("available", None)
+        assert conn.execute(
+            "SELECT count(*) FROM stock_movements WHERE movement_type = 'sale' AND related_order_id = %s",
+            [order],
+        ).fetchone()[0] == 4
+
+
+@needs_db
+def test_concurrent_closes_on_the_same_products_do_not_deadlock(order_db):
+    psycopg, company, products = order_db
+    from app.services.postgres_backend import PostgresClient
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        # Same products, listed in opposite orders.
+        orders = [
+            open_order(
+                conn,
+                company,
+                products,
+                [("Cerveja", 1, 10, "pending"), ("Caipirinha", 1, 20, "pending")][:: 1 if index % 2 else -1],
+            )
+            for index in range(8)
+        ]
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        try:
+            return await asyncio.gather(*(client.close_order(SCHEMA, str(order), "cash") for order in orders))
+        finally:
+            await client.aclose()
+
+    closed = asyncio.run(scenario())
+
+    assert all(result["total"] == 30 for result in closed)
+    with psycopg.connect(DSN) as conn:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        assert stock(conn, products) == {
+            "Cerveja": 92,
+            "Caipirinha": 0,
+            "Cachaça": 1.6,
+            "Limão": 22,
+            "Açúcar": 0.84,
+        }
+        assert conn.execute("SELECT sales_count, total FROM sales_daily").fetchone() == (8, 240)
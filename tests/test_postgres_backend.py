@@ -0,0 +1,169 @@
+"""Integration tests for the psycopg backend; set TEST_DATABASE_URL to run them."""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from app.services.postgres_backend import PostgresClient  # noqa: E402
+
+DSN = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+TABLES = """
+CREATE TABLE users (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL UNIQUE,
+    tax_number TEXT NOT NULL UNIQUE,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    birth_date DATE NOT NULL,
+    country TEXT NOT NULL,
+    postal_code TEXT NOT NULL,
+    house_number TEXT NOT NULL,
+    is_owner BOOLEAN DEFAULT false NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+CREATE TABLE boteco (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    public_name TEXT NOT NULL,
+    username TEXT NOT NULL UNIQUE,
+    service_category TEXT NOT NULL,
+    vibe_tags TEXT[],
+    country TEXT NOT NULL,
+    postal_code TEXT NOT NULL,
+    owner_tax_number TEXT NOT NULL UNIQUE,
+    created_by_email TEXT NOT NULL,
+    created_by_user_id UUID REFERENCES users (id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+CREATE TABLE user_boteco (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    boteco_id UUID NOT NULL REFERENCES boteco (id) ON DELETE CASCADE,
+    assigned_role TEXT DEFAULT 'owner' NOT NULL,
+    plan TEXT NOT NULL CHECK (plan IN ('boteco', 'boteco_pro', 'boteco_patrao', 'boteco_babadeiro')),
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+"""
+
+USER = {
+    "email": "ana@boteco.pt",
+    "username": "ana.silva1234",
+    "tax_number": "12345678901",
+    "first_name": "Ana",
+    "last_name": "Silva",
+    "birth_date": "1990-05-01",
+    "country": "Brasil",
+    "postal_code": "12345678",
+    "house_number": "10",
+    "is_owner": True,
+}
+
+
+@pytest.fixture
+def schema():
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f'CREATE SCHEMA "{name}"')
+        conn.execute(f'SET search_path TO "{name}"')
+        conn.execute(TABLES)
+    yield name
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f'DROP SCHEMA "{name}" CASCADE')
+
+
+def test_postgres_backend_matches_supabase_client_contract(schema):
+    async def scenario():
+        client = PostgresClient(DSN, schema=schema, cache=False)
+        try:
+            created = await client.upsert_user(USER)
+            user_id = created[0]["id"]
+            boteco_res, link_res = await client.create_boteco_and_associate_user(
+                {
+                    "public_name": "Bar da Ana",
+                    "username": "bar_da_ana",
+                    "service_category": "bar",
+                    "vibe_tags": ["samba"],
+                    "country": "Brasil",
+                    "postal_code": "12345678",
+                    "owner_tax_number": "12345678000199",
+                    "created_by_email": USER["email"],
+                    "created_by_user_id": user_id,
+                },
+                {"user_id": user_id, "assigned_role": "owner", "plan": "boteco_pro"},
+            )
+            session = await client.bootstrap_session(USER["email"])
+            has_boteco = await client.check_user_has_boteco(user_id)
+            return user_id, boteco_res, link_res, session, has_boteco
+        finally:
+            await client.aclose()
+
+    user_id, boteco_res, link_res, session, has_boteco = asyncio.run(scenario())
+
+    assert isinstance(user_id, str)
+    assert link_res.data[0]["boteco_id"] == boteco_res.data[0]["id"]
+    assert session["user"]["birth_date"] == "1990-05-01"
+    assert session["has_boteco"] is True
+    assert session["plan"] == "boteco_pro"
+    assert session["boteco"]["username"] == "bar_da_ana"
+    assert has_boteco is True
+
+
+def test_postgres_backend_rolls_back_boteco_when_link_fails(schema):
+    async def scenario():
+        client = PostgresClient(DSN, schema=schema, cache=False)
+        try:
+            user_id = (await client.upsert_user(USER))[0]["id"]
+            with pytest.raises(psycopg.errors.CheckViolation):
+                await client.create_boteco_and_associate_user(
+                    {
+                        "public_name": "Bar",
+                        "username": "bar",
+                        "service_category": "bar",
+                        "country": "Brasil",
+                        "postal_code": "12345678",
+                        "owner_tax_number": "1",
+                        "created_by_email": USER["email"],
+                    },
+                    {"user_id": user_id, "plan": "not-a-plan"},
+                )
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+    with psycopg.connect(DSN) as conn:
+        assert conn.execute(f'SELECT count(*) FROM "{schema}".boteco').fetchone()[0] == 0
+
+
+def test_postgres_backend_bulk_upsert_is_one_statement_per_chunk(schema):
+    rows = [
+        {**USER, "email": f"u{n}@boteco.pt", "username": f"u.{n}", "tax_number": f"{n:011d}"}
+        for n in range(1, 6)
+    ]
+    rows[2].pop("is_owner")  # falls back to the column default
+
+    async def scenario():
+        client = PostgresClient(DSN, schema=schema, cache=False)
+        try:
+            first = await client.upsert_users_bulk(rows, chunk_size=2)
+            second = await client.upsert_users_bulk([{**rows[0], "first_name": "Beatriz"}])
+            return first, second
+        finally:
+            await client.aclose()
+
+    first, second = asyncio.run(scenario())
+
+    assert first["stats"]["upserted"] == 5
+    assert first["stats"]["requests"] == 3
+    assert second["results"][0]["id"] == first["results"][0]["id"]
+    with psycopg.connect(DSN) as conn:
+        assert conn.execute(f'SELECT count(*) FROM "{schema}".users').fetchone()[0] == 5
+        assert conn.execute(
+            f'SELECT first_name FROM "{schema}".users WHERE email = %s', ["u1@boteco.pt"]
+        ).fetchone()[0] == "Beatriz"
@@ -0,0 +1,121 @@
+import asyncio
+
+import httpx
+
+import app.api.provision as provision
+from app.services import provisioning, sql_executor
+from app.services.postgres_backend import PostgresClient
+from app.services.supabase_admin import SupabaseAdmin
+
+
+def make_admin(fake_supabase, handler):
+    backend = fake_supabase(handler)
+    factories = []
+
+    def factory() -> httpx.AsyncClient:
+        factories.append(1)
+        return httpx.AsyncClient(transport=httpx.MockTransport(backend))
+
+    admin = SupabaseAdmin(url="http://supabase.test", key="service-key", http_client_factory=factory)
+    return backend, admin, factories
+
+
+def call(admin, monkeypatch, method, path, times=1, **kwargs):
+    monkeypatch.setattr(provision, "supabase_admin", admin)
+    monkeypatch.setattr(sql_executor, "supabase_admin", admin)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=provision.api_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+            return await asyncio.gather(
+                *(client.request(method, path, **kwargs) for _ in range(times))
+            )
+
+    return asyncio.run(scenario())
+
+
+def test_provision_route_reuses_one_admin_client(fake_supabase, monkeypatch):
+    backend, admin, factories = make_admin(fake_supabase, lambda request: None)
+
+    responses = call(
+        admin, monkeypatch, "POST", "/api/provision_org", json={"boteco_username": "bar_do_ze"}, times=20
+    )
+
+    assert [response.status_code for response in responses] == [200] * 20
+    assert len(backend.requests) == 20
+    assert backend.requests[0].url.path == "/rest/v1/rpc/execute_sql"
+    script = fake_supabase.body(backend.requests[0])["sql_command"]
+    assert script.startswith('CREATE SCHEMA "org_bar_do_ze";')
+    assert "CREATE TABLE orders" in script
+    assert admin.connects == 1
+    assert len(factories) == 1
+
+
+def test_provision_route_reconnects_after_transport_error(fake_supabase, monkeypatch):
+    failures = [httpx.ConnectError("connection reset")]
+
+    def handler(request: httpx.Request):
+        if failures:
+            raise failures.pop()
+        return None
+
+    backend, admin, factories = make_admin(fake_supabase, handler)
+
+    [response] = call(
+        admin, monkeypatch, "POST", "/api/provision_org", json={"boteco_username": "bar_do_ze"}
+    )
+
+    assert response.status_code == 200
+    assert admin.reconnects == 1
+    assert len(factories) == 2
+
+
+def test_provision_route_rejects_invalid_username(fake_supabase, monkeypatch):
+    backend, admin, _ = make_admin(fake_supabase, lambda request: None)
+
+    [response] = call(admin, monkeypatch, "POST", "/api/provision_org", json={"boteco_username": "x; drop"})
+
+    assert response.status_code == 400
+    assert backend.requests == []
+
+
+def test_health_route_reconnects_when_ping_fails(fake_supabase, monkeypatch):
+    backend, admin, factories = make_admin(fake_supabase, lambda request: httpx.Response(503))
+
+    [response] = call(admin, monkeypatch, "GET", "/api/health")
+
+    assert response.status_code == 503
+    assert response.json()["supabase_admin"]["ok"] is False
+    assert admin.reconnects == 1
+
+
+def test_provision_org_runs_in_process_without_loopback(fake_supabase):
+    backend, admin, _ = make_admin(fake_supabase, lambda request: None)
+
+    schema = asyncio.run(provisioning.provision_org("bar_do_ze", admin=admin))
+
+    assert schema == "org_bar_do_ze"
+    assert [str(request.url) for request in backend.requests] == [
+        "http://supabase.test/rest/v1/rpc/execute_sql"
+    ]
+
+
+def test_provision_org_uses_postgres_pool_for_postgres_backend(fake_supabase):
+    backend, admin, _ = make_admin(fake_supabase, lambda request: None)
+    storage = PostgresClient("postgresql://unused", cache=False)
+    executed = []
+
+    class Connection:
+        async def execute(self, query, *args, **kwargs):
+            executed.append(query)
+
+    async def run(work, **options):
+        return await work(Connection())
+
+    storage._run = run
+
+    asyncio.run(provisioning.provision_org("bar_do_ze", storage=storage, admin=admin))
+
+    assert len(executed) == 1
+    assert executed[0].startswith('CREATE SCHEMA "org_bar_do_ze";')
+    assert backend.requests == []
@@ -0,0 +1,295 @@
+import asyncio
+import fnmatch
+import time
+
+import httpx
+import pytest
+
+import app.api.provision as provision
+from app.services.provisioning_jobs import (
+    FAILED,
+    QUEUED,
+    SUCCEEDED,
+    MemoryJobStore,
+    ProvisioningJobs,
+    RedisJobStore,
+)
+
+
+class FakeRedis:
+    """Just the string, list and sorted set commands the job store uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+        self.zsets = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def blmove(self, src_key, dest_key, timeout, src="RIGHT", dest="LEFT"):
+        items = self.lists.get(src_key)
+        if not items:
+            return None
+        value = items.pop()
+        self.lists.setdefault(dest_key, []).insert(0, value)
+        return value
+
+    async def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def eval(self, script, numkeys, scheduled_key, queue_key, now, limit):
+        # The store's only script: move due members of the zset onto the list.
+        scheduled = self.zsets.get(scheduled_key, {})
+        due = sorted((score, member) for member, score in scheduled.items() if score <= now)[:limit]
+        for _, member in due:
+            del scheduled[member]
+            await self.lpush(queue_key, member)
+        return len(due)
+
+
+class DummyStorage:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_boteco(self, boteco_id):
+        self.deleted.append(boteco_id)
+
+
+async def drain(jobs, job_ids):
+    runner = asyncio.create_task(jobs.run())
+    try:
+        while True:
+            states = [await jobs.get(job_id) for job_id in job_ids]
+            if all(state["status"] in (SUCCEEDED, FAILED) for state in states):
+                return states
+            await asyncio.sleep(0.01)
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+
+def test_worker_pool_runs_jobs_with_bounded_concurrency():
+    active = 0
+    peak = 0
+
+    async def provision(username):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=MemoryJobStore(), provision=provision, concurrency=3)
+        queued = [await jobs.enqueue(f"bar_{n}") for n in range(10)]
+        assert {job["status"] for job in queued} == {QUEUED}
+        return await drain(jobs, [job["id"] for job in queued])
+
+    states = asyncio.run(scenario())
+
+    assert [state["status"] for state in states] == [SUCCEEDED] * 10
+    assert peak == 3
+
+
+def test_failed_job_is_retried_then_rolls_back_the_boteco():
+    calls = []
+
+    async def provision(username):
+        calls.append(username)
+        raise RuntimeError("database unavailable")
+
+    storage = DummyStorage()
+
+    async def scenario():
+        jobs = ProvisioningJobs(
+            store=MemoryJobStore(),
+            provision=provision,
+            storage=storage,
+            max_attempts=2,
+            backoff=0,
+            schedule_interval=0.01,
+        )
+        job = await jobs.enqueue("bar_do_ze", boteco_id="boteco-1")
+        return await drain(jobs, [job["id"]])
+
+    [state] = asyncio.run(scenario())
+
+    assert state["status"] == FAILED
+    assert state["attempts"] == 2
+    assert state["error"] == "database unavailable"
+    assert calls == ["bar_do_ze", "bar_do_ze"]
+    assert storage.deleted == ["boteco-1"]
+
+
+def test_failed_rollback_still_marks_the_job_failed():
+    class BrokenStorage:
+        async def delete_boteco(self, boteco_id):
+            raise RuntimeError("storage unavailable")
+
+    async def provision(username):
+        raise RuntimeError("database unavailable")
+
+    redis = FakeRedis()
+    store = RedisJobStore(redis)
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=store, provision=provision, storage=BrokenStorage(), max_attempts=1)
+        await jobs.enqueue("bar_do_ze", boteco_id="boteco-1")
+        return await jobs.process(await store.claim(timeout=0))
+
+    state = asyncio.run(scenario())
+
+    assert (state["status"], state["error"]) == (FAILED, "database unavailable")
+    assert state["rollback_error"] == "storage unavailable"
+    assert redis.lists[store.processing_key] == []
+
+
+def test_running_job_is_kept_alive_past_its_lease():
+    redis = FakeRedis()
+    store = RedisJobStore(redis)
+    release = asyncio.Event()
+
+    async def provision(username):
+        await release.wait()
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=store, provision=provision, lease=0.06)
+        job = await jobs.enqueue("bar_do_ze")
+        running = asyncio.create_task(jobs.process(await store.claim(timeout=0)))
+        await asyncio.sleep(0.2)
+        requeued = await store.requeue_stale(lease=jobs.lease)
+        release.set()
+        return job, requeued, await running
+
+    job, requeued, state = asyncio.run(scenario())
+
+    assert requeued == 0
+    assert state["status"] == SUCCEEDED
+    assert state["attempts"] == 1
+    assert redis.lists.get(store.queue_key, []) == []
+
+
+def test_redis_store_acks_finished_jobs_and_requeues_stale_ones():
+    redis = FakeRedis()
+    store = RedisJobStore(redis)
+
+    async def provision(username):
+        return None
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=store, provision=provision)
+        done = await jobs.enqueue("bar_a")
+        stale = await jobs.enqueue("bar_b")
+        await jobs.process(await store.claim(timeout=0))
+        # A worker claimed bar_b and died without updating it.
+        assert await store.claim(timeout=0) == stale["id"]
+        record = await store.load(stale["id"])
+        await store.save({**record, "status": "running", "updated_at": time.time() - 600})
+        requeued = await store.requeue_stale(lease=300)
+        return done, stale, requeued
+
+    done, stale, requeued = asyncio.run(scenario())
+
+    assert requeued == 1
+    assert redis.lists[store.queue_key] == [stale["id"]]
+    assert redis.lists[store.processing_key] == []
+    assert fnmatch.filter(redis.values, "provisioning:job:*") == [
+        f"provisioning:job:{done['id']}",
+        f"provisioning:job:{stale['id']}",
+    ]
+
+
+def test_retry_waits_in_the_scheduled_set_instead_of_a_worker():
+    redis = FakeRedis()
+    store = RedisJobStore(redis)
+
+    async def provision(username):
+        raise RuntimeError("database unavailable")
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=store, provision=provision, max_attempts=3, backoff=30)
+        job = await jobs.enqueue("bar_do_ze")
+        started = time.monotonic()
+        await jobs.process(await store.claim(timeout=0))
+        elapsed = time.monotonic() - started
+        record = await store.load(job["id"])
+        # Nothing is due yet, and the reaper leaves a scheduled job alone.
+        early = await store.promote_due(now=record["not_before"] - 1)
+        await store.save({**record, "updated_at": time.time() - 600})
+        reaped = await store.requeue_stale(lease=300)
+        due = await store.promote_due(now=record["not_before"])
+        return job, record, elapsed, early, reaped, due
+
+    job, record, elapsed, early, reaped, due = asyncio.run(scenario())
+
+    assert elapsed < 1
+    assert record["status"] == QUEUED
+    assert record["not_before"] - record["updated_at"] == pytest.approx(30, abs=1)
+    assert (early, reaped, due) == (0, 0, 1)
+    assert redis.lists[store.queue_key] == [job["id"]]
+    assert redis.lists[store.processing_key] == []
+    assert redis.zsets[store.scheduled_key] == {}
+
+
+def test_retry_scheduled_by_a_worker_that_died_before_acking_is_not_lost():
+    redis = FakeRedis()
+    store = RedisJobStore(redis)
+
+    async def scenario():
+        jobs = ProvisioningJobs(store=store, provision=lambda username: asyncio.sleep(0))
+        job = await jobs.enqueue("bar_do_ze")
+        assert await store.claim(timeout=0) == job["id"]
+        await store.save({**job, "updated_at": time.time() - 600})
+        await store.schedule(job["id"], time.time())
+        reaped = await store.requeue_stale(lease=300)
+        return job, reaped, await store.promote_due()
+
+    job, reaped, due = asyncio.run(scenario())
+
+    assert (reaped, due) == (0, 1)
+    assert redis.lists[store.processing_key] == []
+    assert redis.lists[store.queue_key] == [job["id"]]
+
+
+def test_async_provision_request_returns_job_to_poll(monkeypatch):
+    jobs = ProvisioningJobs(store=MemoryJobStore(), provision=lambda username: asyncio.sleep(0))
+    monkeypatch.setattr(provision, "provisioning_jobs", jobs)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=provision.api_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+            created = await client.post(
+                "/api/provision_org",
+                json={"boteco_username": "bar_do_ze"},
+                headers={"Prefer": "respond-async"},
+            )
+            queued = await client.get(created.headers["location"])
+            missing = await client.get("/api/provision_org/unknown")
+            return created, queued, missing
+
+    created, queued, missing = asyncio.run(scenario())
+
+    assert created.status_code == 202
+    assert created.json()["schema"] == "org_bar_do_ze"
+    assert queued.json()["status"] == QUEUED
+    assert missing.status_code == 404
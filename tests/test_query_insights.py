@@ -0,0 +1,94 @@
+import inspect
+from dataclasses import replace
+from pathlib import Path
+
+from app.services.index_audit import SCHEMA_FILE, indexes_from_paths
+from app.services.query_insights import (
+    CLIENT_QUERIES,
+    build_report,
+    client_method,
+    diff,
+    load_snapshot,
+    parse_query,
+    rank,
+)
+from app.services.storage import StorageClient
+from app.services.supabase_client import SupabaseClient
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def snapshots():
+    return (
+        load_snapshot(FIXTURES / "pg_stat_statements_before.json"),
+        load_snapshot(FIXTURES / "pg_stat_statements_after.json"),
+    )
+
+
+def test_diff_subtracts_counters_and_handles_evictions_and_resets():
+    before, after = snapshots()
+
+    delta = {entry.queryid: entry for entry in diff(before, after)}
+
+    # 4001 was evicted, 4002 did not run in between.
+    assert 4001 not in delta and 4002 not in delta
+    assert (delta[2001].calls, delta[2001].total_ms, delta[2001].shared_blks_read) == (3000, 13500.0, 120000)
+    # 2005 was evicted and re-added: its counters restarted.
+    assert delta[2005].calls == 100
+    assert [entry.queryid for entry in rank(list(delta.values()), "reads", limit=3)] == [2001, 2002, 2003]
+    assert [entry.queryid for entry in rank(list(delta.values()), "mean", limit=1)] == [2002]
+
+    reset = diff(before, replace(after, stats_reset="2026-10-18T10:30:00+00:00"))
+    assert {entry.queryid: entry.calls for entry in reset}[2001] == 5000
+
+
+def test_statements_are_attributed_to_client_methods():
+    _, after = snapshots()
+    methods = {entry.queryid: client_method(parse_query(entry.query)) for entry in after.statements}
+
+    assert methods[1001] == "get_user_by_email"
+    assert methods[1002] == "bootstrap_session"
+    assert methods[1003] == "upsert_user"
+    assert methods[1004] == "create_boteco_and_associate_user"
+    assert methods[2001] is None
+    assert client_method(parse_query("DELETE FROM reflex.boteco WHERE id = $1 RETURNING *")) == "delete_boteco"
+    assert client_method(
+        parse_query("SELECT EXISTS (SELECT 1 FROM user_boteco WHERE user_id = $1) AS found")
+    ) == "check_user_has_boteco"
+    assert client_method(parse_query("SELECT reflex.dashboard_kpis($1) AS kpis")) == "get_dashboard_kpis"
+    assert client_method(
+        parse_query('SELECT "pgrst_call".* FROM "reflex"."stock_alerts"("tenant_schema" := $1) pgrst_call')
+    ) == "get_stock_alerts"
+    assert client_method(parse_query("SELECT reflex.close_order($1, $2, $3, $4) AS closed")) == "close_order"
+
+
+def test_every_client_query_method_is_attributed():
+    # upsert_users_bulk issues upsert_user's statement; the rest send no query of their own.
+    not_queries = {"aclose", "upsert_users_bulk"}
+    methods = {
+        name
+        for client in (StorageClient, SupabaseClient)
+        for name, member in inspect.getmembers(client, inspect.iscoroutinefunction)
+        if not name.startswith("_")
+    }
+
+    assert methods - not_queries <= {query.method for query in CLIENT_QUERIES}
+
+
+def test_report_suggests_missing_composite_indexes_only():
+    before, after = snapshots()
+
+    report = build_report(diff(before, after), limit=5, indexes=indexes_from_paths([SCHEMA_FILE]))
+
+    assert report["calls"] == 9252
+    assert report["top"][0]["queryid"] == 2001
+    assert report["top"][0]["share"] == 0.5358
+    assert report["by_method"]["upsert_user"] == {"calls": 30, "total_ms": 24.0}
+    # stock_movements (company_id, created_at) and tables (company_id, number) are already indexed.
+    assert [(s["table"], s["columns"]) for s in report["suggested_indexes"]] == [
+        ("orders", ["company_id", "status"]),
+        ("sales", ["company_id", "sale_date"]),
+    ]
+    assert report["suggested_indexes"][1]["statement"] == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_company_id_sale_date_idx ON sales (company_id, sale_date);"
+    )
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_resilience
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def no_sleep(delay):
+    return None
+
+
+def faulty_backend(fake_supabase, failures):
+    """Return a backend that answers 503 for the first ``failures`` requests."""
+
+    state = {"remaining": failures}
+
+    def handler(request: httpx.Request):
+        if state["remaining"] > 0:
+            state["remaining"] -= 1
+            return httpx.Response(503, text="upstream unavailable")
+        if request.method == "GET":
+            return [{"id": "user-1", "email": "ana@boteco.pt"}]
+        return [{"id": "user-1"}]
+
+    return fake_supabase(handler)
+
+
+def test_idempotent_reads_are_retried_with_backoff(fake_supabase):
+    backend = faulty_backend(fake_supabase, failures=2)
+    client = backend.client(cache=False, retry=RetryPolicy(attempts=3, sleep=no_sleep))
+
+    users = asyncio.run(client.get_user_by_email("ana@boteco.pt"))
+
+    assert users == [{"id": "user-1", "email": "ana@boteco.pt"}]
+    assert len(backend.requests) == 3
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_idempotent_writes_are_not_retried(fake_supabase):
+    backend = faulty_backend(fake_supabase, failures=1)
+    client = backend.client(cache=False, retry=RetryPolicy(attempts=3, sleep=no_sleep))
+
+    with pytest.raises(Exception):
+        asyncio.run(client.create_user({"email": "ana@boteco.pt"}))
+
+    assert len(backend.requests) == 1
+
+
+def test_breaker_fails_fast_then_closes_after_half_open_probe(fake_supabase):
+    clock = FakeClock()
+    backend = faulty_backend(fake_supabase, failures=2)
+    client = backend.client(
+        cache=False,
+        retry=RetryPolicy(attempts=1),
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock),
+    )
+
+    async def lookup():
+        return await client.get_user_by_email("ana@boteco.pt")
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            asyncio.run(lookup())
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(lookup())
+    assert len(backend.requests) == 2
+    assert client.health()["breaker"]["rejected"] == 1
+
+    clock.now = 10
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert asyncio.run(lookup()) == [{"id": "user-1", "email": "ana@boteco.pt"}]
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_half_open_probe_frees_its_slot():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+
+    async def cancelled():
+        raise asyncio.CancelledError
+
+    async def answered():
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(asyncio.CancelledError):
+            await call_with_resilience(cancelled, retry=None, breaker=breaker)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        return await call_with_resilience(answered, retry=None, breaker=breaker)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+
+from app.services.tenant_template import tenant_script
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+SCHEMA = "org_ledgertest"
+UTC = datetime.timezone.utc
+
+
+@pytest.fixture
+def ledger_db():
+    psycopg = pytest.importorskip("psycopg")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+        with conn.transaction():
+            conn.execute(tenant_script(SCHEMA), prepare=False)
+        owner, company = uuid.uuid4(), uuid.uuid4()
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.execute("INSERT INTO auth.users (id) VALUES (%s)", [owner])
+        conn.execute(
+            "INSERT INTO companies (id, name, slug, owner_id) VALUES (%s, 'Bar', %s, %s)",
+            [company, f"bar-{company}", owner],
+        )
+        beer, ice = (
+            conn.execute(
+                "INSERT INTO products (company_id, name, category, unit, stock)"
+                " VALUES (%s, %s, 'drink', 'un', %s) RETURNING id",
+                [company, name, stock],
+            ).fetchone()[0]
+            for name, stock in [("Cerveja", 65), ("Gelo", 10)]
+        )
+        # Beer started at 100; the writers that sold 35 also took it off the stock.
+        conn.execute(
+            "INSERT INTO stock_movements (company_id, product_id, movement_type, quantity, created_at)"
+            " VALUES (%s, %s, 'sale', -10, '2024-01-01Z'), (%s, %s, 'sale', -20, '2025-01-01Z'),"
+            " (%s, %s, 'sale', -5, now() - interval '1 hour')",
+            [company, beer] * 3,
+        )
+    yield psycopg, company, str(beer), str(ice)
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+@needs_db
+def test_checkpoints_answer_point_in_time_stock_and_repair_drift(ledger_db):
+    psycopg, company, beer, ice = ledger_db
+    from app.services.postgres_backend import PostgresClient
+    from app.services.stock_ledger import checkpoint, reconcile, run_tenants, stock_at
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        try:
+            genesis = await checkpoint(client, SCHEMA, lag=0)
+            unchanged = await checkpoint(client, SCHEMA, lag=0)
+            async with await psycopg.AsyncConnection.connect(DSN, autocommit=True) as conn:
+                await conn.execute(f"SET search_path TO {SCHEMA}, public")
+                async with conn.transaction():
+                    await conn.execute("UPDATE products SET stock = stock - 3 WHERE id = %s", [beer])
+                    await conn.execute(
+                        "INSERT INTO stock_movements (company_id, product_id, movement_type, quantity)"
+                        " VALUES (%s, %s, 'sale', -3)",
+                        [company, beer],
+                    )
+                # Edited outside the ledger.
+                await conn.execute("UPDATE products SET stock = 999 WHERE id = %s", [ice])
+            second = await checkpoint(client, SCHEMA, lag=0)
+            history = {
+                label: (await stock_at(client, SCHEMA, at=at, product_ids=[beer]))[beer]
+                for label, at in [
+                    ("2023", datetime.datetime(2023, 6, 1, tzinfo=UTC)),
+                    ("2024", datetime.datetime(2024, 6, 1, tzinfo=UTC)),
+                    ("now", None),
+                ]
+            }
+            found = await run_tenants([SCHEMA], lambda schema: reconcile(client, schema))
+            repaired = await reconcile(client, SCHEMA, repair=True)
+            clean = await reconcile(client, SCHEMA)
+            current = await stock_at(client, SCHEMA, company_id=str(company))
+            return genesis, unchanged, second, history, found, repaired, clean, current
+        finally:
+            await client.aclose()
+
+    genesis, unchanged, second, history, found, repaired, clean, current = asyncio.run(scenario())
+
+    assert (genesis["status"], genesis["checkpoints"]) == ("checkpointed", 2)
+    assert unchanged["status"] == "current"
+    # Only the product with new movements gets a checkpoint.
+    assert second["checkpoints"] == 1
+    assert history == {"2023": 100, "2024": 90, "now": 62}
+    assert found["counts"] == {"drift": 1}
+    drifted = found["tenants_detail"][0]["drifted"]
+    assert [(row["product_id"], row["observed"], row["stock"], row["drift"]) for row in drifted] == [
+        (ice, 999, 10, 989)
+    ]
+    assert repaired["status"] == "repaired"
+    assert clean["status"] == "clean"
+    assert current == {beer: 62, ice: 10}
+    with psycopg.connect(DSN) as conn:
+        stock = conn.execute(f"SELECT stock FROM {SCHEMA}.products WHERE id = %s", [ice]).fetchone()[0]
+    assert stock == 10
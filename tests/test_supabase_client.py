@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+def test_create_boteco_and_associate_user_is_one_round_trip(fake_supabase):
+    def handler(request: httpx.Request):
+        params = fake_supabase.body(request)
+        return {
+            "boteco": {"id": "boteco-1", **params["boteco_data"]},
+            "user_boteco": {"id": "ub-1", "boteco_id": "boteco-1", **params["user_boteco_data"]},
+        }
+
+    backend = fake_supabase(handler)
+    client = backend.client()
+    user_boteco_data = {"user_id": "user-1", "assigned_role": "owner", "plan": "boteco"}
+
+    boteco_res, user_boteco_res = asyncio.run(
+        client.create_boteco_and_associate_user({"username": "bar_do_ze"}, user_boteco_data)
+    )
+
+    assert len(backend.requests) == 1
+    assert backend.requests[0].url.path == "/rest/v1/rpc/create_boteco_with_owner"
+    assert boteco_res.data[0]["id"] == "boteco-1"
+    assert user_boteco_res.data[0]["boteco_id"] == "boteco-1"
+    assert user_boteco_data["boteco_id"] == "boteco-1"
+
+
+def test_create_boteco_failure_makes_no_compensating_delete(fake_supabase):
+    backend = fake_supabase(
+        lambda request: httpx.Response(
+            409, json={"code": "23505", "message": "duplicate key value", "details": None, "hint": None}
+        )
+    )
+    client = backend.client()
+
+    with pytest.raises(Exception):
+        asyncio.run(
+            client.create_boteco_and_associate_user(
+                {"username": "bar_do_ze"}, {"user_id": "user-1", "plan": "boteco"}
+            )
+        )
+
+    assert [request.method for request in backend.requests] == ["POST"]
+
+
+def test_bootstrap_session_embeds_membership_in_one_request(fake_supabase):
+    backend = fake_supabase(
+        lambda request: [
+            {
+                "id": "user-1",
+                "email": "ana@boteco.pt",
+                "user_boteco": [
+                    {"boteco_id": "boteco-1", "plan": "boteco_pro", "boteco": {"username": "bar"}}
+                ],
+            }
+        ]
+    )
+
+    session = asyncio.run(backend.client().bootstrap_session("ana@boteco.pt"))
+
+    assert len(backend.requests) == 1
+    assert "user_boteco(" in backend.requests[0].url.params["select"]
+    assert "*" not in backend.requests[0].url.params["select"]
+    assert session == {
+        "user": {"id": "user-1", "email": "ana@boteco.pt"},
+        "has_boteco": True,
+        "plan": "boteco_pro",
+        "boteco": {"username": "bar"},
+    }
+
+
+def test_concurrent_identical_lookups_share_one_request(fake_supabase):
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(0.05)
+        return [{"id": "user-1", "email": "ana@boteco.pt"}]
+
+    backend = fake_supabase(handler)
+    client = backend.client(cache=False)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(client.get_user_by_email("ana@boteco.pt") for _ in range(100))
+        )
+
+    results = asyncio.run(scenario())
+
+    assert len(backend.requests) == 1
+    assert all(result == [{"id": "user-1", "email": "ana@boteco.pt"}] for result in results)
+    assert client.inflight.shared == 99
+    assert len(client.inflight) == 0
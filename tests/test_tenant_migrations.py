@@ -0,0 +1,161 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.tenant_migrations import discover_tenant_schemas, migrate_tenants
+from app.services.tenant_template import TenantTemplate, load_template_files
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+TENANTS = ["org_migtest_0broken", "org_migtest_a", "org_migtest_b"]
+
+
+@pytest.fixture
+def tenants(tmp_path):
+    psycopg = pytest.importorskip("psycopg")
+    (tmp_path / "0001_items.sql").write_text("CREATE TABLE items (id int PRIMARY KEY);\n")
+    template = TenantTemplate(tmp_path)
+
+    def cleanup(conn):
+        for (name,) in conn.execute(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'org_migtest_%'"
+        ).fetchall():
+            conn.execute(f'DROP SCHEMA "{name}" CASCADE')
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        cleanup(conn)
+        for schema in TENANTS:
+            with conn.transaction():
+                conn.execute(template.script(schema), prepare=False)
+        # Already has the column the next template file adds.
+        conn.execute("ALTER TABLE org_migtest_0broken.items ADD COLUMN note text")
+        conn.execute("CREATE SCHEMA org_migtest_legacy")
+        conn.execute("CREATE TABLE org_migtest_legacy.items (id int)")
+    (tmp_path / "0002_item_notes.sql").write_text(
+        "ALTER TABLE items ADD COLUMN note text;\nCREATE INDEX items_note_idx ON items (note);\n"
+    )
+    yield psycopg, load_template_files(tmp_path)
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        cleanup(conn)
+
+
+@needs_db
+def test_fan_out_respects_the_failure_budget_and_resumes(tenants):
+    psycopg, files = tenants
+    from app.services.postgres_backend import PostgresClient
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="public", cache=False)
+        try:
+            schemas = [
+                schema
+                for schema in await discover_tenant_schemas(client, include_pool=False)
+                if schema.startswith("org_migtest_")
+            ]
+            dry = await migrate_tenants(client, schemas, files, dry_run=True)
+            stopped = await migrate_tenants(client, schemas, files, concurrency=1, max_failures=0)
+            budgeted = await migrate_tenants(client, schemas, files, concurrency=2, max_failures=1)
+            async with await psycopg.AsyncConnection.connect(DSN, autocommit=True) as conn:
+                await conn.execute("ALTER TABLE org_migtest_0broken.items DROP COLUMN note")
+            resumed = await migrate_tenants(client, schemas, files, concurrency=2)
+            return schemas, dry, stopped, budgeted, resumed
+        finally:
+            await client.aclose()
+
+    schemas, dry, stopped, budgeted, resumed = asyncio.run(scenario())
+
+    assert schemas == TENANTS + ["org_migtest_legacy"]
+    assert dry["counts"] == {"pending": 3, "unmanaged": 1}
+    assert stopped["counts"] == {"failed": 1, "skipped": 3}
+    assert stopped["budget_exceeded"] is True
+    assert budgeted["counts"] == {"failed": 1, "migrated": 2, "unmanaged": 1}
+    assert budgeted["budget_exceeded"] is False
+    detail = {record["schema"]: record for record in budgeted["tenants_detail"]}
+    assert detail["org_migtest_a"]["applied"] == [2]
+    assert set(detail["org_migtest_a"]["timings_ms"]) == {2}
+    assert resumed["counts"] == {"current": 2, "migrated": 1, "unmanaged": 1}
+    with psycopg.connect(DSN) as conn:
+        versions = conn.execute(
+            "SELECT array_agg(version ORDER BY version) FROM org_migtest_0broken.tenant_migrations"
+        ).fetchone()[0]
+    assert versions == [1, 2]
+
+
+@needs_db
+def test_no_transaction_files_run_outside_the_tenant_transaction(tenants, tmp_path):
+    psycopg, _ = tenants
+    from app.services.postgres_backend import PostgresClient
+
+    (tmp_path / "0003_item_note_index.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_id_note_idx ON items (id, note);\n"
+    )
+    (tmp_path / "0004_item_quantity.sql").write_text("ALTER TABLE items ADD COLUMN quantity int;\n")
+    files = load_template_files(tmp_path)
+    (tmp_path / "0005_products.sql").write_text("CREATE INDEX products_name_idx ON products (name);\n")
+    unsafe = load_template_files(tmp_path)
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="public", cache=False)
+        try:
+            migrated = await migrate_tenants(client, ["org_migtest_a"], files)
+            rejected = await migrate_tenants(client, ["org_migtest_a"], unsafe)
+            return migrated, rejected
+        finally:
+            await client.aclose()
+
+    migrated, rejected = asyncio.run(scenario())
+
+    [record] = migrated["tenants_detail"]
+    assert (record["status"], record["applied"]) == ("migrated", [2, 3, 4])
+    assert set(record["timings_ms"]) == {2, 3, 4}
+    [record] = rejected["tenants_detail"]
+    assert record["status"] == "failed"
+    assert "0005_products" in record["error"]
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        assert conn.execute(
+            "SELECT array_agg(version ORDER BY version) FROM org_migtest_a.tenant_migrations"
+        ).fetchone()[0] == [1, 2, 3, 4]
+        assert conn.execute(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = 'org_migtest_a.items_id_note_idx'::regclass"
+        ).fetchone()[0]
+        # New tenants build the same file inside their one transaction.
+        (tmp_path / "0005_products.sql").unlink()
+        with conn.transaction():
+            conn.execute(TenantTemplate(tmp_path).script("org_migtest_new"), prepare=False)
+        assert conn.execute("SELECT to_regclass('org_migtest_new.items_id_note_idx')").fetchone()[0]
+
+
+@needs_db
+def test_invalid_index_from_an_interrupted_build_is_rebuilt(tenants, tmp_path):
+    psycopg, _ = tenants
+    from app.services.postgres_backend import PostgresClient
+
+    (tmp_path / "0003_item_note_index.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_id_note_idx ON items (id, note);\n"
+    )
+    files = load_template_files(tmp_path)
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("INSERT INTO org_migtest_b.items VALUES (1), (2)")
+        # A concurrent build that fails half-way leaves an invalid index behind.
+        with pytest.raises(psycopg.errors.UniqueViolation):
+            conn.execute("CREATE UNIQUE INDEX CONCURRENTLY items_id_note_idx ON org_migtest_b.items ((1))")
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="public", cache=False)
+        try:
+            return await migrate_tenants(client, ["org_migtest_b"], files)
+        finally:
+            await client.aclose()
+
+    [record] = asyncio.run(scenario())["tenants_detail"]
+
+    assert (record["status"], record["applied"]) == ("migrated", [2, 3])
+    with psycopg.connect(DSN) as conn:
+        assert conn.execute(
+            "SELECT indisvalid, indisunique, indnatts FROM pg_index"
+            " WHERE indexrelid = 'org_migtest_b.items_id_note_idx'::regclass"
+        ).fetchone() == (True, False, 2)
@@ -0,0 +1,160 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from app.services.provisioning import provision_org
+from app.services.tenant_pool import TenantSchemaPool
+from app.services.tenant_template import TEMPLATE_VERSION
+
+DSN = os.getenv("TEST_DATABASE_URL")
+MIGRATIONS = Path(__file__).resolve().parents[1] / "app/services/sql/migrations"
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+class RecordingExecutor:
+    def __init__(self, claim=None, claim_error=None):
+        self.claim = claim
+        self.claim_error = claim_error
+        self.scripts = []
+        self.calls = []
+
+    async def execute(self, script):
+        self.scripts.append(script)
+
+    async def call(self, function, **params):
+        self.calls.append((function, params))
+        if self.claim_error:
+            raise self.claim_error
+        return self.claim
+
+
+def test_claimed_schema_skips_the_build(monkeypatch):
+    executor = RecordingExecutor(claim="org_bar_do_ze")
+    monkeypatch.setattr("app.services.provisioning.sql_executor", lambda storage, admin: executor)
+    pool = TenantSchemaPool(size=4, low_water=2)
+
+    asyncio.run(provision_org("bar_do_ze", pool=pool))
+
+    assert executor.calls == [
+        ("claim_tenant_schema", {"target_schema": "org_bar_do_ze", "template_version": TEMPLATE_VERSION})
+    ]
+    assert executor.scripts == []
+    assert pool.stats()["pool"]["count"] == 1
+
+
+def test_empty_or_failing_pool_falls_back_to_building(monkeypatch):
+    for executor in (RecordingExecutor(claim=None), RecordingExecutor(claim_error=RuntimeError("down"))):
+        monkeypatch.setattr(
+            "app.services.provisioning.sql_executor",
+            lambda storage, admin, executor=executor: executor,
+        )
+        pool = TenantSchemaPool(size=4, low_water=2)
+
+        asyncio.run(provision_org("bar_do_ze", pool=pool))
+
+        assert len(executor.scripts) == 1
+        assert executor.scripts[0].startswith('CREATE SCHEMA "org_bar_do_ze";')
+        assert pool.stats()["create"]["count"] == 1
+
+
+def test_disabled_pool_never_calls_the_database(monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr("app.services.provisioning.sql_executor", lambda storage, admin: executor)
+
+    asyncio.run(provision_org("bar_do_ze", pool=TenantSchemaPool(size=0)))
+
+    assert executor.calls == []
+    assert len(executor.scripts) == 1
+
+
+@pytest.fixture
+def pool_schema():
+    psycopg = pytest.importorskip("psycopg")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("CREATE SCHEMA IF NOT EXISTS reflex")
+        for name in ("0002_tenant_schema_pool.sql", "0006_prune_tenant_pool.sql"):
+            conn.execute((MIGRATIONS / name).read_text())
+        # Tenant tables reference Supabase's auth.users.
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+    yield
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        names = conn.execute(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'tenant_pool_%' OR nspname LIKE 'org_pooltest_%'"
+        ).fetchall()
+        for (name,) in names:
+            conn.execute(f'DROP SCHEMA "{name}" CASCADE')
+        conn.execute("DELETE FROM reflex.tenant_schema_pool")
+
+
+@needs_db
+def test_pool_claims_by_rename_and_refills_below_low_water(pool_schema):
+    import psycopg
+
+    from app.services.postgres_backend import PostgresClient
+    from app.services.sql_executor import PostgresSqlExecutor
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        pool = TenantSchemaPool(executor=PostgresSqlExecutor(client), size=3, low_water=2)
+        try:
+            first_fill = await pool.refill()
+            claimed = await pool.claim("org_pooltest_a")
+            again = await pool.claim("org_pooltest_a")
+            no_refill = await pool.refill()
+            await pool.claim("org_pooltest_b")
+            second_fill = await pool.refill()
+            return first_fill, claimed, again, no_refill, second_fill
+        finally:
+            await client.aclose()
+
+    first_fill, claimed, again, no_refill, second_fill = asyncio.run(scenario())
+
+    assert (first_fill, claimed, again, no_refill, second_fill) == (3, True, True, 0, 2)
+    with psycopg.connect(DSN) as conn:
+        schemas = {
+            row[0]
+            for row in conn.execute(
+                "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'org_pooltest_%'"
+            )
+        }
+        pooled = conn.execute("SELECT count(*) FROM reflex.tenant_schema_pool").fetchone()[0]
+    assert schemas == {"org_pooltest_a", "org_pooltest_b"}
+    assert pooled == 3
+
+
+@needs_db
+def test_refill_drops_schemas_built_from_an_older_template(pool_schema):
+    import psycopg
+
+    from app.services.postgres_backend import PostgresClient
+    from app.services.sql_executor import PostgresSqlExecutor
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        versions = [("tenant_pool_old", TEMPLATE_VERSION - 1), ("tenant_pool_new", TEMPLATE_VERSION + 1)]
+        for schema, version in versions:
+            conn.execute(f"CREATE SCHEMA {schema}")
+            conn.execute(
+                "INSERT INTO reflex.tenant_schema_pool (schema_name, template_version) VALUES (%s, %s)",
+                [schema, version],
+            )
+
+    async def scenario():
+        client = PostgresClient(DSN, schema="reflex", cache=False)
+        pool = TenantSchemaPool(executor=PostgresSqlExecutor(client), size=1, low_water=1)
+        try:
+            return await pool.refill()
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == 1
+    with psycopg.connect(DSN) as conn:
+        pooled = dict(conn.execute("SELECT schema_name, template_version FROM reflex.tenant_schema_pool"))
+        old_exists = conn.execute("SELECT to_regnamespace('tenant_pool_old')").fetchone()[0]
+    # An instance on an older release must not drop the newer pool.
+    assert pooled.pop("tenant_pool_new") == TEMPLATE_VERSION + 1
+    assert list(pooled.values()) == [TEMPLATE_VERSION]
+    assert old_exists is None
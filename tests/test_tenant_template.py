@@ -0,0 +1,126 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.provisioning import provision_org
+from app.services.tenant_pool import TenantSchemaPool
+from app.services.tenant_template import (
+    PHASES,
+    TEMPLATE_VERSION,
+    phase_timings,
+    statement_phase,
+    tenant_script,
+)
+from app.utils.sql import split_statements
+
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+
+def test_split_statements_respects_quotes_dollar_bodies_and_comments():
+    script = """
+    -- header; not a statement
+    INSERT INTO t VALUES ('a;b', "c;d");
+    CREATE FUNCTION f() RETURNS void AS $body$ BEGIN PERFORM 1; END $body$ LANGUAGE plpgsql;
+    /* trailing; comment */
+    """
+
+    statements = split_statements(script)
+
+    assert len(statements) == 2
+    assert statements[0].endswith("""VALUES ('a;b', "c;d")""")
+    assert statements[1].endswith("LANGUAGE plpgsql")
+
+
+def test_statements_are_grouped_into_phases():
+    assert statement_phase("CREATE TYPE t AS ENUM ('a')") == "types"
+    assert statement_phase("-- note\nCREATE TABLE orders (id uuid)") == "tables"
+    assert statement_phase("ALTER TABLE orders ADD CONSTRAINT fk FOREIGN KEY (x) REFERENCES y") == "objects"
+    assert statement_phase("CREATE UNIQUE INDEX i ON orders (id)") == "indexes"
+    assert statement_phase("DROP INDEX IF EXISTS i") == "indexes"
+
+
+def test_script_builds_indexes_after_tables_and_records_the_version():
+    script = tenant_script("org_bar_do_ze")
+
+    assert script.startswith('CREATE SCHEMA "org_bar_do_ze";\nSET LOCAL search_path TO "org_bar_do_ze", public;')
+    assert script.index("CREATE INDEX") > script.rindex("CREATE TABLE")
+    assert script.index("CREATE INDEX") > script.rindex("FOREIGN KEY")
+    assert "INSERT INTO tenant_migrations (version, name, checksum) VALUES (1," in script
+    assert f"({TEMPLATE_VERSION}, " in script.split("INSERT INTO tenant_migrations")[1]
+    # Indexes a later file drops are never built for new tenants.
+    assert "idx_company_users_user_company" not in script
+    assert "DROP INDEX" not in script
+    assert "tenant_schema_pool" not in script
+    assert "reflex.tenant_schema_pool" in tenant_script("tenant_pool_x", pooled=True)
+
+
+@pytest.fixture
+def tenant_db():
+    psycopg = pytest.importorskip("psycopg")
+
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute("CREATE SCHEMA IF NOT EXISTS auth")
+        conn.execute("CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY)")
+    yield psycopg
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        for (name,) in conn.execute(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'org_templatetest_%'"
+        ).fetchall():
+            conn.execute(f'DROP SCHEMA "{name}" CASCADE')
+
+
+@needs_db
+def test_template_builds_a_complete_schema_in_one_transaction(tenant_db):
+    from app.services.postgres_backend import PostgresClient
+
+    async def scenario():
+        storage = PostgresClient(DSN, schema="public", cache=False)
+        pool = TenantSchemaPool(size=0)
+        try:
+            first = await provision_org("templatetest_a", storage=storage, pool=pool)
+            retried = await provision_org("templatetest_a", storage=storage, pool=pool)
+            return first, retried
+        finally:
+            await storage.aclose()
+
+    assert asyncio.run(scenario()) == ("org_templatetest_a", "org_templatetest_a")
+    with tenant_db.connect(DSN) as conn:
+        tables = conn.execute(
+            "SELECT count(*) FROM pg_tables WHERE schemaname = 'org_templatetest_a'"
+        ).fetchone()[0]
+        indexes = {
+            row[0]
+            for row in conn.execute(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = 'org_templatetest_a'"
+            )
+        }
+        versions = conn.execute(
+            "SELECT version FROM org_templatetest_a.tenant_migrations"
+        ).fetchall()
+        timings = phase_timings(
+            conn.execute("SELECT phase, finished_at FROM org_templatetest_a.tenant_build_log")
+        )
+    assert tables == 22
+    assert {"idx_orders_company_id", "idx_sales_sale_date"} <= indexes
+    assert versions[-1] == (TEMPLATE_VERSION,)
+    assert "idx_company_users_user_company" not in indexes
+    assert list(timings) == list(PHASES)
+
+
+@needs_db
+def test_failed_build_leaves_nothing_behind(tenant_db):
+    script = tenant_script("org_templatetest_broken").replace(
+        "INSERT INTO tenant_build_log (phase) VALUES ('indexes');",
+        "SELECT 1 / 0;",
+    )
+
+    with tenant_db.connect(DSN) as conn:
+        with pytest.raises(tenant_db.errors.DivisionByZero):
+            conn.execute(script, prepare=False)
+        conn.rollback()
+        exists = conn.execute(
+            "SELECT count(*) FROM pg_namespace WHERE nspname = 'org_templatetest_broken'"
+        ).fetchone()[0]
+    assert exists == 0